@@ -0,0 +1,68 @@
+"""Add salon_room_identities table (normalized salon_rooms.target_identities)
+
+Revision ID: 20260301_salon_room_identities
+Revises: 20260202_salon_msg_trans
+Create Date: 2026-03-01
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260301_salon_room_identities'
+down_revision = '20260202_salon_msg_trans'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'salon_rooms' not in tables:
+        print("Skipping salon_room_identities: salon_rooms table does not exist")
+        return
+    
+    if 'salon_room_identities' in tables:
+        print("salon_room_identities table already exists, skipping")
+        return
+    
+    op.create_table(
+        'salon_room_identities',
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('identity', sa.String(50), nullable=False),
+        sa.ForeignKeyConstraint(['room_id'], ['salon_rooms.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('room_id', 'identity'),
+    )
+    op.create_index('ix_salon_room_identities_identity', 'salon_room_identities', ['identity'])
+    
+    # Backfill from the JSON column
+    rows = conn.execute(sa.text("SELECT id, target_identities FROM salon_rooms")).fetchall()
+    identity_rows = []
+    for room_id, target_identities in rows:
+        if isinstance(target_identities, str):
+            target_identities = json.loads(target_identities)
+        for identity in set(target_identities or []):
+            identity_rows.append({"room_id": room_id, "identity": identity})
+    if identity_rows:
+        conn.execute(
+            sa.text("INSERT INTO salon_room_identities (room_id, identity) VALUES (:room_id, :identity)"),
+            identity_rows,
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'salon_room_identities' not in tables:
+        return
+    
+    op.drop_index('ix_salon_room_identities_identity', table_name='salon_room_identities')
+    op.drop_table('salon_room_identities')
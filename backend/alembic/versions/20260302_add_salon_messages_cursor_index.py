@@ -0,0 +1,43 @@
+"""Add (room_id, created_at, id) index on salon_messages for cursor paging
+
+Revision ID: 20260302_salon_msg_cursor_idx
+Revises: 20260301_salon_room_identities
+Create Date: 2026-03-02
+
+"""
+from alembic import op
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260302_salon_msg_cursor_idx'
+down_revision = '20260301_salon_room_identities'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'salon_messages' not in inspector.get_table_names():
+        print("Skipping salon_messages cursor index: salon_messages table does not exist")
+        return
+    
+    existing = {ix['name'] for ix in inspector.get_indexes('salon_messages')}
+    if 'ix_salon_messages_room_created' in existing:
+        return
+    
+    op.create_index('ix_salon_messages_room_created', 'salon_messages', ['room_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'salon_messages' not in inspector.get_table_names():
+        return
+    
+    existing = {ix['name'] for ix in inspector.get_indexes('salon_messages')}
+    if 'ix_salon_messages_room_created' in existing:
+        op.drop_index('ix_salon_messages_room_created', table_name='salon_messages')
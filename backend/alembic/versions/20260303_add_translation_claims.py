@@ -0,0 +1,42 @@
+"""Add translation_claims table (cross-worker translation de-duplication)
+
+Revision ID: 20260303_translation_claims
+Revises: 20260302_salon_msg_cursor_idx
+Create Date: 2026-03-03
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260303_translation_claims'
+down_revision = '20260302_salon_msg_cursor_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'translation_claims' in inspector.get_table_names():
+        return
+    
+    op.create_table(
+        'translation_claims',
+        sa.Column('entity_type', sa.String(20), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('lang', sa.String(10), nullable=False),
+        sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('entity_type', 'entity_id', 'lang'),
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'translation_claims' in inspector.get_table_names():
+        op.drop_table('translation_claims')
@@ -0,0 +1,46 @@
+"""Add original_lang to comments, messages and salon_messages
+
+Revision ID: 20260304_msg_original_lang
+Revises: 20260303_translation_claims
+Create Date: 2026-03-04
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260304_msg_original_lang'
+down_revision = '20260303_translation_claims'
+branch_labels = None
+depends_on = None
+
+TABLES = ('comments', 'messages', 'salon_messages')
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    
+    for table_name in TABLES:
+        if table_name not in tables:
+            print(f"Skipping {table_name}.original_lang: {table_name} table does not exist")
+            continue
+        columns = {c['name'] for c in inspector.get_columns(table_name)}
+        if 'original_lang' not in columns:
+            op.add_column(table_name, sa.Column('original_lang', sa.String(10), nullable=True))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    
+    for table_name in TABLES:
+        if table_name not in tables:
+            continue
+        columns = {c['name'] for c in inspector.get_columns(table_name)}
+        if 'original_lang' in columns:
+            op.drop_column(table_name, 'original_lang')
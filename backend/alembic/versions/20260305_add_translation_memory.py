@@ -0,0 +1,49 @@
+"""Add translation_memory table (content-addressed translation cache)
+
+Revision ID: 20260305_translation_memory
+Revises: 20260304_msg_original_lang
+Create Date: 2026-03-05
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260305_translation_memory'
+down_revision = '20260304_msg_original_lang'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'translation_memory' in inspector.get_table_names():
+        return
+    
+    op.create_table(
+        'translation_memory',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('target_lang', sa.String(10), nullable=False),
+        sa.Column('provider', sa.String(50), nullable=False),
+        sa.Column('translated_title', sa.Text(), nullable=True),
+        sa.Column('translated_text', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_translation_memory_id', 'translation_memory', ['id'])
+    op.create_index('ix_translation_memory_content_hash', 'translation_memory', ['content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'translation_memory' in inspector.get_table_names():
+        op.drop_index('ix_translation_memory_content_hash', table_name='translation_memory')
+        op.drop_index('ix_translation_memory_id', table_name='translation_memory')
+        op.drop_table('translation_memory')
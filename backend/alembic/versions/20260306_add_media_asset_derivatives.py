@@ -0,0 +1,48 @@
+"""Add derivative (thumbnail / WebP variant) columns to media_assets
+
+Revision ID: 20260306_media_derivatives
+Revises: 20260305_translation_memory
+Create Date: 2026-03-06
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260306_media_derivatives'
+down_revision = '20260305_translation_memory'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    ('thumb_url', sa.String(500)),
+    ('variants', sa.JSON()),
+    ('derivatives_status', sa.String(20)),
+)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'media_assets' not in inspector.get_table_names():
+        print("Skipping media_assets derivatives: media_assets table does not exist")
+        return
+    columns = {c['name'] for c in inspector.get_columns('media_assets')}
+    for name, column_type in COLUMNS:
+        if name not in columns:
+            op.add_column('media_assets', sa.Column(name, column_type, nullable=True))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'media_assets' not in inspector.get_table_names():
+        return
+    columns = {c['name'] for c in inspector.get_columns('media_assets')}
+    for name, _ in COLUMNS:
+        if name in columns:
+            op.drop_column('media_assets', name)
@@ -0,0 +1,51 @@
+"""Add content_hash / ref_count to media_assets for upload deduplication
+
+Revision ID: 20260307_media_content_hash
+Revises: 20260306_media_derivatives
+Create Date: 2026-03-07
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260307_media_content_hash'
+down_revision = '20260306_media_derivatives'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'media_assets' not in inspector.get_table_names():
+        print("Skipping media_assets.content_hash: media_assets table does not exist")
+        return
+    columns = {c['name'] for c in inspector.get_columns('media_assets')}
+    if 'content_hash' not in columns:
+        op.add_column('media_assets', sa.Column('content_hash', sa.String(64), nullable=True))
+    if 'ref_count' not in columns:
+        op.add_column('media_assets', sa.Column('ref_count', sa.Integer(), nullable=False, server_default='1'))
+    
+    indexes = {idx['name'] for idx in inspector.get_indexes('media_assets')}
+    if 'uq_media_assets_user_content_hash' not in indexes:
+        op.create_index('uq_media_assets_user_content_hash', 'media_assets', ['user_id', 'content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'media_assets' not in inspector.get_table_names():
+        return
+    indexes = {idx['name'] for idx in inspector.get_indexes('media_assets')}
+    if 'uq_media_assets_user_content_hash' in indexes:
+        op.drop_index('uq_media_assets_user_content_hash', table_name='media_assets')
+    columns = {c['name'] for c in inspector.get_columns('media_assets')}
+    if 'ref_count' in columns:
+        op.drop_column('media_assets', 'ref_count')
+    if 'content_hash' in columns:
+        op.drop_column('media_assets', 'content_hash')
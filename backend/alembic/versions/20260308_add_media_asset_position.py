@@ -0,0 +1,50 @@
+"""Add position / missing_at to media_assets for the DB-backed image library
+
+Revision ID: 20260308_media_position
+Revises: 20260307_media_content_hash
+Create Date: 2026-03-08
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260308_media_position'
+down_revision = '20260307_media_content_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'media_assets' not in inspector.get_table_names():
+        print("Skipping media_assets.position: media_assets table does not exist")
+        return
+    columns = {c['name'] for c in inspector.get_columns('media_assets')}
+    if 'position' not in columns:
+        op.add_column('media_assets', sa.Column('position', sa.Integer(), nullable=True))
+    if 'missing_at' not in columns:
+        op.add_column('media_assets', sa.Column('missing_at', sa.DateTime(timezone=True), nullable=True))
+    
+    indexes = {idx['name'] for idx in inspector.get_indexes('media_assets')}
+    if 'ix_media_assets_user_position' not in indexes:
+        op.create_index('ix_media_assets_user_position', 'media_assets', ['user_id', 'position', 'id'])
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'media_assets' not in inspector.get_table_names():
+        return
+    indexes = {idx['name'] for idx in inspector.get_indexes('media_assets')}
+    if 'ix_media_assets_user_position' in indexes:
+        op.drop_index('ix_media_assets_user_position', table_name='media_assets')
+    columns = {c['name'] for c in inspector.get_columns('media_assets')}
+    for name in ('missing_at', 'position'):
+        if name in columns:
+            op.drop_column('media_assets', name)
@@ -0,0 +1,53 @@
+"""Full-text search for flea market and art listings (tsvector + pg_trgm)
+
+Revision ID: 20260309_listing_search
+Revises: 20260308_media_position
+Create Date: 2026-03-09
+
+"""
+from alembic import op
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260309_listing_search'
+down_revision = '20260308_media_position'
+branch_labels = None
+depends_on = None
+
+TABLES = ('flea_market_items', 'art_sale_items')
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        # SQLite FTS5 tables are created on startup (app.services.listing_search)
+        print("Skipping listing search: not PostgreSQL")
+        return
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in TABLES:
+        if table not in existing:
+            print(f"Skipping listing search: {table} table does not exist")
+            continue
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED"
+        )
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)")
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm ON {table} "
+            f"USING GIN ((coalesce(title, '') || ' ' || coalesce(description, '')) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_trgm")
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
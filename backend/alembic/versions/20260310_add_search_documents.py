@@ -0,0 +1,60 @@
+"""Add search_documents, the unified cross-content search index
+
+Revision ID: 20260310_search_documents
+Revises: 20260309_listing_search
+Create Date: 2026-03-10
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260310_search_documents'
+down_revision = '20260309_listing_search'
+branch_labels = None
+depends_on = None
+
+SEARCH_TEXT = "(coalesce(title, '') || ' ' || coalesce(body, ''))"
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'search_documents' not in inspector.get_table_names():
+        op.create_table(
+            'search_documents',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('doc_type', sa.String(30), nullable=False),
+            sa.Column('doc_id', sa.String(64), nullable=False),
+            sa.Column('title', sa.String(300), nullable=True),
+            sa.Column('body', sa.Text(), nullable=False, server_default=''),
+            sa.Column('slug', sa.String(300), nullable=True),
+            sa.Column('visibility', sa.String(20), nullable=False, server_default='public'),
+            sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.UniqueConstraint('doc_type', 'doc_id', name='uq_search_documents_doc'),
+            sa.CheckConstraint("visibility IN ('public', 'members')", name='check_search_document_visibility'),
+        )
+        op.create_index('ix_search_documents_id', 'search_documents', ['id'])
+    
+    if conn.dialect.name != 'postgresql':
+        # SQLite FTS5 table is created on startup (app.services.listing_search)
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {SEARCH_TEXT})) STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_search_documents_search_vector ON search_documents USING GIN (search_vector)")
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_search_documents_search_trgm ON search_documents USING GIN ({SEARCH_TEXT} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'search_documents' in inspector.get_table_names():
+        op.drop_table('search_documents')
@@ -0,0 +1,73 @@
+"""Add jewelry_products.track_stock and orders.reserved_until for stock reservations
+
+Also allows the refunded / needs_attention order statuses (paid after the
+reservation expired and the stock was gone).
+
+Revision ID: 20260311_jewelry_reservation
+Revises: 20260310_search_documents
+Create Date: 2026-03-11
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260311_jewelry_reservation'
+down_revision = '20260310_search_documents'
+branch_labels = None
+depends_on = None
+
+ORDER_STATUSES = "'pending', 'paid', 'shipped', 'delivered', 'cancelled'"
+ORDER_STATUSES_WITH_SETTLEMENT = ORDER_STATUSES + ", 'refunded', 'needs_attention'"
+
+
+def _replace_order_status_check(conn, statuses: str) -> None:
+    if conn.dialect.name != 'postgresql':
+        return  # SQLite builds tables from the models (create_all)
+    op.execute("ALTER TABLE orders DROP CONSTRAINT IF EXISTS check_order_status")
+    op.create_check_constraint('check_order_status', 'orders', f"status IN ({statuses})")
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'jewelry_products' in tables:
+        columns = {c['name'] for c in inspector.get_columns('jewelry_products')}
+        if 'track_stock' not in columns:
+            op.add_column('jewelry_products', sa.Column('track_stock', sa.Boolean(), nullable=False, server_default=sa.false()))
+            # Products with a stock count were managed; 0 used to mean "unlimited"
+            op.execute("UPDATE jewelry_products SET track_stock = TRUE WHERE stock > 0")
+    
+    if 'orders' in tables:
+        columns = {c['name'] for c in inspector.get_columns('orders')}
+        if 'reserved_until' not in columns:
+            op.add_column('orders', sa.Column('reserved_until', sa.DateTime(timezone=True), nullable=True))
+        indexes = {idx['name'] for idx in inspector.get_indexes('orders')}
+        if 'ix_orders_status_reserved_until' not in indexes:
+            op.create_index('ix_orders_status_reserved_until', 'orders', ['status', 'reserved_until'])
+        _replace_order_status_check(conn, ORDER_STATUSES_WITH_SETTLEMENT)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'orders' in tables:
+        # Orders already in the new statuses must be resolved before downgrading
+        _replace_order_status_check(conn, ORDER_STATUSES)
+        indexes = {idx['name'] for idx in inspector.get_indexes('orders')}
+        if 'ix_orders_status_reserved_until' in indexes:
+            op.drop_index('ix_orders_status_reserved_until', table_name='orders')
+        columns = {c['name'] for c in inspector.get_columns('orders')}
+        if 'reserved_until' in columns:
+            op.drop_column('orders', 'reserved_until')
+    
+    if 'jewelry_products' in tables:
+        columns = {c['name'] for c in inspector.get_columns('jewelry_products')}
+        if 'track_stock' in columns:
+            op.drop_column('jewelry_products', 'track_stock')
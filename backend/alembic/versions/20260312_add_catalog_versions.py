@@ -0,0 +1,40 @@
+"""Add catalog_versions for invalidating the in-process jewelry catalog cache
+
+Revision ID: 20260312_catalog_versions
+Revises: 20260311_jewelry_reservation
+Create Date: 2026-03-12
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '20260312_catalog_versions'
+down_revision = '20260311_jewelry_reservation'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'catalog_versions' in inspector.get_table_names():
+        print("Skipping catalog_versions: table already exists")
+        return
+    op.create_table(
+        'catalog_versions',
+        sa.Column('name', sa.String(length=50), primary_key=True),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    
+    if 'catalog_versions' in inspector.get_table_names():
+        op.drop_table('catalog_versions')
@@ -67,7 +67,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 
-async def get_optional_user(token: Optional[str] = Depends(OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)), db: Session = Depends(get_db)):
+def get_user_from_token(db: Session, token: Optional[str]) -> Optional[User]:
+    """Resolve a bearer token to a user, returning None for missing/invalid tokens."""
     if not token:
         return None
     try:
@@ -81,6 +82,10 @@ async def get_optional_user(token: Optional[str] = Depends(OAuth2PasswordBearer(
     user = get_user_by_email(db, email=email)
     return user
 
+
+async def get_optional_user(token: Optional[str] = Depends(OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)), db: Session = Depends(get_db)):
+    return get_user_from_token(db, token)
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -7,8 +7,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from app.routers import auth, users, profiles, posts, comments, reactions, follows, notifications, media, billing, matching, categories, ops, account, donation, salon, flea_market, jewelry, live_wedding, art_sales, courses, translations, stripe_billing, contact, admin
+from app.routers import auth, users, profiles, posts, comments, reactions, follows, notifications, media, billing, matching, categories, ops, account, donation, salon, flea_market, jewelry, live_wedding, art_sales, courses, translations, stripe_billing, contact, admin, search
 from app.database import Base, engine, get_db
+from app.services.salon_realtime import broker as salon_broker
+from app.services.pretranslation import pretranslation_queue
+from app.services.translation_providers.registry import provider_registry
+from app.services.media_derivatives import media_derivatives
+from app.services.media_library import media_reconciler
+from app.services.inventory import reservation_sweeper
+from app.services.listing_search import ensure_listing_search
+from app.services.storage import media_storage, s3_url_for_key
 import os
 from pathlib import Path
 import os
@@ -184,6 +192,52 @@ def run_migrations():
         else:
             print("⚠️ posts table not found in information_schema.tables")
 
+        for table_name in ("comments", "messages", "salon_messages"):
+            if _table_exists(table_name):
+                _add_column_if_missing(table_name, "original_lang", "VARCHAR(10)")
+
+        if _table_exists("media_assets"):
+            _add_column_if_missing("media_assets", "thumb_url", "VARCHAR(500)")
+            _add_column_if_missing("media_assets", "variants", "JSON")
+            _add_column_if_missing("media_assets", "derivatives_status", "VARCHAR(20)")
+            _add_column_if_missing("media_assets", "content_hash", "VARCHAR(64)")
+            _add_column_if_missing("media_assets", "ref_count", "INTEGER NOT NULL DEFAULT 1")
+            _add_column_if_missing("media_assets", "position", "INTEGER")
+            _add_column_if_missing("media_assets", "missing_at", "TIMESTAMPTZ")
+            try:
+                db.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_media_assets_user_content_hash ON media_assets(user_id, content_hash)"))
+                db.execute(text("CREATE INDEX IF NOT EXISTS ix_media_assets_user_position ON media_assets(user_id, position, id)"))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed ensuring media_assets indexes: {e}")
+
+        if _table_exists("jewelry_products") and not _column_exists("jewelry_products", "track_stock"):
+            _add_column_if_missing("jewelry_products", "track_stock", "BOOLEAN NOT NULL DEFAULT FALSE")
+            try:
+                # 在庫数が入っている既存商品は在庫管理する
+                db.execute(text("UPDATE jewelry_products SET track_stock = TRUE WHERE stock > 0"))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed backfilling jewelry_products.track_stock: {e}")
+        if _table_exists("orders"):
+            _add_column_if_missing("orders", "reserved_until", "TIMESTAMPTZ")
+            try:
+                db.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_status_reserved_until ON orders(status, reserved_until)"))
+                # 期限切れ後の決済で在庫がなかった注文の状態（refunded / needs_attention）を許可
+                definition = db.execute(text("SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conname = 'check_order_status'")).scalar()
+                if definition is None or "needs_attention" not in definition:
+                    db.execute(text("ALTER TABLE orders DROP CONSTRAINT IF EXISTS check_order_status"))
+                    db.execute(text(
+                        "ALTER TABLE orders ADD CONSTRAINT check_order_status CHECK (status IN "
+                        "('pending', 'paid', 'shipped', 'delivered', 'cancelled', 'refunded', 'needs_attention'))"
+                    ))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed ensuring orders indexes / constraints: {e}")
+
         if not _table_exists("post_media"):
             try:
                 db.execute(
@@ -274,6 +328,89 @@ def run_migrations():
             else:
                 print(f"✅ {tbl_name} table already exists")
 
+        if _table_exists("salon_rooms") and not _table_exists("salon_room_identities"):
+            try:
+                db.execute(
+                    text(
+                        """
+                        CREATE TABLE IF NOT EXISTS salon_room_identities (
+                            room_id INTEGER NOT NULL REFERENCES salon_rooms(id) ON DELETE CASCADE,
+                            identity VARCHAR(50) NOT NULL,
+                            PRIMARY KEY (room_id, identity)
+                        )
+                        """
+                    )
+                )
+                db.execute(text("CREATE INDEX IF NOT EXISTS ix_salon_room_identities_identity ON salon_room_identities(identity)"))
+                db.execute(
+                    text(
+                        """
+                        INSERT INTO salon_room_identities (room_id, identity)
+                        SELECT DISTINCT r.id, t.identity
+                        FROM salon_rooms r, json_array_elements_text(r.target_identities::json) AS t(identity)
+                        ON CONFLICT DO NOTHING
+                        """
+                    )
+                )
+                db.commit()
+                print("✅ Created table: salon_room_identities")
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed creating table salon_room_identities: {e}")
+
+        if _table_exists("salon_messages"):
+            try:
+                db.execute(text("CREATE INDEX IF NOT EXISTS ix_salon_messages_room_created ON salon_messages(room_id, created_at, id)"))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed ensuring index ix_salon_messages_room_created: {e}")
+
+        if not _table_exists("translation_claims"):
+            try:
+                db.execute(
+                    text(
+                        """
+                        CREATE TABLE IF NOT EXISTS translation_claims (
+                            entity_type VARCHAR(20) NOT NULL,
+                            entity_id INTEGER NOT NULL,
+                            lang VARCHAR(10) NOT NULL,
+                            claimed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                            PRIMARY KEY (entity_type, entity_id, lang)
+                        )
+                        """
+                    )
+                )
+                db.commit()
+                print("✅ Created table: translation_claims")
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed creating table translation_claims: {e}")
+
+        if not _table_exists("translation_memory"):
+            try:
+                db.execute(
+                    text(
+                        """
+                        CREATE TABLE IF NOT EXISTS translation_memory (
+                            id SERIAL PRIMARY KEY,
+                            content_hash VARCHAR(64) NOT NULL,
+                            target_lang VARCHAR(10) NOT NULL,
+                            provider VARCHAR(50) NOT NULL,
+                            translated_title TEXT,
+                            translated_text TEXT NOT NULL,
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                        )
+                        """
+                    )
+                )
+                db.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_translation_memory_content_hash ON translation_memory(content_hash)"))
+                db.commit()
+                print("✅ Created table: translation_memory")
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed creating table translation_memory: {e}")
+
         if not _table_exists("contact_inquiries"):
             try:
                 db.execute(
@@ -361,6 +498,66 @@ def run_migrations():
         else:
             print("\u2705 audit_logs table already exists")
 
+        if not _table_exists("search_documents"):
+            try:
+                db.execute(
+                    text(
+                        """
+                        CREATE TABLE IF NOT EXISTS search_documents (
+                            id SERIAL PRIMARY KEY,
+                            doc_type VARCHAR(30) NOT NULL,
+                            doc_id VARCHAR(64) NOT NULL,
+                            title VARCHAR(300),
+                            body TEXT NOT NULL DEFAULT '',
+                            slug VARCHAR(300),
+                            visibility VARCHAR(20) NOT NULL DEFAULT 'public',
+                            created_at TIMESTAMPTZ,
+                            updated_at TIMESTAMPTZ DEFAULT NOW(),
+                            CONSTRAINT uq_search_documents_doc UNIQUE (doc_type, doc_id),
+                            CONSTRAINT check_search_document_visibility CHECK (visibility IN ('public', 'members'))
+                        )
+                        """
+                    )
+                )
+                db.commit()
+                print("\u2705 Created table: search_documents (run scripts/rebuild_search_index.py to fill it)")
+            except Exception as e:
+                db.rollback()
+                print(f"\u26a0\ufe0f Failed creating table search_documents: {e}")
+        else:
+            print("\u2705 search_documents table already exists")
+
+        if not _table_exists("catalog_versions"):
+            try:
+                db.execute(
+                    text(
+                        """
+                        CREATE TABLE IF NOT EXISTS catalog_versions (
+                            name VARCHAR(50) PRIMARY KEY,
+                            version BIGINT NOT NULL DEFAULT 0,
+                            updated_at TIMESTAMPTZ DEFAULT NOW()
+                        )
+                        """
+                    )
+                )
+                db.commit()
+                print("\u2705 Created table: catalog_versions")
+            except Exception as e:
+                db.rollback()
+                print(f"\u26a0\ufe0f Failed creating table catalog_versions: {e}")
+        else:
+            print("\u2705 catalog_versions table already exists")
+
+        # フリマ・作品販売・横断検索インデックスの全文検索（tsvector + pg_trgm）
+        if _table_exists("flea_market_items") and _table_exists("art_sale_items"):
+            try:
+                ensure_listing_search(db.connection())
+                db.commit()
+                print("✅ Ensured listing search indexes")
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Failed ensuring listing search indexes: {e}")
+
         _seed_admin_user(db)
 
         # Migration 2: Add nationality column to matching_profiles table
@@ -459,6 +656,7 @@ app.include_router(translations.router)
 app.include_router(stripe_billing.router)
 app.include_router(contact.router)
 app.include_router(admin.router)
+app.include_router(search.router)
 
 @app.on_event("startup")
 def on_startup():
@@ -466,11 +664,74 @@ def on_startup():
         db_url = os.getenv("DATABASE_URL", "")
         if "sqlite" in db_url.lower() or not db_url:
             Base.metadata.create_all(bind=engine)
+            # SQLite FTS5 tables for listing / unified search (not part of the ORM metadata)
+            with engine.begin() as conn:
+                ensure_listing_search(conn)
         print("✅ Database initialization completed")
     except Exception as e:
         print(f"⚠️ Database initialization failed: {e}")
         print("⚠️ Application will continue without database initialization")
 
+@app.on_event("startup")
+async def start_salon_realtime():
+    await salon_broker.start()
+
+
+@app.on_event("shutdown")
+async def stop_salon_realtime():
+    await salon_broker.stop()
+
+
+@app.on_event("startup")
+async def start_pretranslation():
+    await pretranslation_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_pretranslation():
+    await pretranslation_queue.stop()
+
+
+@app.on_event("shutdown")
+async def close_translation_provider():
+    await provider_registry.aclose()
+
+
+@app.on_event("startup")
+async def start_media_derivatives():
+    await media_derivatives.start()
+
+
+@app.on_event("shutdown")
+async def stop_media_derivatives():
+    await media_derivatives.stop()
+
+
+@app.on_event("startup")
+async def start_media_reconciliation():
+    await media_reconciler.start()
+
+
+@app.on_event("shutdown")
+async def stop_media_reconciliation():
+    await media_reconciler.stop()
+
+
+@app.on_event("startup")
+async def start_reservation_sweeper():
+    await reservation_sweeper.start()
+
+
+@app.on_event("shutdown")
+async def stop_reservation_sweeper():
+    await reservation_sweeper.stop()
+
+
+@app.on_event("shutdown")
+def close_media_storage():
+    media_storage.close()
+
+
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
@@ -507,7 +768,7 @@ def debug_env():
 async def serve_media(filename: str):
     """S3から画像を取得するためのリダイレクト"""
     if USE_S3:
-        s3_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/media/{filename}"
+        s3_url = s3_url_for_key(f"media/{filename}")
         return RedirectResponse(url=s3_url, status_code=307)
     else:
         # ローカルファイルシステムにフォールバック（StaticFilesでマウント済み）
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, CheckConstraint, UniqueConstraint, BigInteger, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, CheckConstraint, UniqueConstraint, BigInteger, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -134,9 +134,25 @@ class MediaAsset(Base):
     size_bytes = Column(BigInteger)
     width = Column(Integer)
     height = Column(Integer)
+    # Resized variants: {"thumb": {"width": 320, "webp": url, "jpeg": url}, ...}
+    thumb_url = Column(String(500))
+    variants = Column(JSON)
+    derivatives_status = Column(String(20))  # ready / failed / unsupported, NULL = not generated yet
+    # SHA-256 of the content; same user + same hash reuses the asset and bumps ref_count
+    content_hash = Column(String(64))
+    ref_count = Column(Integer, nullable=False, default=1, server_default="1")
+    # Display order in the user's image library (NULL = unordered, listed after ordered ones, newest first)
+    position = Column(Integer)
+    # Set by the reconciliation job when the stored object is gone
+    missing_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="media_assets")
+    
+    __table_args__ = (
+        UniqueConstraint("user_id", "content_hash", name="uq_media_assets_user_content_hash"),
+        Index("ix_media_assets_user_position", "user_id", "position", "id"),
+    )
 
 class Category(Base):
     __tablename__ = "categories"
@@ -216,6 +232,7 @@ class Comment(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     parent_id = Column(Integer, ForeignKey("comments.id"))
     body = Column(Text, nullable=False)
+    original_lang = Column(String(10), nullable=True, default="unknown")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -517,6 +534,7 @@ class Message(Base):
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     body = Column(Text, nullable=True)
+    original_lang = Column(String(10), nullable=True, default="unknown")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     read_at = Column(DateTime(timezone=True))
     
@@ -608,6 +626,16 @@ class SalonRoom(Base):
     creator = relationship("User")
     participants = relationship("SalonParticipant", back_populates="room")
     messages = relationship("SalonMessage", back_populates="room")
+    identities = relationship("SalonRoomIdentity", back_populates="room", cascade="all, delete-orphan")
+
+
+class SalonRoomIdentity(Base):
+    __tablename__ = "salon_room_identities"
+
+    room_id = Column(Integer, ForeignKey("salon_rooms.id", ondelete="CASCADE"), primary_key=True)
+    identity = Column(String(50), primary_key=True, index=True)  # target_identities の正規化（SQLで絞り込むため）
+
+    room = relationship("SalonRoom", back_populates="identities")
 
 
 class SalonParticipant(Base):
@@ -635,8 +663,13 @@ class SalonMessage(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_anonymous = Column(Boolean, default=False)
     body = Column(Text, nullable=False)
+    original_lang = Column(String(10), nullable=True, default="unknown")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_salon_messages_room_created", "room_id", "created_at", "id"),
+    )
+
     room = relationship("SalonRoom", back_populates="messages")
     user = relationship("User")
     translations = relationship("SalonMessageTranslation", back_populates="salon_message", cascade="all, delete-orphan")
@@ -767,7 +800,8 @@ class JewelryProduct(Base):
     additional_info = Column(Text)  # その他補足情報
     price = Column(Integer, nullable=False)  # 価格（円）
     price_includes_tax = Column(Boolean, default=True)  # 税込みかどうか
-    stock = Column(Integer, default=0)  # 在庫数（0=無制限または管理しない）
+    stock = Column(Integer, default=0)  # 在庫数（track_stock=False なら無制限）
+    track_stock = Column(Boolean, nullable=False, default=False)  # 在庫を管理するか（True なら stock=0 は売り切れ）
     category = Column(String(50), default="jewelry")  # 固定値: jewelry
     is_active = Column(Boolean, default=True)  # 販売中かどうか
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -825,7 +859,7 @@ class Order(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    status = Column(String(20), nullable=False, default="pending")  # pending, paid, shipped, delivered, cancelled
+    status = Column(String(20), nullable=False, default="pending")  # pending, paid, shipped, delivered, cancelled, refunded, needs_attention
     total_amount = Column(Integer, nullable=False)  # 合計金額（円）
     
     # 配送先情報
@@ -839,12 +873,16 @@ class Order(Base):
     stripe_payment_intent_id = Column(String(255))
     stripe_charge_id = Column(String(255))
     
+    # 在庫確保の期限（pending の間だけ。過ぎたら注文をキャンセルして在庫を戻す）
+    reserved_until = Column(DateTime(timezone=True))
+    
     paid_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     __table_args__ = (
-        CheckConstraint("status IN ('pending', 'paid', 'shipped', 'delivered', 'cancelled')", name="check_order_status"),
+        CheckConstraint("status IN ('pending', 'paid', 'shipped', 'delivered', 'cancelled', 'refunded', 'needs_attention')", name="check_order_status"),
+        Index("ix_orders_status_reserved_until", "status", "reserved_until"),
     )
 
     user = relationship("User")
@@ -999,6 +1037,29 @@ class SalonMessageTranslation(Base):
     salon_message = relationship("SalonMessage", back_populates="translations")
 
 
+# 翻訳のプロセス間クレーム: 同じ (entity, lang) の翻訳APIコールを1ワーカーに限定
+class TranslationClaim(Base):
+    __tablename__ = "translation_claims"
+
+    entity_type = Column(String(20), primary_key=True)  # post, comment, message, salon_message
+    entity_id = Column(Integer, primary_key=True)
+    lang = Column(String(10), primary_key=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# 翻訳メモリ: (正規化テキスト, 元言語, 翻訳先言語, プロバイダ/モデル) のハッシュで全エンティティ共通
+class TranslationMemory(Base):
+    __tablename__ = "translation_memory"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False, unique=True, index=True)
+    target_lang = Column(String(10), nullable=False)
+    provider = Column(String(50), nullable=False)
+    translated_title = Column(Text, nullable=True)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class BlogPost(Base):
     __tablename__ = "blog_posts"
 
@@ -1035,3 +1096,35 @@ class AuditLog(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     admin = relationship("User")
+
+
+# Unified search index over posts, blog articles, salon rooms, courses, flea market items and
+# donation projects. One row per searchable document, kept in sync by the routers' write hooks.
+# Full-text columns (search_vector / FTS5) are managed by app.services.listing_search.
+class SearchDocument(Base):
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String(30), nullable=False)  # post, blog, salon_room, course, flea_market_item, donation_project
+    doc_id = Column(String(64), nullable=False)
+    title = Column(String(300))
+    body = Column(Text, nullable=False, default="")
+    slug = Column(String(300))
+    visibility = Column(String(20), nullable=False, default="public")  # public, members
+    created_at = Column(DateTime(timezone=True))  # of the source document
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("doc_type", "doc_id", name="uq_search_documents_doc"),
+        CheckConstraint("visibility IN ('public', 'members')", name="check_search_document_visibility"),
+    )
+
+
+# Version counters of in-process caches (e.g. the jewelry catalog). Writers bump the row in
+# their transaction; every process compares it with the version of its cached copy.
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
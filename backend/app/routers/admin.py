@@ -3,14 +3,10 @@ import json
 import os
 import re
 import io
-import imghdr
 import logging
 from datetime import datetime, timezone
 from typing import Optional, List
-from pathlib import Path
 
-import boto3
-from botocore.exceptions import ClientError
 from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Query, status
 from pydantic import BaseModel, EmailStr
 from sqlalchemy import or_, func as sa_func
@@ -21,6 +17,8 @@ from slowapi.util import get_remote_address
 from app.database import get_db
 from app.auth import get_current_admin_user, verify_password, create_access_token, get_password_hash
 from app.models import User, BlogPost, AuditLog
+from app.services.media_upload import UploadRejected, UploadStorageError, store_upload
+from app.services.search_index import delete_search_document, sync_search_document
 
 logger = logging.getLogger(__name__)
 
@@ -28,20 +26,6 @@ UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "5"))
 UPLOAD_ALLOWED_EXT = set(os.getenv("UPLOAD_ALLOWED_EXT", "jpg,jpeg,png,webp").split(","))
 ALLOWED_MIME = {"image/jpeg", "image/png", "image/webp"}
 
-S3_BUCKET = os.getenv("AWS_S3_BUCKET", "rainbow-community-media-prod")
-S3_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
-USE_S3 = os.getenv("USE_S3", "false").lower() == "true"
-
-if USE_S3:
-    s3_client = boto3.client(
-        "s3",
-        region_name=S3_REGION,
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-else:
-    s3_client = None
-
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1600"))
@@ -206,36 +190,20 @@ async def upload_image(
         raise HTTPException(status_code=400, detail=f"Invalid extension: {ext}")
     if file.content_type not in ALLOWED_MIME:
         raise HTTPException(status_code=400, detail=f"Invalid content type: {file.content_type}")
-    data = await file.read()
-    if len(data) > UPLOAD_MAX_MB * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large")
-    kind = imghdr.what(None, h=data)
-    if kind not in ("jpeg", "png", "webp", "rgb"):
-        raise HTTPException(status_code=400, detail="Invalid image content")
 
     fname = f"{uuid.uuid4().hex}.{ext}"
-
-    if USE_S3 and s3_client:
-        try:
-            s3_key = f"media/blog/{fname}"
-            s3_client.put_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key,
-                Body=data,
-                ContentType=file.content_type or "application/octet-stream",
-            )
-            url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
-        except ClientError as e:
-            raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
-    else:
-        media_base = os.getenv("MEDIA_DIR")
-        if not media_base:
-            media_base = "/data/media" if os.path.exists("/data") else "media"
-        media_dir = Path(media_base) / "blog"
-        media_dir.mkdir(parents=True, exist_ok=True)
-        fpath = media_dir / fname
-        fpath.write_bytes(data)
-        url = f"/media/blog/{fname}"
+    try:
+        stored = await store_upload(
+            file,
+            f"media/blog/{fname}",
+            max_bytes=UPLOAD_MAX_MB * 1024 * 1024,
+            allowed_types=ALLOWED_MIME,
+        )
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadStorageError as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    url = stored.url
 
     _write_audit(db, current_user.id, "IMAGE_UPLOAD", request, target_type="blog", metadata={"filename": fname})
     return {"url": url, "filename": fname}
@@ -416,6 +384,7 @@ def publish_blog(
     post.published_at = now
     db.commit()
     db.refresh(post)
+    sync_search_document(db, post)
     _write_audit(db, current_user.id, "BLOG_PUBLISH", request, target_type="blog", target_id=str(post.id))
     return BlogPublishResponse(id=str(post.id), slug=post.slug, status=post.status, published_at=post.published_at)
 
@@ -435,6 +404,7 @@ def delete_blog(
     if not post:
         raise HTTPException(status_code=404, detail="Blog not found")
     _write_audit(db, current_user.id, "BLOG_DELETE", request, target_type="blog", target_id=str(post.id), metadata={"title": post.title})
+    delete_search_document(db, BlogPost, post.id)
     db.delete(post)
     db.commit()
     return {"ok": True}
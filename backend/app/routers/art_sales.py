@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import desc, asc
 from typing import List, Optional
 
 from ..database import get_db
 from .. import models, schemas
 from ..auth import get_current_user, get_current_active_user
+from ..services.listing_search import apply_keyword_search
+from ..services.sellers import seller_summaries
 
 router = APIRouter(prefix="/api/art-sales", tags=["art-sales"])
 
@@ -29,26 +31,44 @@ def get_categories():
 
 @router.get("/items", response_model=List[schemas.ArtSaleItem])
 def list_items(
+    keyword: Optional[str] = None,
     category: Optional[str] = None,
     status: Optional[str] = "active",
+    sort: Optional[str] = Query(None, regex="^(relevance|newest|price_asc|price_desc)$"),
     skip: int = 0,
     limit: int = 20,
     db: Session = Depends(get_db),
 ):
-    """List all art sale items with optional filters"""
-    query = db.query(models.ArtSaleItem)
+    """List all art sale items with optional filters.
+    With a keyword the default sort is relevance; other sorts break ties by relevance.
+    """
+    query = db.query(models.ArtSaleItem).options(selectinload(models.ArtSaleItem.images))
     
     if category:
         query = query.filter(models.ArtSaleItem.category == category)
     if status:
         query = query.filter(models.ArtSaleItem.status == status)
     
-    items = query.order_by(desc(models.ArtSaleItem.created_at)).offset(skip).limit(limit).all()
+    query, rank = apply_keyword_search(db, query, models.ArtSaleItem, keyword)
+    if sort is None:
+        sort = "relevance" if rank is not None else "newest"
+    if sort == "relevance" and rank is not None:
+        query = query.order_by(desc(rank), desc(models.ArtSaleItem.created_at))
+    elif sort == "price_asc":
+        query = query.order_by(asc(models.ArtSaleItem.price))
+    elif sort == "price_desc":
+        query = query.order_by(desc(models.ArtSaleItem.price))
+    else:
+        query = query.order_by(desc(models.ArtSaleItem.created_at))
+    if rank is not None and sort != "relevance":
+        query = query.order_by(desc(rank))
     
+    items = query.offset(skip).limit(limit).all()
+    
+    sellers = seller_summaries(db, (item.seller_id for item in items))
     result = []
     for item in items:
-        profile = db.query(models.Profile).filter(models.Profile.user_id == item.seller_id).first()
-        user = db.query(models.User).filter(models.User.id == item.seller_id).first()
+        display_name, avatar_url = sellers.get(item.seller_id, (None, None))
         result.append({
             "id": item.id,
             "user_id": item.seller_id,
@@ -66,8 +86,8 @@ def list_items(
             "created_at": item.created_at,
             "updated_at": item.updated_at,
             "images": [{"id": img.id, "image_url": img.image_url, "display_order": img.display_order} for img in item.images],
-            "user_display_name": user.display_name if user else None,
-            "user_avatar_url": profile.avatar_url if profile else None,
+            "user_display_name": display_name,
+            "user_avatar_url": avatar_url,
         })
     
     return result
@@ -262,7 +282,7 @@ def get_my_items(
     current_user: models.User = Depends(get_current_user),
 ):
     """Get all items posted by the current user"""
-    items = db.query(models.ArtSaleItem).filter(
+    items = db.query(models.ArtSaleItem).options(selectinload(models.ArtSaleItem.images)).filter(
         models.ArtSaleItem.seller_id == current_user.id
     ).order_by(desc(models.ArtSaleItem.created_at)).all()
     
@@ -6,6 +6,7 @@ from app.database import get_db
 from app.models import User, Comment, PointEvent
 from app.schemas import Comment as CommentSchema, CommentCreate, CommentUpdate
 from app.auth import get_current_active_user
+from app.services.language_detection import detect_language_code
 
 router = APIRouter(prefix="/api/comments", tags=["comments"])
 
@@ -28,7 +29,7 @@ async def create_comment(
     db: Session = Depends(get_db)
 ):
     user_id = current_user.id
-    db_comment = Comment(**comment.dict(), user_id=user_id)
+    db_comment = Comment(**comment.dict(), user_id=user_id, original_lang=detect_language_code(comment.body))
     db.add(db_comment)
     db.commit()
     db.refresh(db_comment)
@@ -60,6 +61,8 @@ async def update_comment(
     
     for field, value in comment_update.dict(exclude_unset=True).items():
         setattr(comment, field, value)
+    if comment_update.body is not None:
+        comment.original_lang = detect_language_code(comment.body)
     
     db.commit()
     db.refresh(comment)
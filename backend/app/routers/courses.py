@@ -21,6 +21,7 @@ from sqlalchemy import desc
 from app.database import get_db
 from app.auth import get_current_active_user, get_optional_user
 from app import models, schemas
+from app.services.search_index import delete_search_document, sync_search_document
 
 router = APIRouter(prefix="/api/courses", tags=["courses"])
 
@@ -215,6 +216,7 @@ def create_course(
     
     db.commit()
     db.refresh(course)
+    sync_search_document(db, course)
     
     return get_course_response(course, db)
 
@@ -306,6 +308,7 @@ def update_course(
     
     db.commit()
     db.refresh(course)
+    sync_search_document(db, course)
     
     return get_course_response(course, db)
 
@@ -325,6 +328,7 @@ def delete_course(
     if course.owner_user_id != current_user.id and current_user.membership_type != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this course")
     
+    delete_search_document(db, models.Course, course_id)
     db.delete(course)
     db.commit()
     
@@ -11,6 +11,8 @@ from botocore.exceptions import ClientError
 from app.database import get_db
 from app.auth import get_current_active_user
 from app.models import DonationProject, DonationSupport, DonationProjectImage, User
+from app.services.language_detection import detect_language_code
+from app.services.search_index import delete_search_document, sync_search_document
 
 # S3設定 - 開発環境ではローカルストレージを使用
 S3_BUCKET = os.getenv("AWS_S3_BUCKET", "rainbow-community-media-prod")
@@ -123,6 +125,7 @@ def create_project(
         )
         db.add(project_image)
     db.commit()
+    sync_search_document(db, project)
     
     return {
         "id": project.id,
@@ -237,6 +240,7 @@ def update_project(
     
     db.commit()
     db.refresh(project)
+    sync_search_document(db, project)
     
     # 画像を取得
     images = db.query(DonationProjectImage).filter(
@@ -276,6 +280,7 @@ def delete_project(
     
     # 画像を削除
     db.query(DonationProjectImage).filter(DonationProjectImage.project_id == project_id).delete()
+    delete_search_document(db, DonationProject, project_id)
     
     # プロジェクトを削除
     db.delete(project)
@@ -324,7 +329,7 @@ def send_support_message(
         db.refresh(chat)
     
     # メッセージを送信
-    msg = Message(chat_id=chat.id, sender_id=current_user.id, body=request.message)
+    msg = Message(chat_id=chat.id, sender_id=current_user.id, body=request.message, original_lang=detect_language_code(request.message))
     db.add(msg)
     db.commit()
     db.refresh(msg)
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import desc, asc
 from typing import List, Optional
 from app.database import get_db
 from app.auth import get_current_user, get_optional_user
 from app import models, schemas
+from app.services.media_derivatives import thumb_urls_for_urls
+from app.services.listing_search import apply_keyword_search
+from app.services.search_index import delete_search_document, sync_search_document
+from app.services.sellers import seller_summaries
 
 router = APIRouter(prefix="/api/flea-market", tags=["flea-market"])
 
@@ -51,15 +55,17 @@ def list_items(
     keyword: Optional[str] = None,
     category: Optional[str] = None,
     region: Optional[str] = None,
-    sort: str = Query("newest", regex="^(newest|price_asc|price_desc|negotiable)$"),
+    sort: Optional[str] = Query(None, regex="^(relevance|newest|price_asc|price_desc|negotiable)$"),
     status: str = Query("active", regex="^(active|sold|all)$"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_optional_user),
 ):
-    """List flea market items with filters and sorting"""
-    query = db.query(models.FleaMarketItem)
+    """List flea market items with filters and sorting.
+    With a keyword the default sort is relevance; other sorts break ties by relevance.
+    """
+    query = db.query(models.FleaMarketItem).options(selectinload(models.FleaMarketItem.images))
     
     # Filter by status
     if status == "active":
@@ -68,13 +74,10 @@ def list_items(
         query = query.filter(models.FleaMarketItem.status == "sold")
     # "all" shows everything
     
-    # Filter by keyword (search in title and description)
-    if keyword:
-        search_term = f"%{keyword}%"
-        query = query.filter(
-            (models.FleaMarketItem.title.ilike(search_term)) |
-            (models.FleaMarketItem.description.ilike(search_term))
-        )
+    # Full-text search in title and description (tsvector + pg_trgm / SQLite FTS5)
+    query, rank = apply_keyword_search(db, query, models.FleaMarketItem, keyword)
+    if sort is None:
+        sort = "relevance" if rank is not None else "newest"
     
     # Filter by category
     if category:
@@ -85,7 +88,9 @@ def list_items(
         query = query.filter(models.FleaMarketItem.region == region)
     
     # Sorting
-    if sort == "newest":
+    if sort == "relevance" and rank is not None:
+        query = query.order_by(desc(rank), desc(models.FleaMarketItem.created_at))
+    elif sort in ("newest", "relevance"):
         query = query.order_by(desc(models.FleaMarketItem.created_at))
     elif sort == "price_asc":
         query = query.order_by(asc(models.FleaMarketItem.price))
@@ -97,15 +102,19 @@ def list_items(
             desc(models.FleaMarketItem.transaction_method == "negotiable"),
             desc(models.FleaMarketItem.created_at)
         )
+    if rank is not None and sort != "relevance":
+        query = query.order_by(desc(rank))
     
     # Pagination
     items = query.offset(offset).limit(limit).all()
     
-    # Enrich with user info
+    thumb_urls = thumb_urls_for_urls(db, (img.image_url for item in items for img in item.images))
+    
+    # Enrich with user info (one query for all sellers on the page)
+    sellers = seller_summaries(db, (item.seller_id for item in items))
     result = []
     for item in items:
-        user = db.query(models.User).filter(models.User.id == item.seller_id).first()
-        profile = db.query(models.Profile).filter(models.Profile.user_id == item.seller_id).first()
+        display_name, avatar_url = sellers.get(item.seller_id, (None, None))
         
         item_dict = {
             "id": item.id,
@@ -119,9 +128,9 @@ def list_items(
             "status": item.status,
             "created_at": item.created_at,
             "updated_at": item.updated_at,
-            "images": [{"id": img.id, "image_url": img.image_url, "display_order": img.display_order} for img in item.images],
-            "user_display_name": user.display_name if user else None,
-            "user_avatar_url": profile.avatar_url if profile else None,
+            "images": [{"id": img.id, "image_url": img.image_url, "thumb_url": thumb_urls.get(img.image_url), "display_order": img.display_order} for img in item.images],
+            "user_display_name": display_name,
+            "user_avatar_url": avatar_url,
         }
         result.append(item_dict)
     
@@ -200,6 +209,7 @@ def create_item(
             db.add(image)
         db.commit()
         db.refresh(item)
+    sync_search_document(db, item)
     
     profile = db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
     
@@ -261,6 +271,7 @@ def update_item(
     
     db.commit()
     db.refresh(item)
+    sync_search_document(db, item)
     
     profile = db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
     
@@ -306,6 +317,7 @@ def delete_item(
     for chat in chats:
         db.query(models.FleaMarketMessage).filter(models.FleaMarketMessage.chat_id == chat.id).delete()
     db.query(models.FleaMarketChat).filter(models.FleaMarketChat.item_id == item_id).delete()
+    delete_search_document(db, models.FleaMarketItem, item_id)
     
     # Delete the item
     db.delete(item)
@@ -516,11 +528,12 @@ def get_my_items(
     current_user: models.User = Depends(get_current_user),
 ):
     """Get all items posted by the current user"""
-    items = db.query(models.FleaMarketItem).filter(
+    items = db.query(models.FleaMarketItem).options(selectinload(models.FleaMarketItem.images)).filter(
         models.FleaMarketItem.seller_id == current_user.id
     ).order_by(desc(models.FleaMarketItem.created_at)).all()
     
     profile = db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
+    thumb_urls = thumb_urls_for_urls(db, (img.image_url for item in items for img in item.images))
     
     result = []
     for item in items:
@@ -536,7 +549,7 @@ def get_my_items(
             "status": item.status,
             "created_at": item.created_at,
             "updated_at": item.updated_at,
-            "images": [{"id": img.id, "image_url": img.image_url, "display_order": img.display_order} for img in item.images],
+            "images": [{"id": img.id, "image_url": img.image_url, "thumb_url": thumb_urls.get(img.image_url), "display_order": img.display_order} for img in item.images],
             "user_display_name": current_user.display_name,
             "user_avatar_url": profile.avatar_url if profile else None,
         })
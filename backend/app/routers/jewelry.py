@@ -2,11 +2,12 @@
 Jewelry Shopping API Router
 ジュエリーEC機能のAPIエンドポイント
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+import logging
 import os
 
 from app.database import get_db
@@ -24,6 +25,15 @@ from app.schemas import (
     ConfirmPaymentRequest
 )
 from app.auth import get_current_user, get_optional_user
+from app.services.jewelry_catalog import (
+    CatalogSnapshot, bump_catalog_version, catalog_etag, jewelry_catalog, product_dict, with_current_stock
+)
+from app.services.inventory import (
+    ORDER_NEEDS_ATTENTION, ORDER_REFUNDED, OutOfStock, release_reservation, reservation_deadline,
+    reservation_expired, reserve_stock, settle_late_payment
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/jewelry", tags=["jewelry"])
 
@@ -42,39 +52,53 @@ def require_premium(user: User):
         )
 
 
+def with_etag(request: Request, response: Response, etag: str, body):
+    """ETagを付ける。ブラウザが同じ版を持っていれば304を返す"""
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"  # 毎回ETagで再検証させる
+    return body
+
+
 # ===== Product Endpoints =====
 
 @router.get("/products", response_model=List[JewelryProductSchema])
 def list_products(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_user)
 ):
     """商品一覧を取得（誰でも閲覧可能）"""
-    products = db.query(JewelryProduct).filter(
-        JewelryProduct.is_active == True
-    ).order_by(desc(JewelryProduct.created_at)).offset(skip).limit(limit).all()
-    return products
+    catalog = jewelry_catalog.get(db)
+    skip = max(skip, 0)
+    page_ids = catalog.ordered_ids[skip:skip + max(limit, 0)]
+    products = with_current_stock(db, (catalog.products[product_id] for product_id in page_ids))
+    return with_etag(request, response, catalog_etag(catalog.version, products, skip, limit), products)
 
 
 @router.get("/products/{product_id}", response_model=JewelryProductSchema)
 def get_product(
     product_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_user)
 ):
     """商品詳細を取得（誰でも閲覧可能）"""
-    product = db.query(JewelryProduct).filter(
-        JewelryProduct.id == product_id,
-        JewelryProduct.is_active == True
-    ).first()
+    catalog = jewelry_catalog.get(db)
+    product = catalog.products.get(product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="商品が見つかりません"
         )
-    return product
+    products = with_current_stock(db, [product])
+    return with_etag(request, response, catalog_etag(catalog.version, products), products[0])
 
 
 @router.post("/products", response_model=JewelryProductSchema)
@@ -99,6 +123,7 @@ def create_product(
         price=product_data.price,
         price_includes_tax=product_data.price_includes_tax,
         stock=product_data.stock or 0,
+        track_stock=product_data.track_stock if product_data.track_stock is not None else (product_data.stock or 0) > 0,
         category="jewelry"
     )
     db.add(product)
@@ -114,6 +139,7 @@ def create_product(
             )
             db.add(image)
     
+    bump_catalog_version(db)
     db.commit()
     db.refresh(product)
     return product
@@ -142,6 +168,11 @@ def update_product(
     
     update_data = product_data.model_dump(exclude_unset=True)
     image_urls = update_data.pop("image_urls", None)
+    # 在庫数を入れたら在庫管理を始める（0 にしても管理中なら売り切れ扱い）
+    if (update_data.get("stock") or 0) > 0 and update_data.get("track_stock") is None:
+        update_data["track_stock"] = True
+    if update_data.get("track_stock") is None:
+        update_data.pop("track_stock", None)
     
     for key, value in update_data.items():
         setattr(product, key, value)
@@ -161,6 +192,7 @@ def update_product(
             )
             db.add(image)
     
+    bump_catalog_version(db)
     db.commit()
     db.refresh(product)
     return product
@@ -188,6 +220,7 @@ def delete_product(
     
     # 論理削除
     product.is_active = False
+    bump_catalog_version(db)
     db.commit()
     return {"message": "商品を削除しました"}
 
@@ -205,15 +238,40 @@ def get_or_create_cart(user_id: int, db: Session) -> Cart:
     return cart
 
 
-def calculate_cart_total(cart: Cart) -> int:
-    """カートの合計金額を計算"""
+def check_stock(product: JewelryProduct, quantity: int) -> None:
+    """在庫確認（在庫管理しない商品は無制限）"""
+    if product.track_stock and quantity > product.stock:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"在庫が不足しています（残り{product.stock}個）"
+        )
+
+
+def calculate_cart_total(cart: Cart, catalog: CatalogSnapshot) -> int:
+    """カートの合計金額を計算（販売中の商品のみ。価格はカタログのキャッシュから）"""
     total = 0
     for item in cart.items:
-        if item.product and item.product.is_active:
-            total += item.product.price * item.quantity
+        product = catalog.products.get(item.product_id)
+        if product:
+            total += product["price"] * item.quantity
     return total
 
 
+def get_cart_products(db: Session, cart: Cart, catalog: CatalogSnapshot) -> Dict[int, dict]:
+    """カート内の商品（在庫は最新）。販売終了した商品だけDBから読む"""
+    products = {}
+    missing = []
+    for item in cart.items:
+        if item.product_id in catalog.products:
+            products[item.product_id] = catalog.products[item.product_id]
+        else:
+            missing.append(item.product_id)
+    if missing:
+        for product in db.query(JewelryProduct).filter(JewelryProduct.id.in_(missing)).all():
+            products[product.id] = product_dict(product)
+    return {p["id"]: p for p in with_current_stock(db, products.values())}
+
+
 @router.get("/cart", response_model=CartSchema)
 def get_cart(
     db: Session = Depends(get_db),
@@ -223,6 +281,8 @@ def get_cart(
     require_premium(current_user)
     
     cart = get_or_create_cart(current_user.id, db)
+    catalog = jewelry_catalog.get(db)
+    products = get_cart_products(db, cart, catalog)
     
     # 合計金額を計算
     cart_dict = {
@@ -230,8 +290,19 @@ def get_cart(
         "user_id": cart.user_id,
         "created_at": cart.created_at,
         "updated_at": cart.updated_at,
-        "items": cart.items,
-        "total_amount": calculate_cart_total(cart)
+        "items": [
+            {
+                "id": item.id,
+                "cart_id": item.cart_id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "created_at": item.created_at,
+                "updated_at": item.updated_at,
+                "product": products.get(item.product_id),
+            }
+            for item in cart.items
+        ],
+        "total_amount": calculate_cart_total(cart, catalog)
     }
     return cart_dict
 
@@ -257,11 +328,7 @@ def add_to_cart(
         )
     
     # 在庫確認
-    if product.stock > 0 and item_data.quantity > product.stock:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"在庫が不足しています（残り{product.stock}個）"
-        )
+    check_stock(product, item_data.quantity)
     
     cart = get_or_create_cart(current_user.id, db)
     
@@ -274,11 +341,7 @@ def add_to_cart(
     if existing_item:
         # 数量を更新
         new_quantity = existing_item.quantity + item_data.quantity
-        if product.stock > 0 and new_quantity > product.stock:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"在庫が不足しています（残り{product.stock}個）"
-            )
+        check_stock(product, new_quantity)
         existing_item.quantity = new_quantity
         db.commit()
         db.refresh(existing_item)
@@ -319,11 +382,7 @@ def update_cart_item(
         )
     
     # 在庫確認
-    if cart_item.product.stock > 0 and item_data.quantity > cart_item.product.stock:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"在庫が不足しています（残り{cart_item.product.stock}個）"
-        )
+    check_stock(cart_item.product, item_data.quantity)
     
     if item_data.quantity <= 0:
         # 数量が0以下なら削除
@@ -400,21 +459,18 @@ def create_order(
             detail="カートが空です"
         )
     
-    # 在庫確認
+    # 販売中か確認（在庫は注文作成時にまとめて確保する）
+    catalog = jewelry_catalog.get(db)
     for item in cart.items:
-        if not item.product or not item.product.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"商品「{item.product.name if item.product else '不明'}」は現在販売されていません"
-            )
-        if item.product.stock > 0 and item.quantity > item.product.stock:
+        if item.product_id not in catalog.products:
+            name = db.query(JewelryProduct.name).filter(JewelryProduct.id == item.product_id).scalar()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"商品「{item.product.name}」の在庫が不足しています（残り{item.product.stock}個）"
+                detail=f"商品「{name or '不明'}」は現在販売されていません"
             )
     
     # 合計金額を計算
-    total_amount = calculate_cart_total(cart)
+    total_amount = calculate_cart_total(cart, catalog)
     
     # 注文を作成
     shipping = order_data.shipping_info
@@ -426,25 +482,39 @@ def create_order(
         postal_code=shipping.postal_code,
         address=shipping.address,
         phone=shipping.phone,
-        email=shipping.email or current_user.email
+        email=shipping.email or current_user.email,
+        reserved_until=reservation_deadline()
     )
     db.add(order)
     db.flush()
     
     # 注文アイテムを作成
     for cart_item in cart.items:
+        product = catalog.products[cart_item.product_id]
         order_item = OrderItem(
             order_id=order.id,
             product_id=cart_item.product_id,
-            product_name=cart_item.product.name,
-            price=cart_item.product.price,
+            product_name=product["name"],
+            price=product["price"],
             quantity=cart_item.quantity
         )
         db.add(order_item)
-        
-        # 在庫を減らす
-        if cart_item.product.stock > 0:
-            cart_item.product.stock -= cart_item.quantity
+    
+    # 在庫を確保（条件付き UPDATE で原子的に減らす。足りなければ注文ごと取り消す）
+    quantities = {}
+    for cart_item in cart.items:
+        quantities[cart_item.product_id] = quantities.get(cart_item.product_id, 0) + cart_item.quantity
+    try:
+        reserve_stock(db, quantities)
+    except OutOfStock as e:
+        db.rollback()
+        product = db.query(JewelryProduct).filter(JewelryProduct.id == e.product_id).first()
+        name = product.name if product else "不明"
+        if e.remaining is None:
+            detail = f"商品「{name}」は現在販売されていません"
+        else:
+            detail = f"商品「{name}」の在庫が不足しています（残り{e.remaining}個）"
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
     
     # カートを空にする
     db.query(CartItem).filter(CartItem.cart_id == cart.id).delete()
@@ -493,6 +563,27 @@ def get_order(
     return order
 
 
+@router.get("/admin/orders", response_model=List[OrderSchema])
+def list_orders_for_admin(
+    order_status: Optional[str] = ORDER_NEEDS_ATTENTION,
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """注文を状態で絞り込んで取得（管理者のみ）。既定は対応が必要な注文"""
+    if current_user.membership_type != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理者のみ閲覧できます"
+        )
+    
+    query = db.query(Order)
+    if order_status:
+        query = query.filter(Order.status == order_status)
+    return query.order_by(desc(Order.created_at)).offset(skip).limit(limit).all()
+
+
 # ===== Stripe Payment Endpoints =====
 
 @router.post("/payments/create-intent", response_model=CreatePaymentIntentResponse)
@@ -516,6 +607,15 @@ def create_payment_intent(
             detail="注文が見つかりません"
         )
     
+    # 在庫確保の期限切れ
+    if reservation_expired(order):
+        release_reservation(db, order)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="注文の有効期限が切れました。もう一度注文してください"
+        )
+    
     # Stripe APIキーを取得
     stripe_secret_key = os.environ.get("STRIPE_SECRET_KEY")
     if not stripe_secret_key:
@@ -591,17 +691,46 @@ def confirm_payment(
         intent = stripe.PaymentIntent.retrieve(request.payment_intent_id)
         
         if intent.status == "succeeded":
-            order.status = "paid"
-            order.paid_at = datetime.utcnow()
+            # pending -> paid（在庫確保済み）。期限切れ処理と競合しないよう条件付きで更新する
+            paid = db.query(Order).filter(Order.id == order.id, Order.status == "pending").update(
+                {"status": "paid", "paid_at": datetime.utcnow(), "reserved_until": None},
+                synchronize_session=False
+            )
+            if not paid:
+                db.refresh(order)
+                if order.status == "cancelled":
+                    # 期限切れで在庫を戻した後に決済された: 確保し直す（在庫がなければ返金）
+                    settle_late_payment(db, order)
             if intent.latest_charge:
                 order.stripe_charge_id = intent.latest_charge
             db.commit()
+            db.refresh(order)
+            if order.status == ORDER_REFUNDED:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="注文の有効期限が切れ、在庫がなくなったため返金しました"
+                )
+            if order.status == ORDER_NEEDS_ATTENTION:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="注文の有効期限が切れ、在庫がなくなりました。返金について運営からご連絡します"
+                )
             return {"message": "決済が完了しました", "order_id": order.id}
+        elif intent.status == "canceled":
+            # 決済が取り消された: 在庫を戻す
+            release_reservation(db, order)
+            db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="決済がキャンセルされました"
+            )
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"決済が完了していません（状態: {intent.status}）"
             )
+    except HTTPException:
+        raise
     except stripe.error.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
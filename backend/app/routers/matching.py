@@ -5,6 +5,8 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User, MatchingProfile, Hobby, MatchingProfileHobby, MatchingProfileImage, Like, Match, Chat, Message, ChatRequest, ChatRequestMessage
 from app.auth import get_current_active_user, get_optional_user
+from app.services.language_detection import detect_language_code
+from app.services.media_derivatives import thumb_urls_for_urls
 from jose import jwt, JWTError
 import os
 from datetime import datetime
@@ -286,6 +288,12 @@ def search_profiles(
         except Exception:
             pass
     
+    avatar_urls = {
+        prof.user_id: main_images.get(prof.user_id) or getattr(prof, 'avatar_url', None) or ""
+        for prof, _ in rows
+    }
+    thumb_urls = thumb_urls_for_urls(db, avatar_urls.values())
+    
     items = [
         {
             "user_id": prof.user_id,
@@ -295,7 +303,8 @@ def search_profiles(
             "age_band": prof.age_band,
             "identity": prof.identity,
             "romance_targets": prof.romance_targets or [],
-            "avatar_url": main_images.get(prof.user_id) or getattr(prof, 'avatar_url', None) or "",
+            "avatar_url": avatar_urls[prof.user_id],
+            "avatar_thumb_url": thumb_urls.get(avatar_urls[prof.user_id], avatar_urls[prof.user_id]),
         }
         for prof, user in rows
     ]
@@ -541,7 +550,7 @@ def send_message(
     if not body_text:
         raise HTTPException(status_code=400, detail="Body is required")
     
-    msg = Message(chat_id=ch.id, sender_id=current_user.id, body=body_text)
+    msg = Message(chat_id=ch.id, sender_id=current_user.id, body=body_text, original_lang=detect_language_code(body_text))
     db.add(msg)
     db.commit()
     db.refresh(msg)
@@ -639,7 +648,7 @@ async def ws_chat(websocket: WebSocket):
             # Persist message
             with next(get_db()) as db:
                 ch = _ensure_chat_access(chat_id, user.id, db)
-                msg = Message(chat_id=chat_id, sender_id=user.id, body=body)
+                msg = Message(chat_id=chat_id, sender_id=user.id, body=body, original_lang=detect_language_code(body))
                 db.add(msg)
                 db.commit()
                 db.refresh(msg)
@@ -990,6 +999,7 @@ def accept_chat_request(
                 chat_id=chat_id,
                 sender_id=pm.from_user_id,
                 body=pm.content,
+                original_lang=detect_language_code(pm.content),
                 created_at=pm.created_at
             )
             db.add(msg)
@@ -1,41 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Query
 from fastapi import Body
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.database import get_db
 from app.models import User, MediaAsset
-from app.auth import get_current_active_user
-import os
+from app.auth import get_current_active_user, get_current_admin_user, SECRET_KEY
+from app.schemas import MediaUploadRequest, MediaUploadTicket, MediaFinalizeRequest
+from app.services.media_upload import UploadRejected, UploadStorageError, store_upload, sniff_image_type
+from app.services.media_assets import delete_stored_object, register_upload, release_media
+from app.services.media_derivatives import media_derivatives, thumb_url_for
+from app.services.media_library import InvalidCursor, list_library_page, save_positions
+from app.services.presigned_upload import (
+    LocalUploadSigner, S3UploadSigner, key_belongs_to, upload_key, verify_stored_upload
+)
+from app.services.storage import S3StorageBackend, get_media_dir, media_storage
 import uuid
-from pathlib import Path
-import json
-import boto3
-from botocore.exceptions import ClientError
 
 router = APIRouter(prefix="/api/media", tags=["media"])
 
-# S3設定 - 開発環境ではローカルストレージを使用
-S3_BUCKET = os.getenv("AWS_S3_BUCKET", "rainbow-community-media-prod")
-S3_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
-USE_S3 = os.getenv("USE_S3", "true").lower() == "true"  # 本番はS3を使用
-
-# S3クライアント初期化
-if USE_S3:
-    s3_client = boto3.client(
-        's3',
-        region_name=S3_REGION,
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-else:
-    s3_client = None
-
-# ローカルストレージ（フォールバック）
-media_base = os.getenv("MEDIA_DIR")
-if not media_base:
-    media_base = "/data/media" if os.path.exists("/data") else "media"
-MEDIA_DIR = Path(media_base)
+# 画像の保存先は media_storage（S3 またはローカル）
+MEDIA_DIR = get_media_dir()
 MEDIA_DIR.mkdir(parents=True, exist_ok=True)
 
+ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/webp']
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
+
+# 署名付きURLの発行元（S3 未使用時はローカルの署名付きアップロード先で代用）
+if isinstance(media_storage.backend, S3StorageBackend):
+    upload_signer = S3UploadSigner(media_storage.backend.client, media_storage.backend.bucket)
+else:
+    upload_signer = LocalUploadSigner(SECRET_KEY)
+
 @router.post("/upload")
 async def upload_image(
     file: UploadFile = File(...),
@@ -43,93 +38,149 @@ async def upload_image(
     db: Session = Depends(get_db)
 ):
     # Validate content type defensively (content_type can be None)
-    allowed_types = ['image/jpeg', 'image/png', 'image/webp']
+    allowed_types = ALLOWED_IMAGE_TYPES
     if not file.content_type or file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Only JPEG, PNG, and WEBP images are allowed")
 
-    # Read content to determine size (UploadFile has no .size attribute)
-    content = await file.read()
-    max_bytes = 10 * 1024 * 1024  # 10MB
-    if len(content) > max_bytes:
-        raise HTTPException(status_code=400, detail="File too large")
-
+    max_bytes = MAX_UPLOAD_BYTES
     file_extension = file.filename.split('.')[-1] if file.filename and '.' in file.filename else 'jpg'
     unique_filename = f"{uuid.uuid4()}.{file_extension}"
     
-    if USE_S3 and s3_client:
-        # S3にアップロード
-        try:
-            s3_key = f"media/{unique_filename}"
-            s3_client.put_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key,
-                Body=content,
-                ContentType=file.content_type or "application/octet-stream"
-            )
-            # S3のURL
-            url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
-        except ClientError as e:
-            raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
-    else:
-        # ローカルファイルシステムにフォールバック
-        file_path = MEDIA_DIR / unique_filename
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-        url = f"/media/{unique_filename}"
-
-    media_asset = MediaAsset(
-        user_id=current_user.id,
-        url=url,
-        mime_type=file.content_type or "application/octet-stream",
-        size_bytes=len(content)
+    # チャンク単位でS3（マルチパート）またはローカルへストリーミング保存
+    try:
+        stored = await store_upload(file, f"media/{unique_filename}", max_bytes=max_bytes, allowed_types=allowed_types)
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadStorageError as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    url = stored.url
+
+    # 同じユーザーが同じ内容を再アップロードした場合は既存アセットを参照カウントで共有
+    media_asset, kept = register_upload(
+        db, current_user.id, url, stored.content_type, stored.size_bytes, stored.sha256
     )
-    db.add(media_asset)
-    db.commit()
-    db.refresh(media_asset)
+    if not kept:
+        await media_storage.run(delete_stored_object, url)
+        return {"id": media_asset.id, "url": media_asset.url}
+
+    # サムネイル・WebP 派生画像はバックグラウンドで生成
+    media_derivatives.request([media_asset.id])
     
     return {"id": media_asset.id, "url": media_asset.url}
 
 
+@router.post("/uploads", response_model=MediaUploadTicket)
+def create_upload_ticket(
+    payload: MediaUploadRequest,
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Step 1 of a direct upload: issue a presigned PUT for the client to send the
+    file straight to storage, then call /finalize with the returned key.
+    """
+    if payload.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=400, detail="Only JPEG, PNG, and WEBP images are allowed")
+    if payload.size_bytes <= 0 or payload.size_bytes > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=400, detail="File too large")
+    key = upload_key(current_user.id, payload.content_type)
+    return upload_signer.presign(key, payload.content_type, payload.size_bytes)
+
+
+@router.post("/uploads/finalize")
+def finalize_upload(
+    payload: MediaFinalizeRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Step 2 of a direct upload: verify the stored object and register it as a MediaAsset."""
+    if not key_belongs_to(payload.key, current_user.id):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    url = media_storage.url_for(payload.key)
+
+    # 再送された finalize は同じアセットを返す
+    existing = db.query(MediaAsset).filter(MediaAsset.url == url).first()
+    if existing:
+        return {"id": existing.id, "url": existing.url}
+
+    try:
+        stored = verify_stored_upload(media_storage, payload.key, MAX_UPLOAD_BYTES, ALLOWED_IMAGE_TYPES)
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 通常のアップロードと同じく、同一内容は既存アセットを共有する
+    media_asset, kept = register_upload(
+        db, current_user.id, url, sniff_image_type(stored.head), stored.size_bytes, stored.sha256
+    )
+    if not kept:
+        delete_stored_object(url)
+        return {"id": media_asset.id, "url": media_asset.url}
+    media_derivatives.request([media_asset.id])
+    return {"id": media_asset.id, "url": media_asset.url}
+
+
+@router.put("/direct/{key:path}")
+async def direct_upload(
+    key: str,
+    request: Request,
+    content_type: str,
+    size: int,
+    expires: int,
+    signature: str
+):
+    """Local stand-in for the presigned S3 PUT, used when S3 is disabled."""
+    if not isinstance(upload_signer, LocalUploadSigner):
+        raise HTTPException(status_code=404, detail="Not found")
+    if not upload_signer.verify(key, content_type, size, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+    if request.headers.get("content-type") != content_type:
+        raise HTTPException(status_code=400, detail="Content-Type does not match the signed upload")
+
+    writer = await media_storage.run(media_storage.open_writer, key, content_type)
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > size:
+                raise HTTPException(status_code=400, detail="Body larger than the signed size")
+            await media_storage.run(writer.write, chunk)
+        if received != size:
+            raise HTTPException(status_code=400, detail="Body size does not match the signed size")
+        await media_storage.run(writer.commit)
+    except BaseException:
+        await media_storage.run(writer.abort)
+        raise
+    return {"status": "ok"}
+
+
+@router.get("/storage/metrics")
+def get_storage_metrics(current_user: User = Depends(get_current_admin_user)):
+    """Media storage backend and per-operation latency / retry counters. Admin only."""
+    return media_storage.metrics()
+
+
 @router.get("/user/images")
 def list_user_images(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get all images uploaded by the current user, ordered by newest first."""
-    assets = (
-        db.query(MediaAsset)
-        .filter(MediaAsset.user_id == current_user.id)
-        .filter(MediaAsset.mime_type.like('image/%'))
-        .order_by(MediaAsset.created_at.desc())
-        .all()
-    )
-    
-    if USE_S3:
-        valid_assets = assets
-    else:
-        # ローカルストレージ使用時のみファイル存在チェック
-        valid_assets = []
-        for a in assets:
-            file_path = MEDIA_DIR / a.url.split('/')[-1]
-            if file_path.exists():
-                valid_assets.append(a)
-            else:
-                # ファイルが存在しない場合でも、他テーブルから参照されている可能性があるため
-                # ここではレコード削除は行わず、ログ出力のみに留める
-                print(f"Skipping orphaned media record (not deleting to avoid FK issues): {a.id}, missing file: {file_path}")
-
-    # ユーザーごとの順序ファイルがあれば、その順序で並べ替え
+    """Get the current user's images in their saved order, unordered ones newest first.
+    Pass limit (and the returned next_cursor) to page through large libraries.
+    """
+    # 並び順は MediaAsset.position、実体の存在確認は定期リコンサイルジョブ（missing_at）で管理
     try:
-        order_file = MEDIA_DIR / f"user_{current_user.id}_order.json"
-        if order_file.exists():
-            with open(order_file, 'r', encoding='utf-8') as f:
-                id_order = json.load(f) or []
-            pos = {int(i): idx for idx, i in enumerate(id_order)}
-            valid_assets.sort(key=lambda a: pos.get(int(a.id), 1_000_000))
-    except Exception as e:
-        print(f"order apply failed: {e}")
+        assets, next_cursor = list_library_page(db, current_user.id, cursor=cursor, limit=limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {"items": [{"id": a.id, "url": a.url, "created_at": a.created_at, "size_bytes": a.size_bytes} for a in valid_assets]}
+    return {
+        "items": [
+            {"id": a.id, "url": a.url, "thumb_url": thumb_url_for(a), "created_at": a.created_at, "size_bytes": a.size_bytes}
+            for a in assets
+        ],
+        "next_cursor": next_cursor,
+    }
 
 
 @router.delete("/{media_id}")
@@ -145,22 +196,9 @@ def delete_media(
     if asset.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    # S3またはローカルから削除
-    if USE_S3 and s3_client and asset.url.startswith('https://'):
-        # S3から削除
-        try:
-            s3_key = asset.url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[1]
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-        except Exception as e:
-            print(f"S3 delete failed: {e}")
-    else:
-        # ローカルファイルから削除
-        file_path = MEDIA_DIR / asset.url.split('/')[-1]
-        if file_path.exists():
-            file_path.unlink()
-    
-    db.delete(asset)
-    db.commit()
+    # 他の投稿・出品からも参照されている間はストレージの実体を残す
+    if not release_media(db, asset):
+        return {"status": "released", "ref_count": asset.ref_count}
     return {"status": "deleted"}
 
 
@@ -175,20 +213,19 @@ def save_user_image_order(
     """
     if "order" not in payload or not isinstance(payload["order"], list):
         raise HTTPException(status_code=400, detail="order must be a list")
-    ids = [int(i) for i in payload["order"] if str(i).isdigit()]
+    ids = list(dict.fromkeys(int(i) for i in payload["order"] if str(i).isdigit()))
     
     if ids:
         # Validate ownership only when list is not empty
-        owned_ids = {a.id for a in db.query(MediaAsset).filter(MediaAsset.user_id == current_user.id).all()}
+        owned_ids = {
+            row.id
+            for row in db.query(MediaAsset.id).filter(MediaAsset.user_id == current_user.id, MediaAsset.id.in_(ids))
+        }
         for mid in ids:
             if mid not in owned_ids:
                 raise HTTPException(status_code=403, detail=f"Media {mid} not owned by user")
 
-    order_file = MEDIA_DIR / f"user_{current_user.id}_order.json"
-    try:
-        with open(order_file, 'w', encoding='utf-8') as f:
-            json.dump(ids, f, ensure_ascii=False)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save order: {e}")
+    save_positions(db, current_user.id, ids)
+    db.commit()
 
     return {"status": "ok"}
@@ -1,18 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 import logging
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import html
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, func, or_
+from sqlalchemy import and_, desc, func, or_
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.database import get_db
-from app.models import User, Post, PointEvent, Reaction, Tag, PostTag, MediaAsset, PostMedia, PostTourism, Comment
+from app.models import User, Post, PointEvent, Reaction, Tag, PostTag, MediaAsset, PostMedia, PostTourism, Comment, PostTranslation
 from app.schemas import Post as PostSchema, PostCreate, PostUpdate
 import re
 from app.auth import get_current_active_user, get_current_premium_user, get_optional_user
+from app.services.language_detection import detect_language_code
+from app.services.media_assets import release_media
+from app.services.media_derivatives import thumb_url_for
+from app.services.search_index import delete_search_document, sync_search_document
+from app.services.storage import s3_url_for_key
 
 router = APIRouter(prefix="/api/posts", tags=["posts"], redirect_slashes=False)
 
@@ -34,11 +39,28 @@ async def read_posts(
     sort: str = "newest",
     range: str = "all",
     tag: Optional[str] = None,
+    feed: bool = False,
+    lang: Optional[str] = None,
+    accept_language: Optional[str] = Header(None, alias="Accept-Language"),
     current_user: Optional[User] = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
     query = db.query(Post).options(joinedload(Post.user))
     
+    # フィードモード: 閲覧者の言語の翻訳キャッシュを同じクエリで LEFT JOIN
+    target_lang = None
+    if feed:
+        from app.services.translation import get_user_preferred_language
+        target_lang = get_user_preferred_language(
+            user_lang=current_user.preferred_lang if current_user else None,
+            accept_language=accept_language,
+            query_lang=lang
+        )
+        query = query.outerjoin(
+            PostTranslation,
+            and_(PostTranslation.post_id == Post.id, PostTranslation.lang == target_lang)
+        ).add_entity(PostTranslation)
+    
     if visibility:
         query = query.filter(Post.visibility == visibility)
     else:
@@ -91,7 +113,12 @@ async def read_posts(
     page = max(1, page)
     limit = max(1, min(100, limit))
     offset = (page - 1) * limit
-    posts = query.offset(offset).limit(limit).all()
+    rows = query.offset(offset).limit(limit).all()
+    if feed:
+        posts = [post for post, _ in rows]
+        translations = {post.id: translation for post, translation in rows if translation is not None}
+    else:
+        posts = rows
 
     if cat_value:
         needle = f"#{cat_value}".lower()
@@ -141,6 +168,7 @@ async def read_posts(
         comment_counts = {post_id: count for post_id, count in comment_results}
     
     result = []
+    missing_translation_ids = []
     for post in posts:
         like_count = like_counts.get(post.id, 0)
         is_liked = post.id in user_likes
@@ -178,6 +206,7 @@ async def read_posts(
             media = db.query(MediaAsset).filter(MediaAsset.id == post.media_id).first()
             if media:
                 post_dict["media_url"] = media.url
+                post_dict["thumb_url"] = thumb_url_for(media)
         
         post_media_records = db.query(PostMedia).filter(PostMedia.post_id == post.id).order_by(PostMedia.order_index).all()
         if post_media_records:
@@ -185,10 +214,12 @@ async def read_posts(
             for pm in post_media_records:
                 media = db.query(MediaAsset).filter(MediaAsset.id == pm.media_asset_id).first()
                 if media:
+                    if not post_dict.get("thumb_url"):
+                        post_dict["thumb_url"] = thumb_url_for(media)
                     url = media.url
                     # 相対パスをS3 URLに変換
                     if url and url.startswith('/media/'):
-                        url = f"https://rainbow-community-media-prod.s3.ap-northeast-1.amazonaws.com{url}"
+                        url = s3_url_for_key(url)
                     media_urls.append(url)
             post_dict["media_urls"] = media_urls
         
@@ -208,8 +239,29 @@ async def read_posts(
                     "attachment_pdf_url": tourism.attachment_pdf_url
                 }
         
+        if feed:
+            translation = translations.get(post.id)
+            needs_translation = post.original_lang != target_lang
+            is_translated = needs_translation and translation is not None and not translation.error_code
+            post_dict.update({
+                "original_lang": post.original_lang or "unknown",
+                "view_lang": target_lang,
+                "display_title": (translation.translated_title or post.title) if is_translated else post.title,
+                "display_text": translation.translated_text if is_translated else post.body,
+                "is_translated": is_translated,
+                "translation_pending": needs_translation and translation is None,
+            })
+            if post_dict["translation_pending"]:
+                missing_translation_ids.append(post.id)
+        
         result.append(post_dict)
     
+    # キャッシュにない翻訳だけバックグラウンドで作成
+    if missing_translation_ids:
+        from app.services.pretranslation import pretranslation_queue
+        for post_id in missing_translation_ids:
+            pretranslation_queue.enqueue_translation(post_id, target_lang)
+    
     return result
 
 @router.post("", response_model=PostSchema)
@@ -271,6 +323,11 @@ async def create_post(
     
     db.commit()
     db.refresh(db_post)
+    sync_search_document(db, db_post)
+    
+    if db_post.status == 'published':
+        from app.services.pretranslation import pretranslation_queue
+        pretranslation_queue.enqueue_post(db_post.id, db_post.original_lang)
     return db_post
 
 @router.get("/{post_id}", response_model=PostSchema)
@@ -350,9 +407,24 @@ async def update_post(
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     update_data = post_update.dict(exclude_unset=True, exclude={'media_ids', 'tourism_details'})
+    content_changed = any(
+        field in update_data and update_data[field] != getattr(post, field)
+        for field in ('title', 'body')
+    )
+    newly_published = update_data.get('status') == 'published' and post.status != 'published'
     for field, value in update_data.items():
         setattr(post, field, value)
     
+    if content_changed:
+        # Cached translations describe the old text: drop them and re-detect the language
+        from app.services.translation import detect_post_language, invalidate_post_translations
+        invalidate_post_translations(db, post.id)
+        try:
+            post.original_lang = await detect_post_language(post.body, post.title)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Language detection failed: {e}")
+            post.original_lang = 'unknown'
+    
     if post_update.media_ids is not None:
         db.query(PostMedia).filter(PostMedia.post_id == post_id).delete(synchronize_session=False)
         for idx, media_id in enumerate(post_update.media_ids[:5]):
@@ -376,10 +448,16 @@ async def update_post(
     
     db.commit()
     db.refresh(post)
+    sync_search_document(db, post)
+    
+    if (content_changed or newly_published) and post.status == 'published':
+        from app.services.pretranslation import pretranslation_queue
+        pretranslation_queue.enqueue_post(post.id, post.original_lang)
     return post
 
+# Sync on purpose: release_media deletes stored objects (blocking storage calls), so this runs in the threadpool
 @router.delete("/{post_id}")
-async def delete_post(
+def delete_post(
     post_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -401,6 +479,7 @@ async def delete_post(
         db.query(PointEvent).filter(PointEvent.ref_type == "post", PointEvent.ref_id == post_id).delete(synchronize_session=False)
         db.query(PostMedia).filter(PostMedia.post_id == post_id).delete(synchronize_session=False)
         db.query(PostTourism).filter(PostTourism.post_id == post_id).delete(synchronize_session=False)
+        delete_search_document(db, Post, post_id)
 
         # Remember media_id to potentially cleanup
         media_id = post.media_id
@@ -409,26 +488,13 @@ async def delete_post(
         db.query(Post).filter(Post.id == post_id).delete(synchronize_session=False)
         db.commit()
 
-        # Cleanup orphaned media if no other posts reference it
+        # Release this post's reference; the media is removed with its last reference
         if media_id:
+            media = db.query(MediaAsset).filter(MediaAsset.id == media_id).first()
             in_use = db.query(Post).filter(Post.media_id == media_id).count()
-            if in_use == 0:
-                media = db.query(MediaAsset).filter(MediaAsset.id == media_id).first()
-                if media:
-                    # attempt to remove file from disk
-                    import os
-                    from pathlib import Path
-                    base_dir = os.getenv("MEDIA_DIR") or ("/data/media" if os.path.exists("/data") else "media")
-                    try:
-                        url = media.url or ""
-                        rel = url.replace("/media/", "", 1)
-                        path = Path(base_dir) / rel
-                        if path.is_file():
-                            path.unlink()
-                    except Exception:
-                        pass
-                    db.delete(media)
-                    db.commit()
+            # Pre-dedup rows can be shared by several posts with a single reference
+            if media and not (in_use and (media.ref_count or 0) <= 1):
+                release_media(db, media)
         return {"message": "Post deleted successfully"}
     except HTTPException:
         # ensure transaction state is clean
@@ -658,7 +724,8 @@ async def create_post_comment(
     new_comment = Comment(
         post_id=post_id,
         user_id=current_user.id,
-        body=safe_body
+        body=safe_body,
+        original_lang=detect_language_code(body)
     )
     db.add(new_comment)
 
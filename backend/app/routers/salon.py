@@ -1,18 +1,32 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, exists, or_, and_
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, Profile, MatchingProfile, MatchingProfileImage, SalonRoom, SalonParticipant, SalonMessage
-from app.auth import get_current_active_user, get_optional_user
+from app.database import get_db, SessionLocal
+from app.models import User, Profile, MatchingProfile, MatchingProfileImage, SalonRoom, SalonRoomIdentity, SalonParticipant, SalonMessage
+from app.auth import get_current_active_user, get_optional_user, get_user_from_token
+from app.services.salon_realtime import broker
+from app.services.language_detection import detect_language_code
+from app.services.media_derivatives import thumb_urls_for_urls
+from app.services.search_index import sync_search_document
 from app.schemas import (
     SalonRoomCreate, SalonRoomUpdate, SalonRoom as SalonRoomSchema,
     SalonParticipantCreate, SalonParticipant as SalonParticipantSchema,
     SalonMessageCreate, SalonMessage as SalonMessageSchema
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/salon", tags=["salon"])
 
+# 購読中の WebSocket が参加者/会員資格を再確認する間隔（本人の退出時は即時に再確認する）
+SALON_WS_MEMBERSHIP_RECHECK_SECONDS = float(os.getenv("SALON_WS_MEMBERSHIP_RECHECK_SECONDS", "60"))
+
 VALID_IDENTITIES = [
     'gay', 'lesbian', 'bisexual', 'transgender', 'questioning', 'other',
     'ゲイ', 'レズビアン', 'バイセクシュアル', 'トランスジェンダー', 'クエスチョニング', 'その他',
@@ -20,8 +34,12 @@ VALID_IDENTITIES = [
 ]
 
 
+def is_premium(user: User) -> bool:
+    return user.membership_type == "premium" or user.membership_type == "admin"
+
+
 def require_premium(current_user: User = Depends(get_current_active_user)) -> User:
-    if current_user.membership_type != "premium" and current_user.membership_type != "admin":
+    if not is_premium(current_user):
         raise HTTPException(status_code=403, detail={"error": "premium_required", "message": "プレミアム会員のみ利用可能です"})
     return current_user
 
@@ -46,8 +64,174 @@ def check_identity_match(user_identity: Optional[str], target_identities: List[s
     return user_identity in target_identities
 
 
+def identity_match_clause(user_identity: Optional[str]):
+    """check_identity_match と同じ判定を SQL 条件として表現する（ログインユーザー向け）"""
+    allowed = ['ALL'] if not user_identity else ['ALL', user_identity]
+    has_any_identity = exists().where(SalonRoomIdentity.room_id == SalonRoom.id)
+    has_allowed_identity = exists().where(
+        SalonRoomIdentity.room_id == SalonRoom.id,
+        SalonRoomIdentity.identity.in_(allowed),
+    )
+    return or_(~has_any_identity, has_allowed_identity)
+
+
+def sync_room_identities(room: SalonRoom, target_identities: List[str]) -> None:
+    wanted = set(target_identities or [])
+    current = {ri.identity: ri for ri in room.identities}
+    for identity, ri in current.items():
+        if identity not in wanted:
+            room.identities.remove(ri)
+    for identity in wanted - current.keys():
+        room.identities.append(SalonRoomIdentity(identity=identity))
+
+
+def query_rooms_with_stats(db: Session):
+    """ルームと参加者数・作成者名を1クエリで取得する"""
+    participant_counts = (
+        db.query(
+            SalonParticipant.room_id.label("room_id"),
+            func.count(SalonParticipant.id).label("participant_count"),
+        )
+        .group_by(SalonParticipant.room_id)
+        .subquery()
+    )
+    return (
+        db.query(
+            SalonRoom,
+            func.coalesce(participant_counts.c.participant_count, 0),
+            User.display_name,
+        )
+        .outerjoin(participant_counts, participant_counts.c.room_id == SalonRoom.id)
+        .outerjoin(User, User.id == SalonRoom.creator_id)
+    )
+
+
+def room_to_dict(room: SalonRoom, participant_count: int, creator_display_name: Optional[str]) -> dict:
+    return {
+        "id": room.id,
+        "creator_id": room.creator_id,
+        "theme": room.theme,
+        "description": room.description,
+        "target_identities": room.target_identities,
+        "room_type": room.room_type,
+        "allow_anonymous": room.allow_anonymous,
+        "is_active": room.is_active,
+        "created_at": room.created_at,
+        "updated_at": room.updated_at,
+        "participant_count": participant_count,
+        "creator_display_name": creator_display_name,
+    }
+
+
+def get_user_avatar_urls(db: Session, user_ids) -> Dict[int, str]:
+    """matching_profile_images の先頭画像、なければ profiles.avatar_url をユーザーごとに一括取得する（サムネイルがあればそのURL）"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    avatar_urls: Dict[int, str] = {}
+    images = (
+        db.query(MatchingProfileImage.profile_id, MatchingProfileImage.image_url)
+        .filter(MatchingProfileImage.profile_id.in_(user_ids))
+        .order_by(MatchingProfileImage.profile_id, MatchingProfileImage.display_order)
+        .all()
+    )
+    for profile_id, image_url in images:
+        avatar_urls.setdefault(profile_id, image_url)
+    
+    # Fallback to profile avatar_url if no matching_profile_images
+    missing = user_ids - avatar_urls.keys()
+    if missing:
+        profiles = (
+            db.query(Profile.user_id, Profile.avatar_url)
+            .filter(Profile.user_id.in_(missing), Profile.avatar_url.isnot(None), Profile.avatar_url != "")
+            .all()
+        )
+        avatar_urls.update({user_id: avatar_url for user_id, avatar_url in profiles})
+    
+    thumb_urls = thumb_urls_for_urls(db, avatar_urls.values())
+    return {user_id: thumb_urls.get(url, url) for user_id, url in avatar_urls.items()}
+
+
+def get_user_avatar_url(user_id: int, db: Session) -> Optional[str]:
+    return get_user_avatar_urls(db, [user_id]).get(user_id)
+
+
+def is_anonymous_message(msg: SalonMessage, room: SalonRoom) -> bool:
+    # 匿名投稿として扱うのはルームが匿名を許可している場合のみ
+    return bool(msg.is_anonymous and room.allow_anonymous)
+
+
+def message_to_dict(
+    msg: SalonMessage,
+    room: SalonRoom,
+    user_display_name: Optional[str],
+    user_avatar_url: Optional[str],
+    anonymous_name: Optional[str],
+) -> dict:
+    """匿名投稿は送信者の表示名・アバターを伏せ、参加時の匿名名を返す"""
+    result = {
+        "id": msg.id,
+        "room_id": msg.room_id,
+        "user_id": msg.user_id,
+        "is_anonymous": msg.is_anonymous,
+        "body": msg.body,
+        "created_at": msg.created_at,
+        "user_display_name": user_display_name,
+        "user_avatar_url": user_avatar_url,
+        "anonymous_name": None,
+    }
+    if is_anonymous_message(msg, room):
+        result["user_display_name"] = None
+        result["user_avatar_url"] = None
+        result["anonymous_name"] = anonymous_name or "匿名"
+    return result
+
+
+def render_messages(db: Session, room: SalonRoom, messages: List[SalonMessage]) -> List[dict]:
+    """送信者・アバター・匿名名をそれぞれ一括取得してメッセージ一覧を組み立てる"""
+    named_sender_ids = {m.user_id for m in messages if not is_anonymous_message(m, room)}
+    anonymous_sender_ids = {m.user_id for m in messages if is_anonymous_message(m, room)}
+    
+    display_names: Dict[int, str] = {}
+    if named_sender_ids:
+        display_names = dict(
+            db.query(User.id, User.display_name).filter(User.id.in_(named_sender_ids)).all()
+        )
+    avatar_urls = get_user_avatar_urls(db, named_sender_ids)
+    anonymous_names: Dict[int, Optional[str]] = {}
+    if anonymous_sender_ids:
+        anonymous_names = dict(
+            db.query(SalonParticipant.user_id, SalonParticipant.anonymous_name)
+            .filter(
+                SalonParticipant.room_id == room.id,
+                SalonParticipant.user_id.in_(anonymous_sender_ids),
+            )
+            .all()
+        )
+    
+    return [
+        message_to_dict(
+            msg,
+            room,
+            display_names.get(msg.user_id),
+            avatar_urls.get(msg.user_id),
+            anonymous_names.get(msg.user_id),
+        )
+        for msg in messages
+    ]
+
+
+def render_message_by_id(db: Session, message_id: int) -> Optional[dict]:
+    msg = db.query(SalonMessage).filter(SalonMessage.id == message_id).first()
+    if not msg:
+        return None
+    room = db.query(SalonRoom).filter(SalonRoom.id == msg.room_id).first()
+    return render_messages(db, room, [msg])[0]
+
+
 @router.get("/rooms", response_model=List[SalonRoomSchema])
 async def list_rooms(
+    response: Response,
     room_type: Optional[str] = Query(None),
     is_active: bool = Query(True),
     page: int = Query(1, ge=1),
@@ -55,45 +239,28 @@ async def list_rooms(
     current_user: Optional[User] = Depends(get_optional_user),
     db: Session = Depends(get_db),
 ):
-    user_identity = get_user_identity(current_user.id, db) if current_user else None
-    
-    q = db.query(SalonRoom).filter(SalonRoom.is_active == is_active)
+    filters = [SalonRoom.is_active == is_active]
     
     if room_type:
-        q = q.filter(SalonRoom.room_type == room_type)
-    
-    q = q.order_by(SalonRoom.created_at.desc())
-    total = q.count()
-    rooms = q.offset((page - 1) * size).limit(size).all()
+        filters.append(SalonRoom.room_type == room_type)
     
-    is_logged_in = current_user is not None
-    result = []
-    for room in rooms:
-        if not check_identity_match(user_identity, room.target_identities, is_logged_in):
-            continue
-        
-        participant_count = db.query(func.count(SalonParticipant.id)).filter(
-            SalonParticipant.room_id == room.id
-        ).scalar()
-        
-        creator = db.query(User).filter(User.id == room.creator_id).first()
-        
-        result.append({
-            "id": room.id,
-            "creator_id": room.creator_id,
-            "theme": room.theme,
-            "description": room.description,
-            "target_identities": room.target_identities,
-            "room_type": room.room_type,
-            "allow_anonymous": room.allow_anonymous,
-            "is_active": room.is_active,
-            "created_at": room.created_at,
-            "updated_at": room.updated_at,
-            "participant_count": participant_count,
-            "creator_display_name": creator.display_name if creator else None,
-        })
+    # 未ログインユーザーには全てのルームを表示（閲覧のみ）
+    if current_user:
+        filters.append(identity_match_clause(get_user_identity(current_user.id, db)))
+    
+    total = db.query(func.count(SalonRoom.id)).filter(*filters).scalar()
+    response.headers["X-Total-Count"] = str(total)
+    
+    rows = (
+        query_rooms_with_stats(db)
+        .filter(*filters)
+        .order_by(SalonRoom.created_at.desc(), SalonRoom.id.desc())
+        .offset((page - 1) * size)
+        .limit(size)
+        .all()
+    )
     
-    return result
+    return [room_to_dict(room, count, creator_name) for room, count, creator_name in rows]
 
 
 @router.post("/rooms", response_model=SalonRoomSchema, status_code=201)
@@ -117,6 +284,7 @@ def create_room(
         room_type=room_data.room_type.value,
         allow_anonymous=room_data.allow_anonymous,
     )
+    sync_room_identities(room, room_data.target_identities)
     db.add(room)
     db.commit()
     db.refresh(room)
@@ -127,21 +295,9 @@ def create_room(
     )
     db.add(participant)
     db.commit()
+    sync_search_document(db, room)
     
-    return {
-        "id": room.id,
-        "creator_id": room.creator_id,
-        "theme": room.theme,
-        "description": room.description,
-        "target_identities": room.target_identities,
-        "room_type": room.room_type,
-        "allow_anonymous": room.allow_anonymous,
-        "is_active": room.is_active,
-        "created_at": room.created_at,
-        "updated_at": room.updated_at,
-        "participant_count": 1,
-        "creator_display_name": current_user.display_name,
-    }
+    return room_to_dict(room, 1, current_user.display_name)
 
 
 @router.get("/rooms/{room_id}", response_model=SalonRoomSchema)
@@ -150,34 +306,16 @@ def get_room(
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
 ):
-    room = db.query(SalonRoom).filter(SalonRoom.id == room_id).first()
-    if not room:
+    row = query_rooms_with_stats(db).filter(SalonRoom.id == room_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Room not found")
+    room, participant_count, creator_display_name = row
     
     user_identity = get_user_identity(current_user.id, db)
     if not check_identity_match(user_identity, room.target_identities):
         raise HTTPException(status_code=403, detail="You are not allowed to access this room")
     
-    participant_count = db.query(func.count(SalonParticipant.id)).filter(
-        SalonParticipant.room_id == room.id
-    ).scalar()
-    
-    creator = db.query(User).filter(User.id == room.creator_id).first()
-    
-    return {
-        "id": room.id,
-        "creator_id": room.creator_id,
-        "theme": room.theme,
-        "description": room.description,
-        "target_identities": room.target_identities,
-        "room_type": room.room_type,
-        "allow_anonymous": room.allow_anonymous,
-        "is_active": room.is_active,
-        "created_at": room.created_at,
-        "updated_at": room.updated_at,
-        "participant_count": participant_count,
-        "creator_display_name": creator.display_name if creator else None,
-    }
+    return room_to_dict(room, participant_count, creator_display_name)
 
 
 @router.put("/rooms/{room_id}", response_model=SalonRoomSchema)
@@ -208,30 +346,16 @@ def update_room(
             setattr(room, field, value.value if hasattr(value, 'value') else value)
         else:
             setattr(room, field, value)
+    if "target_identities" in update_data:
+        sync_room_identities(room, update_data["target_identities"])
     
     db.commit()
-    db.refresh(room)
-    
-    participant_count = db.query(func.count(SalonParticipant.id)).filter(
-        SalonParticipant.room_id == room.id
-    ).scalar()
+    sync_search_document(db, room)
     
-    creator = db.query(User).filter(User.id == room.creator_id).first()
-    
-    return {
-        "id": room.id,
-        "creator_id": room.creator_id,
-        "theme": room.theme,
-        "description": room.description,
-        "target_identities": room.target_identities,
-        "room_type": room.room_type,
-        "allow_anonymous": room.allow_anonymous,
-        "is_active": room.is_active,
-        "created_at": room.created_at,
-        "updated_at": room.updated_at,
-        "participant_count": participant_count,
-        "creator_display_name": creator.display_name if creator else None,
-    }
+    room, participant_count, creator_display_name = (
+        query_rooms_with_stats(db).filter(SalonRoom.id == room_id).one()
+    )
+    return room_to_dict(room, participant_count, creator_display_name)
 
 
 @router.post("/rooms/{room_id}/join", response_model=SalonParticipantSchema)
@@ -272,21 +396,7 @@ def join_room(
     db.commit()
     db.refresh(participant)
     
-    # Get avatar URL from matching_profile_images
-    avatar_url = None
-    first_image = (
-        db.query(MatchingProfileImage)
-        .filter(MatchingProfileImage.profile_id == current_user.id)
-        .order_by(MatchingProfileImage.display_order)
-        .first()
-    )
-    if first_image:
-        avatar_url = first_image.image_url
-    else:
-        # Fallback to profile avatar_url
-        profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-        if profile and profile.avatar_url:
-            avatar_url = profile.avatar_url
+    avatar_url = get_user_avatar_url(current_user.id, db)
     
     return {
         "id": participant.id,
@@ -319,6 +429,8 @@ def leave_room(
     
     db.delete(participant)
     db.commit()
+    # 本人の開いている購読に退出を知らせ、配信を止めさせる
+    broker.publish_leave(db, room_id, current_user.id)
     
     return {"status": "ok", "message": "Left the room"}
 
@@ -344,22 +456,7 @@ def list_participants(
     result = []
     for p in participants:
         user = db.query(User).filter(User.id == p.user_id).first()
-        
-        # Get avatar URL from matching_profile_images (main image with lowest display_order)
-        avatar_url = None
-        first_image = (
-            db.query(MatchingProfileImage)
-            .filter(MatchingProfileImage.profile_id == p.user_id)
-            .order_by(MatchingProfileImage.display_order)
-            .first()
-        )
-        if first_image:
-            avatar_url = first_image.image_url
-        else:
-            # Fallback to profile avatar_url if no matching_profile_images
-            profile = db.query(Profile).filter(Profile.user_id == p.user_id).first()
-            if profile and profile.avatar_url:
-                avatar_url = profile.avatar_url
+        avatar_url = get_user_avatar_url(p.user_id, db)
         
         result.append({
             "id": p.id,
@@ -377,7 +474,7 @@ def list_participants(
 @router.get("/rooms/{room_id}/messages", response_model=List[SalonMessageSchema])
 def list_messages(
     room_id: int,
-    page: int = Query(1, ge=1),
+    before: Optional[int] = Query(None, description="このメッセージIDより古いメッセージを返す（(created_at, id) の降順カーソル）"),
     size: int = Query(50, ge=1, le=100),
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
@@ -398,61 +495,25 @@ def list_messages(
     if not participant:
         raise HTTPException(status_code=403, detail="You must join the room to view messages")
     
-    messages = db.query(SalonMessage).filter(
-        SalonMessage.room_id == room_id
-    ).order_by(SalonMessage.created_at.desc()).offset((page - 1) * size).limit(size).all()
+    q = db.query(SalonMessage).filter(SalonMessage.room_id == room_id)
     
-    result = []
-    for msg in messages:
-        user = db.query(User).filter(User.id == msg.user_id).first()
-        
-        # Get avatar URL from matching_profile_images (main image with lowest display_order)
-        avatar_url = None
-        first_image = (
-            db.query(MatchingProfileImage)
-            .filter(MatchingProfileImage.profile_id == msg.user_id)
-            .order_by(MatchingProfileImage.display_order)
-            .first()
+    if before is not None:
+        # created_at は Python 側を経由せず SQL 内で比較する（SQLite の日時文字列表現の差異を避けるため）
+        cursor_created_at = (
+            db.query(SalonMessage.created_at)
+            .filter(SalonMessage.id == before, SalonMessage.room_id == room_id)
+            .scalar_subquery()
+        )
+        q = q.filter(
+            or_(
+                SalonMessage.created_at < cursor_created_at,
+                and_(SalonMessage.created_at == cursor_created_at, SalonMessage.id < before),
+            )
         )
-        if first_image:
-            avatar_url = first_image.image_url
-        else:
-            # Fallback to profile avatar_url if no matching_profile_images
-            profile = db.query(Profile).filter(Profile.user_id == msg.user_id).first()
-            if profile and profile.avatar_url:
-                avatar_url = profile.avatar_url
-        
-        sender_participant = db.query(SalonParticipant).filter(
-            SalonParticipant.room_id == room_id,
-            SalonParticipant.user_id == msg.user_id
-        ).first()
-        
-        if msg.is_anonymous and room.allow_anonymous:
-            result.append({
-                "id": msg.id,
-                "room_id": msg.room_id,
-                "user_id": msg.user_id,
-                "is_anonymous": msg.is_anonymous,
-                "body": msg.body,
-                "created_at": msg.created_at,
-                "user_display_name": None,
-                "user_avatar_url": None,
-                "anonymous_name": sender_participant.anonymous_name if sender_participant else "匿名",
-            })
-        else:
-            result.append({
-                "id": msg.id,
-                "room_id": msg.room_id,
-                "user_id": msg.user_id,
-                "is_anonymous": msg.is_anonymous,
-                "body": msg.body,
-                "created_at": msg.created_at,
-                "user_display_name": user.display_name if user else None,
-                "user_avatar_url": avatar_url,
-                "anonymous_name": None,
-            })
     
-    return result
+    messages = q.order_by(SalonMessage.created_at.desc(), SalonMessage.id.desc()).limit(size).all()
+    
+    return render_messages(db, room, messages)
 
 
 @router.post("/rooms/{room_id}/messages", response_model=SalonMessageSchema, status_code=201)
@@ -489,51 +550,119 @@ def send_message(
         user_id=current_user.id,
         is_anonymous=message_data.is_anonymous,
         body=message_data.body,
+        original_lang=detect_language_code(message_data.body),
     )
     db.add(message)
     db.commit()
     db.refresh(message)
     
-    # Get avatar URL from matching_profile_images
-    avatar_url = None
-    first_image = (
-        db.query(MatchingProfileImage)
-        .filter(MatchingProfileImage.profile_id == current_user.id)
-        .order_by(MatchingProfileImage.display_order)
-        .first()
+    result = message_to_dict(
+        message,
+        room,
+        current_user.display_name,
+        get_user_avatar_url(current_user.id, db),
+        participant.anonymous_name,
     )
-    if first_image:
-        avatar_url = first_image.image_url
-    else:
-        # Fallback to profile avatar_url
-        profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-        if profile and profile.avatar_url:
-            avatar_url = profile.avatar_url
-    
-    if message.is_anonymous and room.allow_anonymous:
-        return {
-            "id": message.id,
-            "room_id": message.room_id,
-            "user_id": message.user_id,
-            "is_anonymous": message.is_anonymous,
-            "body": message.body,
-            "created_at": message.created_at,
-            "user_display_name": None,
-            "user_avatar_url": None,
-            "anonymous_name": participant.anonymous_name or "匿名",
-        }
+    broker.publish(db, room_id, jsonable_encoder(result))
+    return result
+
+
+def authorize_room_subscription(room_id: int, token: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """ルーム購読の認証・参加者/アイデンティティ確認。接続時と購読中の再確認で使う。(ユーザーID, 拒否理由) を返す"""
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(db, token)
+        if user is None or not user.is_active:
+            return None, "Could not validate credentials"
+        if not is_premium(user):
+            return user.id, "premium_required"
+        
+        room = db.query(SalonRoom).filter(SalonRoom.id == room_id).first()
+        if not room:
+            return user.id, "Room not found"
+        
+        user_identity = get_user_identity(user.id, db)
+        if not check_identity_match(user_identity, room.target_identities):
+            return user.id, "You are not allowed to access this room"
+        
+        participant = db.query(SalonParticipant).filter(
+            SalonParticipant.room_id == room_id,
+            SalonParticipant.user_id == user.id
+        ).first()
+        if not participant:
+            return user.id, "You must join the room to view messages"
+        return user.id, None
+    finally:
+        db.close()
+
+
+@router.websocket("/rooms/{room_id}/ws")
+async def subscribe_room(
+    websocket: WebSocket,
+    room_id: int,
+    token: Optional[str] = Query(None),
+):
+    """
+    新着メッセージのプッシュ配信。
+    ブラウザの WebSocket はヘッダーを付けられないため、トークンはクエリパラメータで受け取る。
+    """
+    user_id, denied_reason = await run_in_threadpool(authorize_room_subscription, room_id, token)
+    if denied_reason:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=denied_reason)
+        return
+    
+    await websocket.accept()
+    subscription = broker.subscribe(room_id, user_id)
+    
+    async def forward_messages() -> None:
+        while True:
+            message = await subscription.queue.get()
+            await websocket.send_json({"type": "message", "data": message})
+    
+    async def watch_membership() -> str:
+        # 自分の退出は即時に、通知の取りこぼし・会員資格の失効・トークン期限切れは定期的に再確認する
+        recheck_timeout = SALON_WS_MEMBERSHIP_RECHECK_SECONDS if SALON_WS_MEMBERSHIP_RECHECK_SECONDS > 0 else None
+        while True:
+            try:
+                await asyncio.wait_for(subscription.left.wait(), timeout=recheck_timeout)
+            except asyncio.TimeoutError:
+                pass
+            subscription.left.clear()
+            _, denied_reason = await run_in_threadpool(authorize_room_subscription, room_id, token)
+            if denied_reason:
+                return denied_reason
+    
+    async def receive_until_disconnect() -> None:
+        # クライアントからの受信は切断検知（とキープアライブ）のためだけに使う
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+    
+    receiver = asyncio.create_task(receive_until_disconnect())
+    tasks = {receiver, asyncio.create_task(forward_messages()), asyncio.create_task(watch_membership())}
+    try:
+        # どれか一つが終われば購読も終わる（配信が死んだまま接続だけ残さない）
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        broker.unsubscribe(room_id, subscription)
+    
+    if receiver in done and receiver.exception() is None:
+        return  # クライアントが切断済み
+    finished = next(iter(done))
+    if finished.exception() is not None:
+        logger.error(f"Salon room {room_id} subscription failed: {finished.exception()!r}")
+        code, reason = status.WS_1011_INTERNAL_ERROR, "Subscription failed"
     else:
-        return {
-            "id": message.id,
-            "room_id": message.room_id,
-            "user_id": message.user_id,
-            "is_anonymous": message.is_anonymous,
-            "body": message.body,
-            "created_at": message.created_at,
-            "user_display_name": current_user.display_name,
-            "user_avatar_url": avatar_url,
-            "anonymous_name": None,
-        }
+        code, reason = status.WS_1008_POLICY_VIOLATION, finished.result()
+    try:
+        await websocket.close(code=code, reason=reason)
+    except Exception:
+        pass  # 送信に失敗した時点で接続が切れている
 
 
 @router.get("/identities")
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.auth import get_optional_user
+from app import models
+from app.schemas import SearchResults
+from app.services.search_index import DOC_TYPES, InvalidSearchCursor, search_documents
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+@router.get("", response_model=SearchResults)
+@router.get("/", response_model=SearchResults)
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = Query(None, description="Comma-separated: " + ",".join(DOC_TYPES)),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    """Search posts, blog articles, salon rooms, courses, flea market items and donation projects.
+    Hits are ranked across types; pass next_cursor to get the next page.
+    """
+    doc_types = None
+    if types:
+        doc_types = [t.strip() for t in types.split(",") if t.strip()]
+        unknown = [t for t in doc_types if t not in DOC_TYPES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+
+    # 会員限定の投稿はログインユーザーにのみ表示
+    try:
+        items, next_cursor = search_documents(
+            db, q, include_members=current_user is not None, doc_types=doc_types, cursor=cursor, limit=limit
+        )
+    except InvalidSearchCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
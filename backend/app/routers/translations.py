@@ -1,9 +1,11 @@
 """Translation API endpoints for posts, comments, and messages."""
 from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
+from fastapi.responses import StreamingResponse
+import json
 import logging
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 from app.database import get_db
@@ -12,13 +14,20 @@ from app.models import (
     Comment, CommentTranslation, Message, MessageTranslation, SalonMessage, SalonMessageTranslation
 )
 from app.schemas import PostWithTranslation
-from app.auth import get_optional_user
+from app.auth import get_current_admin_user, get_optional_user
+from app.services.storage import s3_url_for_key
+from app.services.translation_providers.registry import provider_registry
 from app.services.translation import (
     get_or_create_translation,
+    get_cached_post_translations,
+    translate_posts_concurrently,
+    stream_post_translation,
     get_or_create_comment_translation,
+    translate_comments,
     get_or_create_message_translation,
     get_or_create_salon_message_translation,
     get_user_preferred_language,
+    get_translation_provider,
     detect_post_language,
     SUPPORTED_LANGUAGES,
     DEFAULT_LANGUAGE
@@ -106,6 +115,41 @@ async def get_post_with_translation(
     return PostWithTranslation(**post_dict)
 
 
+@router.get("/posts/{post_id}/translated/stream")
+async def stream_post_with_translation(
+    post_id: int,
+    lang: Optional[str] = Query(None, description="Target language code (ja, en, ko, es, pt, fr, it, de)"),
+    accept_language: Optional[str] = Header(None, alias="Accept-Language"),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream a post's translation as Server-Sent Events.
+    
+    Meant for long (blog) posts: translated pieces arrive while the provider
+    is still working. See stream_post_translation for the event types.
+    """
+    if db.query(Post.id).filter(Post.id == post_id).first() is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    # The stream uses its own short-lived sessions
+    db.close()
+    
+    target_lang = get_user_preferred_language(
+        user_lang=None,
+        accept_language=accept_language,
+        query_lang=lang
+    )
+    
+    async def event_stream():
+        async for event, data in stream_post_translation(post_id, target_lang):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/languages")
 async def get_supported_languages():
     """Get list of supported languages for translation."""
@@ -125,6 +169,16 @@ async def get_supported_languages():
     }
 
 
+@router.get("/translations/metrics")
+async def get_translation_metrics(current_user = Depends(get_current_admin_user)):
+    """Translation provider circuit breaker state and counters. Admin only."""
+    provider = get_translation_provider()
+    return {
+        "provider": provider.provider_name,
+        "circuit_breaker": provider_registry.metrics()
+    }
+
+
 @router.get("/translations/posts")
 async def get_posts_with_translation(
     lang: Optional[str] = Query(None, description="Target language code (ja, en, ko, es, pt, fr, it, de)"),
@@ -175,19 +229,31 @@ async def get_posts_with_translation(
         post_dict["display_text"] = post.body
         post_dict["has_translation"] = False
         post_dict["is_translated"] = False
-        
+        post_dict["translation_pending"] = False
+        result.append(post_dict)
+    
+    # Cached translations for the whole page in one query; misses are translated
+    # concurrently and anything slower than the deadline is returned untranslated
+    translations = get_cached_post_translations(db, [post.id for post in posts], target_lang)
+    misses = [
+        post for post in posts
+        if target_lang != post.original_lang and post.id not in translations
+    ]
+    new_translations, pending_ids = await translate_posts_concurrently(db, misses, target_lang)
+    translations.update(new_translations)
+    
+    for post_dict in result:
         # Skip translation if same language
-        if target_lang != post.original_lang:
-            # Try to get or create translation
-            translation = await get_or_create_translation(db, post, target_lang)
-            
-            if translation and not translation.error_code:
-                post_dict["display_title"] = translation.translated_title or post.title
-                post_dict["display_text"] = translation.translated_text
-                post_dict["has_translation"] = True
-                post_dict["is_translated"] = True
+        if target_lang == post_dict["original_lang"]:
+            continue
+        post_dict["translation_pending"] = post_dict["id"] in pending_ids
+        translation = translations.get(post_dict["id"])
         
-        result.append(post_dict)
+        if translation and not translation.error_code:
+            post_dict["display_title"] = translation.translated_title or post_dict["title"]
+            post_dict["display_text"] = translation.translated_text
+            post_dict["has_translation"] = True
+            post_dict["is_translated"] = True
     
     return result
 
@@ -243,6 +309,57 @@ async def get_comment_with_translation(
     return CommentTranslationResponse(**response)
 
 
+@router.get("/posts/{post_id}/comments/translated", response_model=List[CommentTranslationResponse])
+async def get_post_comments_with_translation(
+    post_id: int,
+    lang: Optional[str] = Query(None, description="Target language code"),
+    skip: int = 0,
+    limit: int = Query(50, le=200),
+    accept_language: Optional[str] = Header(None, alias="Accept-Language"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_optional_user)
+):
+    """
+    Get a page of a post's comments, translated in batches.
+    """
+    post = db.query(Post.id).filter(Post.id == post_id).first()
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    
+    target_lang = get_user_preferred_language(
+        user_lang=getattr(current_user, "preferred_lang", None),
+        accept_language=accept_language,
+        query_lang=lang
+    )
+    
+    comments = db.query(Comment).filter(
+        Comment.post_id == post_id
+    ).order_by(Comment.created_at).offset(skip).limit(limit).all()
+    
+    # Snapshot before translating: stored translations commit in other sessions
+    result = [
+        {
+            "comment_id": comment.id,
+            "original_text": comment.body,
+            "translated_text": comment.body,
+            "target_lang": target_lang,
+            "is_translated": False,
+            "has_translation": False
+        }
+        for comment in comments
+    ]
+    translations = await translate_comments(db, comments, target_lang)
+    
+    for item in result:
+        translation = translations.get(item["comment_id"])
+        if translation and not translation.error_code:
+            item["translated_text"] = translation.translated_text
+            item["is_translated"] = True
+        item["has_translation"] = translation is not None
+    
+    return result
+
+
 @router.get("/messages/{message_id}/translated", response_model=MessageTranslationResponse)
 async def get_message_with_translation(
     message_id: int,
@@ -465,7 +582,7 @@ def build_post_dict(post: Post, db: Session) -> dict:
             if media:
                 url = media.url
                 if url and url.startswith('/media/'):
-                    url = f"https://rainbow-community-media-prod.s3.ap-northeast-1.amazonaws.com{url}"
+                    url = s3_url_for_key(url)
                 media_urls.append(url)
         post_dict["media_urls"] = media_urls
     
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 from enum import Enum
 
@@ -157,6 +157,14 @@ class Post(PostBase):
     like_count: Optional[int] = 0
     comment_count: Optional[int] = 0
     user_display_name: Optional[str] = None
+    thumb_url: Optional[str] = None
+    # Feed mode (GET /api/posts?feed=true) translation fields
+    original_lang: Optional[str] = None
+    view_lang: Optional[str] = None
+    display_title: Optional[str] = None
+    display_text: Optional[str] = None
+    is_translated: Optional[bool] = None
+    translation_pending: Optional[bool] = None
     
     class Config:
         from_attributes = True
@@ -256,6 +264,34 @@ class Tag(TagBase):
     class Config:
         from_attributes = True
 
+class MediaUploadRequest(BaseModel):
+    content_type: str
+    size_bytes: int
+
+class MediaUploadTicket(BaseModel):
+    key: str
+    upload_url: str
+    method: str
+    headers: Dict[str, str]
+    expires_at: int
+
+class MediaFinalizeRequest(BaseModel):
+    key: str
+
+
+class SearchHit(BaseModel):
+    type: str
+    id: str
+    title: Optional[str] = None
+    snippet: str
+    slug: Optional[str] = None
+    score: float
+    created_at: Optional[datetime] = None
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
 
 class SalonRoomTypeEnum(str, Enum):
     consultation = "consultation"
@@ -381,6 +417,7 @@ class FleaMarketItemUpdate(BaseModel):
 class FleaMarketItemImage(BaseModel):
     id: int
     image_url: str
+    thumb_url: Optional[str] = None
     display_order: int
     
     class Config:
@@ -451,6 +488,8 @@ class OrderStatusEnum(str, Enum):
     shipped = "shipped"
     delivered = "delivered"
     cancelled = "cancelled"
+    refunded = "refunded"  # 在庫確保の期限切れ後に決済され、在庫がなく返金した
+    needs_attention = "needs_attention"  # 同上で返金にも失敗した（管理者が対応）
 
 
 # Product schemas
@@ -477,6 +516,7 @@ class JewelryProductBase(BaseModel):
     price: int
     price_includes_tax: bool = True
     stock: Optional[int] = 0
+    track_stock: Optional[bool] = None  # 未指定なら stock > 0 のとき在庫管理する
 
 
 class JewelryProductCreate(JewelryProductBase):
@@ -492,6 +532,7 @@ class JewelryProductUpdate(BaseModel):
     price: Optional[int] = None
     price_includes_tax: Optional[bool] = None
     stock: Optional[int] = None
+    track_stock: Optional[bool] = None
     is_active: Optional[bool] = None
     image_urls: Optional[List[str]] = None
 
@@ -586,6 +627,7 @@ class Order(BaseModel):
     phone: Optional[str] = None
     email: Optional[str] = None
     stripe_payment_intent_id: Optional[str] = None
+    reserved_until: Optional[datetime] = None
     paid_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
@@ -808,6 +850,7 @@ class PostWithTranslation(BaseModel):
     display_text: str
     has_translation: bool = False
     is_translated: bool = False
+    translation_pending: bool = False
     
     class Config:
         from_attributes = True
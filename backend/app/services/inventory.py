@@ -0,0 +1,299 @@
+"""Stock reservation for jewelry orders.
+
+Placing an order reserves its stock with one conditional UPDATE per product
+(``stock = stock - :q WHERE stock >= :q``): the database decides who gets the
+last unit, so concurrent checkouts can't oversell and never read-then-write
+the stock in Python. Products are updated in id order so two multi-product
+orders can't deadlock. Products with ``track_stock`` off have unlimited stock
+and are not written at all.
+
+The reservation holds until the order is paid or its ``reserved_until``
+passes. An order whose payment was canceled or whose reservation expired is
+cancelled and its quantities are put back (``release_reservation``);
+``ReservationSweeper`` does this periodically for expired orders, first
+cancelling their PaymentIntent so a late payment can't go through.
+
+A payment that still lands after the release (``settle_late_payment``) takes
+the stock again; if it's gone the payment is refunded (``refunded``), and if
+the refund fails the order is flagged ``needs_attention`` for an admin.
+It is never marked paid without stock.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import JewelryProduct, Order
+
+logger = logging.getLogger(__name__)
+
+JEWELRY_RESERVATION_TTL_MINUTES = int(os.getenv("JEWELRY_RESERVATION_TTL_MINUTES", "30"))
+JEWELRY_RESERVATION_SWEEP_INTERVAL_SECONDS = float(os.getenv("JEWELRY_RESERVATION_SWEEP_INTERVAL_SECONDS", "60"))
+RESERVATION_SWEEP_BATCH_SIZE = 100
+
+ORDER_REFUNDED = "refunded"
+ORDER_NEEDS_ATTENTION = "needs_attention"
+
+
+class OutOfStock(Exception):
+    """A product is inactive or has fewer units than requested."""
+
+    def __init__(self, product_id: int, remaining: Optional[int]):
+        super().__init__(f"Product {product_id} is out of stock")
+        self.product_id = product_id
+        self.remaining = remaining  # None: the product is gone or no longer on sale
+
+
+def reservation_deadline(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now(timezone.utc)) + timedelta(minutes=JEWELRY_RESERVATION_TTL_MINUTES)
+
+
+def reservation_expired(order: Order, now: Optional[datetime] = None) -> bool:
+    if order.reserved_until is None:
+        return False
+    reserved_until = order.reserved_until
+    if reserved_until.tzinfo is None:
+        # SQLite returns naive datetimes
+        reserved_until = reserved_until.replace(tzinfo=timezone.utc)
+    return reserved_until <= (now or datetime.now(timezone.utc))
+
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> None:
+    """
+    Take stock for an order. The caller commits, or rolls back on OutOfStock
+    (which also undoes the products already reserved).
+
+    Args:
+        db: Database session
+        quantities: product id -> quantity
+
+    Raises:
+        OutOfStock: A product is inactive or short of stock
+    """
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        result = db.execute(
+            update(JewelryProduct)
+            .where(
+                JewelryProduct.id == product_id,
+                JewelryProduct.is_active == True,
+                JewelryProduct.track_stock == True,
+                JewelryProduct.stock >= quantity,
+            )
+            .values(stock=JewelryProduct.stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            continue
+        row = (
+            db.query(JewelryProduct.is_active, JewelryProduct.track_stock, JewelryProduct.stock)
+            .filter(JewelryProduct.id == product_id)
+            .first()
+        )
+        if row is None or not row.is_active:
+            raise OutOfStock(product_id, None)
+        if row.track_stock:
+            raise OutOfStock(product_id, row.stock)
+        # Untracked stock: nothing to take
+
+
+def release_reservation(db: Session, order: Order) -> bool:
+    """
+    Cancel a pending order and put its quantities back. The caller commits.
+
+    Returns:
+        False if the order was no longer pending (paid, or already released)
+    """
+    claimed = (
+        db.query(Order)
+        .filter(Order.id == order.id, Order.status == "pending")
+        .update({"status": "cancelled", "reserved_until": None}, synchronize_session=False)
+    )
+    if not claimed:
+        return False
+    for item in sorted(order.items, key=lambda i: i.product_id):
+        db.execute(
+            update(JewelryProduct)
+            .where(JewelryProduct.id == item.product_id, JewelryProduct.track_stock == True)
+            .values(stock=JewelryProduct.stock + item.quantity)
+            .execution_options(synchronize_session=False)
+        )
+    db.expire(order)
+    return True
+
+
+def _refund_payment(payment_intent_id: Optional[str]) -> bool:
+    """Refund a captured payment in full. Returns whether Stripe accepted the refund."""
+    stripe_secret_key = os.environ.get("STRIPE_SECRET_KEY")
+    if not payment_intent_id or not stripe_secret_key:
+        return False
+    try:
+        import stripe
+        stripe.api_key = stripe_secret_key
+        stripe.Refund.create(payment_intent=payment_intent_id)
+        return True
+    except Exception as e:
+        logger.error(f"Refund of PaymentIntent {payment_intent_id} failed: {e}")
+        return False
+
+
+def settle_late_payment(db: Session, order: Order) -> Optional[str]:
+    """
+    Settle a payment that succeeded after the order's reservation was released.
+
+    Takes the stock again. If it has been sold in the meantime the payment is
+    refunded, or, when the refund fails, the order is flagged for an admin.
+    The caller commits.
+
+    Returns:
+        The order's new status ("paid", ORDER_REFUNDED or ORDER_NEEDS_ATTENTION),
+        or None if the order was not cancelled (another request settled it)
+    """
+    # Claim the order so concurrent confirmations settle it once; a crash
+    # from here on leaves it flagged rather than silently paid
+    claimed = (
+        db.query(Order)
+        .filter(Order.id == order.id, Order.status == "cancelled")
+        .update({"status": ORDER_NEEDS_ATTENTION}, synchronize_session=False)
+    )
+    if not claimed:
+        return None
+    quantities: Dict[int, int] = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    try:
+        # Savepoint: a shortfall undoes the products already taken, not the claim
+        with db.begin_nested():
+            reserve_stock(db, quantities)
+        status = "paid"
+    except OutOfStock as e:
+        if _refund_payment(order.stripe_payment_intent_id):
+            status = ORDER_REFUNDED
+            logger.warning(f"Order {order.id} was paid after its reservation expired; product {e.product_id} is sold out, refunded")
+        else:
+            status = ORDER_NEEDS_ATTENTION
+            logger.error(f"Order {order.id} was paid after its reservation expired; product {e.product_id} is sold out and the refund failed")
+    order.status = status
+    order.paid_at = datetime.utcnow()
+    order.reserved_until = None
+    return status
+
+
+def _settle_payment_intent(payment_intent_id: str) -> Optional[str]:
+    """
+    Cancel an expired order's PaymentIntent.
+
+    Returns:
+        "canceled" if no payment can happen any more, "succeeded" if it was
+        paid in the meantime, None if that couldn't be decided (retry later)
+    """
+    stripe_secret_key = os.environ.get("STRIPE_SECRET_KEY")
+    if not stripe_secret_key:
+        return "canceled"
+    try:
+        import stripe
+        stripe.api_key = stripe_secret_key
+        try:
+            intent = stripe.PaymentIntent.cancel(payment_intent_id)
+        except stripe.error.StripeError:
+            # Already succeeded / canceled / processing; look at where it ended up
+            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+    except Exception as e:
+        logger.warning(f"Could not cancel PaymentIntent {payment_intent_id}: {e}")
+        return None
+    if intent.status in ("canceled", "succeeded"):
+        return intent.status
+    return None
+
+
+def release_expired_reservations(batch_size: int = RESERVATION_SWEEP_BATCH_SIZE) -> int:
+    """
+    Cancel pending orders whose reservation has expired. Blocking; call from a thread.
+
+    Returns:
+        Number of orders released
+    """
+    db = SessionLocal()
+    released = 0
+    try:
+        now = datetime.now(timezone.utc)
+        orders = (
+            db.query(Order)
+            .filter(Order.status == "pending", Order.reserved_until.isnot(None), Order.reserved_until <= now)
+            .order_by(Order.reserved_until)
+            .limit(batch_size)
+            .all()
+        )
+        for order in orders:
+            outcome = "canceled"
+            if order.stripe_payment_intent_id:
+                outcome = _settle_payment_intent(order.stripe_payment_intent_id)
+            if outcome == "succeeded":
+                # Paid after all: keep the stock, the order goes through
+                order.status = "paid"
+                order.paid_at = datetime.utcnow()
+                order.reserved_until = None
+            elif outcome == "canceled" and release_reservation(db, order):
+                released += 1
+            db.commit()
+        return released
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class ReservationSweeper:
+    """Periodically releases the stock of orders whose reservation expired."""
+
+    def __init__(self, interval: float = JEWELRY_RESERVATION_SWEEP_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Start the periodic job. Called on app startup."""
+        if self.interval <= 0 or self.running:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Jewelry reservation sweeper started (every {self.interval:.0f}s)")
+
+    async def stop(self) -> None:
+        """Stop the periodic job. Called on app shutdown."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """Release every expired reservation, one batch at a time."""
+        released = 0
+        while True:
+            batch = await asyncio.to_thread(release_expired_reservations)
+            released += batch
+            if batch < RESERVATION_SWEEP_BATCH_SIZE:
+                return released
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                released = await self.run_once()
+                if released:
+                    logger.info(f"Released {released} expired jewelry reservations")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Jewelry reservation sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+reservation_sweeper = ReservationSweeper()
@@ -0,0 +1,132 @@
+"""In-process cache of the jewelry catalog (active products with their images).
+
+Products change a few times a day, but every storefront view and cart read
+used to load them (and their images, one query per product) from the
+database. Each process now keeps a snapshot of the whole active catalog,
+tagged with the catalog version from ``catalog_versions``. The admin
+endpoints bump the version in the same transaction as their write
+(``bump_catalog_version``). A request only reads that single row to check
+freshness and reloads the snapshot when it moved.
+
+Stock is the exception: orders change it constantly (app.services.inventory)
+without bumping the version, so ``with_current_stock`` overlays the live
+values of the products being served with one primary-key query.
+"""
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import CatalogVersion, JewelryProduct, JewelryProductImage
+
+logger = logging.getLogger(__name__)
+
+JEWELRY_CATALOG = "jewelry"
+
+_PRODUCT_COLUMNS = [c.key for c in JewelryProduct.__table__.columns]
+_IMAGE_COLUMNS = [c.key for c in JewelryProductImage.__table__.columns]
+
+
+@dataclass
+class CatalogSnapshot:
+    version: int
+    products: Dict[int, dict] = field(default_factory=dict)  # id -> product (with images)
+    ordered_ids: List[int] = field(default_factory=list)  # newest first, as the storefront lists them
+
+
+def current_version(db: Session) -> int:
+    version = db.query(CatalogVersion.version).filter(CatalogVersion.name == JEWELRY_CATALOG).scalar()
+    return version or 0
+
+
+def bump_catalog_version(db: Session) -> None:
+    """Invalidate every process's cached catalog. Call before committing a product write."""
+    bumped = (
+        db.query(CatalogVersion)
+        .filter(CatalogVersion.name == JEWELRY_CATALOG)
+        .update({"version": CatalogVersion.version + 1}, synchronize_session=False)
+    )
+    if not bumped:
+        db.add(CatalogVersion(name=JEWELRY_CATALOG, version=1))
+        db.flush()
+
+
+def product_dict(product: JewelryProduct) -> dict:
+    data = {key: getattr(product, key) for key in _PRODUCT_COLUMNS}
+    data["images"] = [{key: getattr(image, key) for key in _IMAGE_COLUMNS} for image in product.images]
+    return data
+
+
+def _load_snapshot(db: Session, version: int) -> CatalogSnapshot:
+    products = (
+        db.query(JewelryProduct)
+        .options(selectinload(JewelryProduct.images))
+        .filter(JewelryProduct.is_active == True)
+        .order_by(JewelryProduct.created_at.desc(), JewelryProduct.id.desc())
+        .all()
+    )
+    snapshot = CatalogSnapshot(version=version)
+    for product in products:
+        snapshot.products[product.id] = product_dict(product)
+        snapshot.ordered_ids.append(product.id)
+    return snapshot
+
+
+class JewelryCatalogCache:
+    """The current process's snapshot, reloaded when the catalog version moves."""
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """
+        The active catalog, fresh as of this call.
+
+        The version is read before the products, so a write that commits in
+        between is picked up by the next call at the latest.
+        """
+        version = current_version(db)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            # Another request may have reloaded while we waited
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = _load_snapshot(db, version)
+                self._snapshot = snapshot
+                logger.info(f"Loaded jewelry catalog v{version} ({len(snapshot.products)} products)")
+        return snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+jewelry_catalog = JewelryCatalogCache()
+
+
+def with_current_stock(db: Session, products: Iterable[dict]) -> List[dict]:
+    """Copies of cached products with their live stock."""
+    products = list(products)
+    if not products:
+        return []
+    stock = dict(
+        db.query(JewelryProduct.id, JewelryProduct.stock)
+        .filter(JewelryProduct.id.in_([p["id"] for p in products]))
+        .all()
+    )
+    return [{**p, "stock": stock.get(p["id"], p["stock"])} for p in products]
+
+
+def catalog_etag(version: int, products: Iterable[dict], *parts) -> str:
+    """
+    Weak ETag of a catalog response: the catalog version, the request
+    parameters and the live stock of the products served.
+    """
+    digest = hashlib.sha1(repr([(p["id"], p["stock"]) for p in products] + list(parts)).encode()).hexdigest()[:16]
+    return f'W/"jewelry-{version}-{digest}"'
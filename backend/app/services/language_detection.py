@@ -0,0 +1,135 @@
+"""Offline language detection for the supported languages.
+
+Japanese and Korean are recognised from their scripts (kana / Han / Hangul).
+Latin-script text is scored against character trigram profiles shipped in
+language_profiles.json (rebuild with scripts/build_language_profiles.py).
+Detection takes microseconds, so it can run on every write; callers fall back
+to the LLM only when the returned confidence is low.
+"""
+import json
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, Tuple
+
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "language_profiles.json")
+
+LOCAL_DETECTION_MIN_CONFIDENCE = float(os.getenv("LOCAL_DETECTION_MIN_CONFIDENCE", "0.8"))
+
+# Probability assigned to trigrams missing from a profile
+UNSEEN_TRIGRAM_FREQ = 1e-5
+# Below this many trigrams the statistics are too thin to be trusted
+MIN_TRIGRAMS = 6
+# A CJK character carries roughly as much text as a short Latin word fragment
+CJK_CHAR_WEIGHT = 3
+
+# Characters that almost only occur in one of the Latin-script languages
+MARKER_CHARS = {
+    "ñ": "es", "¿": "es", "¡": "es",
+    "ã": "pt", "õ": "pt",
+    "ß": "de", "ä": "de", "ö": "de",
+}
+MARKER_BONUS = 3.0
+
+_LATIN_WORD = re.compile(r"[a-zà-öø-ÿœ]+")
+
+
+def _is_kana(ch: str) -> bool:
+    return "぀" <= ch <= "ヿ" or "ㇰ" <= ch <= "ㇿ" or "ｦ" <= ch <= "ﾟ"
+
+
+def _is_han(ch: str) -> bool:
+    return "一" <= ch <= "鿿" or "㐀" <= ch <= "䶿"
+
+
+def _is_hangul(ch: str) -> bool:
+    return "가" <= ch <= "힯" or "ᄀ" <= ch <= "ᇿ" or "㄰" <= ch <= "㆏"
+
+
+def extract_trigrams(text: str) -> Iterator[str]:
+    """Yield space-padded character trigrams of the Latin words in text."""
+    for word in _LATIN_WORD.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+
+
+@lru_cache(maxsize=1)
+def _load_profiles() -> Dict[str, Dict[str, float]]:
+    with open(PROFILES_PATH, encoding="utf-8") as f:
+        profiles = json.load(f)
+    return {
+        lang: {gram: math.log(freq) for gram, freq in grams.items()}
+        for lang, grams in profiles.items()
+    }
+
+
+def _detect_latin(text: str) -> Tuple[str, float]:
+    profiles = _load_profiles()
+    unseen = math.log(UNSEEN_TRIGRAM_FREQ)
+    scores = {lang: 0.0 for lang in profiles}
+    trigram_count = 0
+    for gram in extract_trigrams(text):
+        trigram_count += 1
+        for lang, profile in profiles.items():
+            scores[lang] += profile.get(gram, unseen)
+    if trigram_count == 0:
+        return "unknown", 0.0
+
+    lowered = text.lower()
+    for ch, lang in MARKER_CHARS.items():
+        if lang in scores and ch in lowered:
+            scores[lang] += MARKER_BONUS * lowered.count(ch)
+
+    best = max(scores, key=scores.get)
+    # Posterior of the best language under a uniform prior
+    confidence = 1.0 / sum(math.exp(score - scores[best]) for score in scores.values())
+    if trigram_count < MIN_TRIGRAMS:
+        confidence *= trigram_count / MIN_TRIGRAMS
+    return best, confidence
+
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """
+    Detect the language of text without any network call.
+
+    Args:
+        text: Text to inspect
+
+    Returns:
+        (language code or 'unknown', confidence between 0 and 1)
+    """
+    if not text:
+        return "unknown", 0.0
+
+    kana = han = hangul = latin = 0
+    for ch in text:
+        if _is_kana(ch):
+            kana += 1
+        elif _is_han(ch):
+            han += 1
+        elif _is_hangul(ch):
+            hangul += 1
+        elif ch.isalpha() and ch.isascii() or "À" <= ch <= "ɏ":
+            latin += 1
+
+    ja_weight = (kana + han) * CJK_CHAR_WEIGHT
+    ko_weight = hangul * CJK_CHAR_WEIGHT
+    if ja_weight == 0 and ko_weight == 0:
+        if latin == 0:
+            return "unknown", 0.0
+        return _detect_latin(text)
+
+    if ko_weight >= ja_weight and ko_weight >= latin:
+        return "ko", 0.99
+    if ja_weight >= latin:
+        # Han without any kana may just as well be Chinese, which is not supported
+        return "ja", 0.99 if kana else 0.6
+    return _detect_latin(text)
+
+
+def detect_language_code(text: str, min_confidence: float = LOCAL_DETECTION_MIN_CONFIDENCE) -> str:
+    """Return the detected language code, or 'unknown' below min_confidence."""
+    lang, confidence = detect_language(text)
+    return lang if confidence >= min_confidence else "unknown"
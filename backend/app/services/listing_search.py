@@ -0,0 +1,176 @@
+"""Ranked keyword search over flea market and art listings (and the search index).
+
+Postgres: a generated ``search_vector`` tsvector column (GIN index) matches
+whitespace-separated words, and a ``pg_trgm`` GIN index on ``title || ' ' ||
+description`` serves substring matches, which is what Japanese text (no spaces
+between words) needs. Results are ranked by ``ts_rank`` plus trigram word
+similarity.
+
+SQLite (local dev): an external-content FTS5 table with the trigram tokenizer,
+kept in sync by triggers, ranked by ``bm25``. Terms shorter than three
+characters can't use a trigram index and fall back to LIKE on both backends.
+
+The DDL is applied by the alembic migration and again idempotently on startup
+(``ensure_listing_search``).
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, Integer, and_, func, inspect, literal_column, or_, text
+
+# Searchable table -> (title column, text column)
+SEARCHABLE_TABLES = {
+    "flea_market_items": ("title", "description"),
+    "art_sale_items": ("title", "description"),
+    "search_documents": ("title", "body"),
+}
+TS_CONFIG = "simple"  # no Japanese stemmer in Postgres; tokens are whitespace-separated words
+MAX_TERMS = 8
+TRIGRAM_MIN_CHARS = 3
+# bm25 column weight of title relative to description
+TITLE_WEIGHT = 5.0
+
+
+def _text_expr(table: str, title: str, body: str, qualified: bool = False) -> str:
+    prefix = f"{table}." if qualified else ""
+    return f"(coalesce({prefix}{title}, '') || ' ' || coalesce({prefix}{body}, ''))"
+
+
+def postgres_search_ddl(table: str) -> List[str]:
+    title, body = SEARCHABLE_TABLES[table]
+    search_text = _text_expr(table, title, body)
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}', {search_text})) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm ON {table} USING GIN ({search_text} gin_trgm_ops)",
+    ]
+
+
+def sqlite_search_ddl(table: str) -> List[str]:
+    title, body = SEARCHABLE_TABLES[table]
+    fts = f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{title}, {body}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {title}, {body}) VALUES (new.id, new.{title}, new.{body}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {title}, {body}) VALUES ('delete', old.id, old.{title}, old.{body}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {title}, {body} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {title}, {body}) VALUES ('delete', old.id, old.{title}, old.{body}); "
+        f"INSERT INTO {fts}(rowid, {title}, {body}) VALUES (new.id, new.{title}, new.{body}); END",
+    ]
+
+
+def _sqlite_table_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": name}).first() is not None
+
+
+def ensure_listing_search(conn) -> None:
+    """Create the search columns / indexes / FTS tables if missing. The caller commits."""
+    dialect = conn.dialect.name
+    for table in SEARCHABLE_TABLES:
+        if not inspect(conn).has_table(table):
+            continue
+        if dialect == "postgresql":
+            for statement in postgres_search_ddl(table):
+                conn.execute(text(statement))
+        elif dialect == "sqlite":
+            created = not _sqlite_table_exists(conn, f"{table}_fts")
+            for statement in sqlite_search_ddl(table):
+                conn.execute(text(statement))
+            if created:
+                # Index the rows that existed before the FTS table
+                conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+
+def keyword_terms(keyword: Optional[str]) -> List[str]:
+    """Split a search box value on ASCII and full-width spaces."""
+    terms = [t for t in re.split(r"[\s　]+", keyword or "") if t]
+    return list(dict.fromkeys(terms))[:MAX_TERMS]
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _columns(model):
+    title, body = SEARCHABLE_TABLES[model.__tablename__]
+    return getattr(model, title), getattr(model, body)
+
+
+def _like_any(model, term: str):
+    pattern = _like_pattern(term)
+    return or_(*[column.ilike(pattern, escape="\\") for column in _columns(model)])
+
+
+def _search_postgres(query, model, terms: List[str], keyword: str):
+    table = model.__tablename__
+    # Must match the ix_*_search_trgm index expression to use it
+    search_text = literal_column(_text_expr(table, *SEARCHABLE_TABLES[table], qualified=True))
+    search_vector = literal_column(f"{table}.search_vector")
+    for term in terms:
+        query = query.filter(or_(
+            search_vector.op("@@")(func.plainto_tsquery(TS_CONFIG, term)),
+            search_text.ilike(_like_pattern(term), escape="\\"),
+        ))
+    rank = (
+        func.ts_rank(search_vector, func.plainto_tsquery(TS_CONFIG, keyword))
+        + func.word_similarity(keyword, _columns(model)[0])
+        + func.word_similarity(keyword, search_text)
+    )
+    return query, rank
+
+
+def _search_sqlite(db, query, model, terms: List[str]):
+    fts = f"{model.__tablename__}_fts"
+    if not _sqlite_table_exists(db, fts):
+        return _search_like(query, model, terms)
+    trigram_terms = [t for t in terms if len(t) >= TRIGRAM_MIN_CHARS]
+    for term in terms:
+        if len(term) < TRIGRAM_MIN_CHARS:
+            query = query.filter(_like_any(model, term))
+    if not trigram_terms:
+        return query, None
+    match = " AND ".join('"' + t.replace('"', '""') + '"' for t in trigram_terms)
+    hits = (
+        text(f"SELECT rowid AS item_id, bm25({fts}, {TITLE_WEIGHT}, 1.0) AS score FROM {fts} WHERE {fts} MATCH :match")
+        .bindparams(match=match)
+        .columns(item_id=Integer, score=Float)
+        .subquery()
+    )
+    query = query.join(hits, hits.c.item_id == model.id)
+    # bm25 is lower-is-better
+    return query, -hits.c.score
+
+
+def _search_like(query, model, terms: List[str]):
+    return query.filter(and_(*[_like_any(model, t) for t in terms])), None
+
+
+def apply_keyword_search(db, query, model, keyword: Optional[str]) -> Tuple[object, Optional[object]]:
+    """
+    Filter a listing query by a search box value.
+
+    Args:
+        db: Database session
+        query: Query over `model`, possibly already filtered
+        model: A model whose table is in SEARCHABLE_TABLES
+        keyword: Raw search box value; every term must match
+
+    Returns:
+        The filtered query and a relevance expression (higher is better), or
+        None when there is nothing to rank by
+    """
+    terms = keyword_terms(keyword)
+    if not terms:
+        return query, None
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return _search_postgres(query, model, terms, " ".join(terms))
+    if dialect == "sqlite":
+        return _search_sqlite(db, query, model, terms)
+    return _search_like(query, model, terms)
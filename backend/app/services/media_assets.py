@@ -0,0 +1,172 @@
+"""Content-hash deduplication and reference counting of media assets.
+
+Uploads are hashed (SHA-256) while streaming. When the same user uploads
+identical content again, the existing MediaAsset is reused and its ref_count is
+incremented instead of storing a second object. Deleting a media asset or a post
+releases one reference; the stored object (and its derivatives) is removed only
+when the last reference goes away.
+
+An asset whose stored object the reconciler marked missing is not shared as is:
+the re-upload becomes its new object (``restore_missing_asset``), which repairs
+the asset for everything referencing it instead of dropping the good copy.
+"""
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import MediaAsset
+from app.services.storage import media_storage
+
+logger = logging.getLogger(__name__)
+
+# A duplicate can be released or restored between the lookup and the update; look again this often
+REGISTER_UPLOAD_ATTEMPTS = 3
+
+
+def delete_stored_object(url: Optional[str]) -> None:
+    """Delete the stored object behind a media URL. Failures are logged, not raised."""
+    key = media_storage.key_for_url(url)
+    if key is None:
+        return
+    try:
+        media_storage.delete_object(key)
+    except Exception as e:
+        logger.warning(f"Failed to delete stored media {url}: {e}")
+
+
+def find_duplicate(db: Session, user_id: int, content_hash: Optional[str]) -> Optional[MediaAsset]:
+    if not content_hash:
+        return None
+    return (
+        db.query(MediaAsset)
+        .filter(MediaAsset.user_id == user_id, MediaAsset.content_hash == content_hash)
+        .first()
+    )
+
+
+def restore_missing_asset(db: Session, asset: MediaAsset, url: str, mime_type: str, size_bytes: int) -> bool:
+    """
+    Point an asset whose object went missing at a fresh upload of the same
+    content and count the upload as a reference. Its derivatives are reset so
+    they get regenerated. The caller commits.
+
+    Returns:
+        False if the asset is no longer marked missing (restored concurrently)
+    """
+    restored = (
+        db.query(MediaAsset)
+        .filter(MediaAsset.id == asset.id, MediaAsset.missing_at.isnot(None))
+        .update(
+            {
+                MediaAsset.url: url,
+                MediaAsset.mime_type: mime_type,
+                MediaAsset.size_bytes: size_bytes,
+                MediaAsset.missing_at: None,
+                MediaAsset.thumb_url: None,
+                MediaAsset.variants: None,
+                MediaAsset.derivatives_status: None,
+                MediaAsset.ref_count: MediaAsset.ref_count + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.expire(asset)
+    return bool(restored)
+
+
+def add_reference(db: Session, asset: MediaAsset) -> bool:
+    """
+    Count one more user of an asset. Atomic in the database; the caller commits.
+
+    Returns:
+        False if the asset was deleted in the meantime (its last reference released)
+    """
+    updated = db.query(MediaAsset).filter(MediaAsset.id == asset.id).update(
+        {MediaAsset.ref_count: MediaAsset.ref_count + 1}, synchronize_session=False
+    )
+    return bool(updated)
+
+
+def register_upload(
+    db: Session, user_id: int, url: str, mime_type: str, size_bytes: int, content_hash: Optional[str]
+) -> Tuple[MediaAsset, bool]:
+    """
+    Record an uploaded object as a MediaAsset and commit, sharing the user's
+    existing asset with the same content.
+
+    Returns:
+        (asset, whether the uploaded object is kept). When it isn't, the asset
+        already has the content and the caller deletes the uploaded object.
+    """
+    for _ in range(REGISTER_UPLOAD_ATTEMPTS):
+        duplicate = find_duplicate(db, user_id, content_hash)
+        if duplicate is not None:
+            if duplicate.missing_at is not None:
+                if restore_missing_asset(db, duplicate, url, mime_type, size_bytes):
+                    db.commit()
+                    return duplicate, True
+            elif add_reference(db, duplicate):
+                db.commit()
+                return duplicate, False
+            # Restored or released concurrently: look again
+            db.rollback()
+            continue
+
+        asset = MediaAsset(
+            user_id=user_id,
+            url=url,
+            mime_type=mime_type,
+            size_bytes=size_bytes,
+            content_hash=content_hash,
+        )
+        db.add(asset)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Same content registered concurrently
+            db.rollback()
+            continue
+        db.refresh(asset)
+        return asset, True
+    raise RuntimeError(f"Could not register upload {url}: its duplicate kept changing")
+
+
+def release_media(db: Session, asset: MediaAsset) -> bool:
+    """
+    Drop one reference to an asset and commit. The last reference deletes the
+    row, the stored object and its derivatives.
+
+    Returns:
+        Whether the asset was deleted
+    """
+    from app.services.media_derivatives import delete_derivatives
+
+    # One transaction: the decrement locks the row until the commit, and the
+    # row is only deleted while nothing holds a reference. A concurrent
+    # add_reference either lands first (and keeps the asset) or finds it gone.
+    db.query(MediaAsset).filter(MediaAsset.id == asset.id, MediaAsset.ref_count > 0).update(
+        {MediaAsset.ref_count: MediaAsset.ref_count - 1}, synchronize_session=False
+    )
+    row = db.query(MediaAsset.url, MediaAsset.variants).filter(MediaAsset.id == asset.id).first()
+    if row is None:
+        # Already deleted by a concurrent release
+        db.commit()
+        return False
+    url, variants = row
+    deleted = (
+        db.query(MediaAsset)
+        .filter(MediaAsset.id == asset.id, MediaAsset.ref_count <= 0)
+        .delete(synchronize_session=False)
+    )
+    if deleted:
+        db.expunge(asset)
+    db.commit()
+    if not deleted:
+        return False
+
+    # The row is gone first, so a concurrent dedup can no longer resolve to this object
+    delete_derivatives(variants)
+    delete_stored_object(url)
+    return True
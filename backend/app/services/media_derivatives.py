@@ -0,0 +1,237 @@
+"""Resized WebP/JPEG derivatives of uploaded images.
+
+After an upload (or lazily, the first time a list endpoint sees an asset without
+derivatives) the original is decoded in a process pool and re-encoded at fixed
+widths with EXIF and other metadata stripped. The variant URLs are recorded on
+the MediaAsset row; list endpoints return the small one as ``thumb_url``.
+Existing assets can be backfilled with scripts/backfill_media_derivatives.py.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.services.media_assets import delete_stored_object
+from app.services.storage import media_storage
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DERIVATIVE_WORKERS = int(os.getenv("MEDIA_DERIVATIVE_WORKERS", "2"))
+# name -> target width in px. Smaller originals are re-encoded without upscaling.
+DERIVATIVE_WIDTHS = {"thumb": 320, "medium": 1080}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+DERIVATIVE_CACHE_CONTROL = "public, max-age=31536000"
+
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+STATUS_UNSUPPORTED = "unsupported"
+
+def derivatives_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def render_variants(data: bytes) -> Dict[str, Tuple[int, bytes, bytes]]:
+    """
+    Decode an image and encode every derivative width. Runs in a worker process.
+
+    Returns:
+        name -> (width, webp bytes, jpeg bytes)
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        # Rebuilding from raw pixels drops EXIF, ICC, XMP and comments
+        image = Image.frombytes(image.mode, image.size, image.tobytes())
+
+    variants = {}
+    for name, width in DERIVATIVE_WIDTHS.items():
+        resized = image
+        if image.width > width:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        webp = io.BytesIO()
+        resized.save(webp, "WEBP", quality=WEBP_QUALITY, method=4)
+        jpeg = io.BytesIO()
+        resized.convert("RGB").save(jpeg, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        variants[name] = (resized.width, webp.getvalue(), jpeg.getvalue())
+    return variants
+
+
+def _load_original(url: str) -> Optional[bytes]:
+    """Original bytes for a stored asset URL, or None for URLs not in our storage."""
+    key = media_storage.key_for_url(url)
+    return media_storage.get_object(key) if key else None
+
+
+def generate_derivatives(asset_id: int, render: Callable[[bytes], dict] = render_variants) -> Optional[str]:
+    """
+    Create and record the derivatives of one asset. Blocking; call from a thread.
+
+    Args:
+        asset_id: MediaAsset id
+        render: Encoder, e.g. a wrapper submitting render_variants to a process pool
+
+    Returns:
+        The resulting derivatives status, or None if the asset is gone
+    """
+    from app.database import SessionLocal
+    from app.models import MediaAsset
+
+    db = SessionLocal()
+    try:
+        asset = db.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+        if asset is None:
+            return None
+        url, mime_type = asset.url, asset.mime_type
+        db.rollback()  # don't hold a connection while decoding
+
+        variants = None
+        if mime_type and mime_type.startswith("image/"):
+            try:
+                original = _load_original(url)
+                if original is None:
+                    status = STATUS_UNSUPPORTED
+                else:
+                    variants = {}
+                    for name, (width, webp, jpeg) in render(original).items():
+                        stem = f"media/derived/{asset_id}_{name}"
+                        variants[name] = {
+                            "width": width,
+                            "webp": media_storage.put_object(f"{stem}.webp", webp, "image/webp", DERIVATIVE_CACHE_CONTROL),
+                            "jpeg": media_storage.put_object(f"{stem}.jpg", jpeg, "image/jpeg", DERIVATIVE_CACHE_CONTROL),
+                        }
+                    status = STATUS_READY
+            except Exception as e:
+                logger.error(f"Derivative generation failed for media {asset_id}: {e}")
+                status = STATUS_FAILED
+        else:
+            status = STATUS_UNSUPPORTED
+
+        asset = db.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+        if asset is None:
+            return None
+        asset.derivatives_status = status
+        if variants:
+            asset.variants = variants
+            asset.thumb_url = variants["thumb"]["webp"]
+        db.commit()
+        return status
+    finally:
+        db.close()
+
+
+def delete_derivatives(variants: Optional[dict]) -> None:
+    """Remove the derivative files listed in an asset's ``variants``. Failures are logged, not raised."""
+    for variant in (variants or {}).values():
+        delete_stored_object(variant.get("webp"))
+        delete_stored_object(variant.get("jpeg"))
+
+
+class MediaDerivativePipeline:
+    """Runs derivative generation off the request path: encoding in a process pool."""
+
+    def __init__(self, workers: int = MEDIA_DERIVATIVE_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight: set = set()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    async def start(self) -> None:
+        """Create the process pool. Called on app startup."""
+        if self.workers <= 0 or self.running or not derivatives_available():
+            return
+        # spawn: forking a process that runs the event loop and DB pool threads is unsafe
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._loop = asyncio.get_running_loop()
+        logger.info(f"Media derivatives started with {self.workers} worker processes")
+
+    async def stop(self) -> None:
+        """Shut the process pool down. Called on app shutdown."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+        self._loop = None
+
+    def _render(self, data: bytes) -> dict:
+        return self._executor.submit(render_variants, data).result()
+
+    def request(self, asset_ids: Iterable[int]) -> int:
+        """
+        Queue derivative generation. Safe to call from the event loop or from
+        sync endpoints running in the threadpool; assets already in progress are
+        skipped, and it is a no-op while the pipeline is not running.
+
+        Returns:
+            Number of assets queued
+        """
+        if not self.running or self._loop is None:
+            return 0
+        with self._lock:
+            new_ids = [i for i in set(asset_ids) if i not in self._in_flight]
+            self._in_flight.update(new_ids)
+        for asset_id in new_ids:
+            self._loop.call_soon_threadsafe(self._spawn, asset_id)
+        return len(new_ids)
+
+    def _spawn(self, asset_id: int) -> None:
+        task = asyncio.ensure_future(self._generate(asset_id))
+        task.add_done_callback(lambda _: self._done(asset_id))
+
+    def _done(self, asset_id: int) -> None:
+        with self._lock:
+            self._in_flight.discard(asset_id)
+
+    async def _generate(self, asset_id: int) -> None:
+        if not self.running:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, generate_derivatives, asset_id, self._render)
+        except Exception as e:
+            logger.error(f"Derivative generation for media {asset_id} failed: {e}")
+
+
+media_derivatives = MediaDerivativePipeline()
+
+
+def thumb_url_for(asset) -> Optional[str]:
+    """thumb_url of a MediaAsset, queueing lazy generation when it has none yet."""
+    if asset is None:
+        return None
+    if asset.thumb_url:
+        return asset.thumb_url
+    if asset.derivatives_status is None:
+        media_derivatives.request([asset.id])
+    return asset.url
+
+
+def thumb_urls_for_urls(db, urls: Iterable[Optional[str]]) -> Dict[str, str]:
+    """
+    Map stored media URLs to their thumbnail URL in one query. URLs without a
+    MediaAsset or without derivatives yet map to themselves.
+    """
+    from app.models import MediaAsset
+
+    urls = {u for u in urls if u}
+    if not urls:
+        return {}
+    thumbs = {u: u for u in urls}
+    assets = db.query(MediaAsset).filter(MediaAsset.url.in_(urls)).all()
+    for asset in assets:
+        thumbs[asset.url] = thumb_url_for(asset)
+    return thumbs
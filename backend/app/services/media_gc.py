@@ -0,0 +1,251 @@
+"""Garbage collection of media objects nothing refers to any more.
+
+Media is referenced in two ways: by MediaAsset id (``posts.media_id``,
+``post_media``) and by URL (avatars, post / blog bodies and the image tables of
+the flea market, art, jewelry, courses, donations and matching profiles). A GC
+run:
+
+1. streams every referencing column (``yield_per``) into a set of storage keys,
+   recognizing both local (``/media/...``) and S3 URLs;
+2. streams ``media_assets``: every asset keeps its object and derivatives,
+   except records whose object has been missing (``missing_at``, set by the
+   reconciliation job) for longer than the grace period and that no post uses,
+   which are themselves orphaned;
+3. lists the ``media/`` prefix of the storage and deletes objects that are not
+   in the set and older than the grace period, in ``delete_objects`` batches
+   capped per run and per second.
+
+With ``dry_run`` nothing is deleted and the report says what would have been.
+Run it with scripts/gc_orphaned_media.py.
+"""
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.storage import MediaStorage, media_storage
+
+logger = logging.getLogger(__name__)
+
+GC_GRACE_PERIOD = timedelta(hours=24)
+GC_BATCH_SIZE = 1000  # delete_objects takes at most 1000 keys
+GC_MAX_DELETES = 10000
+GC_DELETES_PER_SECOND = 500.0
+GC_SAMPLE_SIZE = 20
+STREAM_CHUNK_ROWS = 1000
+MEDIA_PREFIX = "media/"
+# Only files the app writes are candidates; anything else under the media dir is left alone
+GC_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".pdf")
+
+# Columns holding a media URL
+URL_COLUMNS = (
+    models.Profile.avatar_url,
+    models.Profile.banner_url,
+    models.Post.og_image_url,
+    models.PostTourism.attachment_pdf_url,
+    models.MatchingProfile.avatar_url,
+    models.MatchingProfileImage.image_url,
+    models.DonationProjectImage.image_url,
+    models.FleaMarketItemImage.image_url,
+    models.ArtSaleItemImage.image_url,
+    models.JewelryProductImage.image_url,
+    models.CourseImage.image_url,
+    models.BlogPost.image_url,
+)
+# Free text that may embed media URLs
+TEXT_COLUMNS = (
+    models.Post.body,
+    models.BlogPost.body,
+)
+MEDIA_KEY_RE = re.compile(r"/(media/[A-Za-z0-9._\-/]+)")
+
+
+@dataclass
+class MediaGCReport:
+    dry_run: bool
+    referenced_keys: int = 0
+    scanned_objects: int = 0
+    orphaned_objects: int = 0
+    orphaned_bytes: int = 0
+    deleted_objects: int = 0
+    orphaned_records: int = 0
+    deleted_records: int = 0
+    limit_reached: bool = False
+    sample: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def media_keys_in(text: Optional[str]) -> Iterator[str]:
+    """Storage keys of every local or S3 media URL in a URL or a block of text."""
+    if not text:
+        return
+    for match in MEDIA_KEY_RE.finditer(text):
+        yield match.group(1).rstrip("/.")
+
+
+def _stream_column(db: Session, column) -> Iterator[str]:
+    stmt = select(column).where(column.isnot(None)).execution_options(yield_per=STREAM_CHUNK_ROWS)
+    for (value,) in db.execute(stmt):
+        yield value
+
+
+def collect_referenced(db: Session, cutoff: datetime) -> tuple:
+    """
+    One streaming pass over every referencing table.
+
+    Returns:
+        (referenced storage keys, ids of orphaned MediaAsset records)
+    """
+    keys: Set[str] = set()
+    for column in URL_COLUMNS + TEXT_COLUMNS:
+        for value in _stream_column(db, column):
+            keys.update(media_keys_in(value))
+
+    used_asset_ids = set(_stream_column(db, models.Post.media_id))
+    used_asset_ids.update(_stream_column(db, models.PostMedia.media_asset_id))
+
+    orphaned_records: List[int] = []
+    stmt = select(
+        models.MediaAsset.id, models.MediaAsset.url, models.MediaAsset.variants, models.MediaAsset.missing_at
+    ).execution_options(yield_per=STREAM_CHUNK_ROWS)
+    for asset_id, url, variants, missing_at in db.execute(stmt):
+        url_keys = set(media_keys_in(url))
+        if (
+            missing_at is not None
+            and _aware(missing_at) < cutoff
+            and asset_id not in used_asset_ids
+            and not (url_keys & keys)
+        ):
+            # Its derivatives are left out of the set and collected with the objects
+            orphaned_records.append(asset_id)
+            continue
+        keys.update(url_keys)
+        for variant in (variants or {}).values():
+            keys.update(media_keys_in(variant.get("webp")))
+            keys.update(media_keys_in(variant.get("jpeg")))
+    return keys, orphaned_records
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite returns naive datetimes
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _chunks(items: List[int], size: int) -> Iterable[List[int]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class _RateLimiter:
+    """Spaces out delete batches so a run stays under `per_second` deletes."""
+
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self._next_at = 0.0
+
+    def wait(self, count: int) -> None:
+        if self.per_second <= 0:
+            return
+        now = time.monotonic()
+        if self._next_at > now:
+            time.sleep(self._next_at - now)
+        self._next_at = max(now, self._next_at) + count / self.per_second
+
+
+def delete_orphaned_records(db: Session, asset_ids: List[int], batch_size: int = GC_BATCH_SIZE) -> int:
+    """Delete orphaned MediaAsset rows, re-checking that no post picked them up since the scan."""
+    used_by_posts = select(models.Post.media_id).where(models.Post.media_id.isnot(None))
+    used_by_post_media = select(models.PostMedia.media_asset_id)
+    deleted = 0
+    for batch in _chunks(asset_ids, batch_size):
+        deleted += (
+            db.query(models.MediaAsset)
+            .filter(
+                models.MediaAsset.id.in_(batch),
+                models.MediaAsset.missing_at.isnot(None),
+                models.MediaAsset.id.notin_(used_by_posts),
+                models.MediaAsset.id.notin_(used_by_post_media),
+            )
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+    return deleted
+
+
+def run_media_gc(
+    db: Session,
+    dry_run: bool = True,
+    grace_period: timedelta = GC_GRACE_PERIOD,
+    batch_size: int = GC_BATCH_SIZE,
+    max_deletes: int = GC_MAX_DELETES,
+    deletes_per_second: float = GC_DELETES_PER_SECOND,
+    storage: MediaStorage = media_storage,
+) -> MediaGCReport:
+    """
+    Delete media objects and records nothing references. Blocking.
+
+    Args:
+        db: Database session
+        dry_run: Only report what would be deleted
+        grace_period: Objects / missing records younger than this are kept
+            (covers uploads whose referencing row isn't committed yet)
+        batch_size: Keys per delete_objects call (at most 1000 for S3)
+        max_deletes: Stop deleting objects after this many in one run
+        deletes_per_second: Upper bound on the object delete rate (0 = unlimited)
+        storage: Media storage to collect
+
+    Returns:
+        What was (or, in a dry run, would have been) deleted
+    """
+    report = MediaGCReport(dry_run=dry_run)
+    cutoff = datetime.now(timezone.utc) - grace_period
+    batch_size = max(1, min(batch_size, GC_BATCH_SIZE))
+
+    referenced, orphaned_records = collect_referenced(db, cutoff)
+    db.rollback()  # don't hold a transaction open during the storage listing
+    report.referenced_keys = len(referenced)
+    report.orphaned_records = len(orphaned_records)
+
+    limiter = _RateLimiter(deletes_per_second)
+    pending: List[str] = []
+
+    def flush() -> None:
+        if not pending:
+            return
+        if not dry_run:
+            limiter.wait(len(pending))
+            storage.delete_objects(pending)
+            report.deleted_objects += len(pending)
+        pending.clear()
+
+    for obj in storage.list_objects(MEDIA_PREFIX):
+        report.scanned_objects += 1
+        if obj.key in referenced or not obj.key.lower().endswith(GC_EXTENSIONS):
+            continue
+        if _aware(obj.last_modified) >= cutoff:
+            continue
+        if report.orphaned_objects >= max_deletes:
+            report.limit_reached = True
+            break
+        report.orphaned_objects += 1
+        report.orphaned_bytes += obj.size or 0
+        if len(report.sample) < GC_SAMPLE_SIZE:
+            report.sample.append(obj.key)
+        pending.append(obj.key)
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+
+    if not dry_run and orphaned_records:
+        report.deleted_records = delete_orphaned_records(db, orphaned_records, batch_size)
+
+    logger.info(f"Media GC {'(dry run) ' if dry_run else ''}finished: {report.to_dict()}")
+    return report
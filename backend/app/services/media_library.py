@@ -0,0 +1,271 @@
+"""A user's image library: server-side ordering, cursor pagination and reconciliation.
+
+The display order is stored on ``MediaAsset.position`` (0, 1, 2, ...); assets
+the user never placed have a NULL position and are listed after the ordered
+ones, newest first. The list endpoint reads one keyset page from the
+``(user_id, position, id)`` index instead of checking files and sorting in
+Python.
+
+Whether the stored object still exists is checked off the request path by
+``MediaReconciler``, which periodically walks the assets in id batches and sets
+or clears ``missing_at``. Its first pass also imports the legacy per-user
+``user_{id}_order.json`` files into ``position``.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, or_, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import MediaAsset
+from app.services.storage import get_media_dir, media_storage
+
+logger = logging.getLogger(__name__)
+
+MEDIA_RECONCILE_INTERVAL_SECONDS = float(os.getenv("MEDIA_RECONCILE_INTERVAL_SECONDS", "3600"))
+MEDIA_RECONCILE_BATCH_SIZE = int(os.getenv("MEDIA_RECONCILE_BATCH_SIZE", "200"))
+LEGACY_ORDER_GLOB = "user_*_order.json"
+
+
+class InvalidCursor(ValueError):
+    """The pagination cursor is malformed."""
+
+
+def library_query(db: Session, user_id: int):
+    """The user's listable images, in display order."""
+    return (
+        db.query(MediaAsset)
+        .filter(
+            MediaAsset.user_id == user_id,
+            MediaAsset.mime_type.like("image/%"),
+            MediaAsset.missing_at.is_(None),
+        )
+        .order_by(MediaAsset.position.asc().nulls_last(), MediaAsset.id.desc())
+    )
+
+
+def encode_cursor(asset: MediaAsset) -> str:
+    if asset.position is None:
+        return f"n:{asset.id}"
+    return f"p{asset.position}:{asset.id}"
+
+
+def _after_cursor(cursor: str):
+    """Keyset condition selecting the rows after ``cursor`` in display order."""
+    try:
+        head, asset_id = cursor.split(":", 1)
+        asset_id = int(asset_id)
+        if head == "n":
+            return and_(MediaAsset.position.is_(None), MediaAsset.id < asset_id)
+        if not head.startswith("p"):
+            raise ValueError(cursor)
+        position = int(head[1:])
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    return or_(
+        MediaAsset.position > position,
+        and_(MediaAsset.position == position, MediaAsset.id < asset_id),
+        MediaAsset.position.is_(None),
+    )
+
+
+def list_library_page(
+    db: Session, user_id: int, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Tuple[List[MediaAsset], Optional[str]]:
+    """
+    One page of a user's image library.
+
+    Args:
+        db: Database session
+        user_id: Owner
+        cursor: next_cursor of the previous page
+        limit: Page size; None returns the whole library
+
+    Returns:
+        The assets and the cursor of the next page (None on the last page)
+
+    Raises:
+        InvalidCursor: The cursor is malformed
+    """
+    query = library_query(db, user_id)
+    if cursor:
+        query = query.filter(_after_cursor(cursor))
+    if limit is None:
+        return query.all(), None
+    assets = query.limit(limit + 1).all()
+    if len(assets) <= limit:
+        return assets, None
+    assets = assets[:limit]
+    return assets, encode_cursor(assets[-1])
+
+
+def save_positions(db: Session, user_id: int, ordered_ids: Sequence[int]) -> None:
+    """
+    Store a user's display order in two bulk UPDATEs: listed assets get
+    positions 0..n-1, every other asset of the user becomes unordered. The
+    caller commits.
+    """
+    ordered_ids = list(dict.fromkeys(ordered_ids))
+    unlisted = db.query(MediaAsset).filter(MediaAsset.user_id == user_id, MediaAsset.position.isnot(None))
+    if ordered_ids:
+        unlisted = unlisted.filter(MediaAsset.id.notin_(ordered_ids))
+    unlisted.update({MediaAsset.position: None}, synchronize_session=False)
+    if ordered_ids:
+        db.execute(
+            update(MediaAsset)
+            .where(MediaAsset.user_id == user_id, MediaAsset.id.in_(ordered_ids))
+            .values(position=case({mid: idx for idx, mid in enumerate(ordered_ids)}, value=MediaAsset.id))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def import_legacy_order_files(media_dir: Path) -> int:
+    """
+    Move ``user_{id}_order.json`` files into ``MediaAsset.position``. Imported
+    files are renamed to ``*.imported`` so later runs skip them.
+
+    Returns:
+        Number of files imported
+    """
+    imported = 0
+    for order_file in sorted(media_dir.glob(LEGACY_ORDER_GLOB)):
+        try:
+            user_id = int(order_file.name[len("user_"):-len("_order.json")])
+            with open(order_file, "r", encoding="utf-8") as f:
+                ids = [int(i) for i in (json.load(f) or []) if str(i).isdigit()]
+        except (ValueError, OSError) as e:
+            logger.warning(f"Skipping unreadable media order file {order_file}: {e}")
+            continue
+        db = SessionLocal()
+        try:
+            owned = {
+                row.id
+                for row in db.query(MediaAsset.id).filter(MediaAsset.user_id == user_id, MediaAsset.id.in_(ids))
+            } if ids else set()
+            save_positions(db, user_id, [i for i in ids if i in owned])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to import media order file {order_file}: {e}")
+            continue
+        finally:
+            db.close()
+        order_file.rename(order_file.with_name(order_file.name + ".imported"))
+        imported += 1
+    return imported
+
+
+def reconcile_batch(after_id: int, batch_size: int = MEDIA_RECONCILE_BATCH_SIZE) -> Tuple[Optional[int], int]:
+    """
+    Check that the stored objects of one id batch exist and record the result
+    in ``missing_at``. Blocking; call from a thread.
+
+    Returns:
+        The last id of the batch (None when done) and how many assets changed state
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(MediaAsset.id, MediaAsset.url, MediaAsset.missing_at)
+            .filter(MediaAsset.id > after_id)
+            .order_by(MediaAsset.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return None, 0
+        db.rollback()  # don't hold a connection during storage lookups
+
+        now = datetime.now(timezone.utc)
+        went_missing, came_back = [], []
+        for asset_id, url, missing_at in rows:
+            key = media_storage.key_for_url(url)
+            if key is None:
+                continue  # not in our storage (external URL)
+            try:
+                exists = media_storage.object_size(key) is not None
+            except Exception as e:
+                logger.warning(f"Media reconciliation could not check {url}: {e}")
+                continue
+            if not exists and missing_at is None:
+                went_missing.append(asset_id)
+            elif exists and missing_at is not None:
+                came_back.append(asset_id)
+
+        if went_missing:
+            db.query(MediaAsset).filter(MediaAsset.id.in_(went_missing)).update(
+                {MediaAsset.missing_at: now}, synchronize_session=False
+            )
+            logger.warning(f"Media objects missing from storage: {went_missing}")
+        if came_back:
+            db.query(MediaAsset).filter(MediaAsset.id.in_(came_back)).update(
+                {MediaAsset.missing_at: None}, synchronize_session=False
+            )
+        db.commit()
+        return rows[-1].id, len(went_missing) + len(came_back)
+    finally:
+        db.close()
+
+
+class MediaReconciler:
+    """Periodically syncs ``MediaAsset.missing_at`` with the contents of media storage."""
+
+    def __init__(self, interval: float = MEDIA_RECONCILE_INTERVAL_SECONDS, media_dir: Optional[Path] = None):
+        self.interval = interval
+        self.media_dir = media_dir or get_media_dir()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Start the periodic job. Called on app startup."""
+        if self.interval <= 0 or self.running:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Media reconciliation started (every {self.interval:.0f}s)")
+
+    async def stop(self) -> None:
+        """Stop the periodic job. Called on app shutdown."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """
+        One full pass: import legacy order files, then check every asset.
+
+        Returns:
+            Number of assets whose missing state changed
+        """
+        if self.media_dir.exists():
+            imported = await media_storage.run(import_legacy_order_files, self.media_dir)
+            if imported:
+                logger.info(f"Imported {imported} legacy media order files")
+        changed = 0
+        after_id: Optional[int] = 0
+        while after_id is not None:
+            after_id, batch_changed = await media_storage.run(reconcile_batch, after_id)
+            changed += batch_changed
+        return changed
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Media reconciliation failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+media_reconciler = MediaReconciler()
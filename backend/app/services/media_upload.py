@@ -0,0 +1,126 @@
+"""Streaming, bounded-memory image uploads.
+
+The upload is copied in fixed-size chunks from the spooled request file to the
+media storage (local disk or an S3 multipart upload) on the storage thread
+pool, so memory per upload stays at one chunk (one part for S3) regardless of
+file size. The size limit is enforced while copying and the content type is
+sniffed from the first bytes instead of trusting the client's Content-Type header.
+"""
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from fastapi import UploadFile
+
+from app.services.storage import MediaStorage, media_storage
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 256 * 1024
+SNIFF_BYTES = 16
+
+
+class UploadRejected(ValueError):
+    """The upload is too large or is not an allowed image."""
+
+
+class UploadStorageError(RuntimeError):
+    """The upload could not be written to storage."""
+
+
+@dataclass
+class StoredUpload:
+    content_type: str
+    size_bytes: int
+    sha256: str
+    url: str
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Detect JPEG / PNG / WEBP from the leading magic bytes."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class _LimitedReader:
+    """Yields the source in chunks, enforcing the size limit and hashing as it goes."""
+
+    def __init__(self, src: BinaryIO, first: bytes, max_bytes: int):
+        self.src = src
+        self.first = first
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self._consumed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        # Single pass: the source can't be rewound, and size / digest must cover exactly one copy
+        if self._consumed:
+            raise RuntimeError("Upload source already consumed")
+        self._consumed = True
+        chunk = self.first
+        while chunk:
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise UploadRejected("File too large")
+            self.digest.update(chunk)
+            yield chunk
+            chunk = self.src.read(UPLOAD_CHUNK_BYTES)
+
+
+def _copy_upload(src: BinaryIO, max_bytes: int, allowed_types: Iterable[str], key: str, storage: MediaStorage) -> StoredUpload:
+    head = src.read(UPLOAD_CHUNK_BYTES)
+    content_type = sniff_image_type(head[:SNIFF_BYTES])
+    if content_type is None or content_type not in allowed_types:
+        raise UploadRejected("Invalid image content")
+
+    reader = _LimitedReader(src, head, max_bytes)
+    try:
+        storage.write_stream(key, content_type, reader)
+    except UploadRejected:
+        raise
+    except Exception as e:
+        raise UploadStorageError(str(e)) from e
+    return StoredUpload(
+        content_type=content_type,
+        size_bytes=reader.size,
+        sha256=reader.digest.hexdigest(),
+        url=storage.url_for(key),
+    )
+
+
+async def store_upload(
+    file: UploadFile,
+    key: str,
+    max_bytes: int,
+    allowed_types: Iterable[str],
+    storage: MediaStorage = media_storage,
+) -> StoredUpload:
+    """
+    Stream an uploaded image to media storage.
+
+    Args:
+        file: The uploaded file
+        key: Destination object key ("media/...")
+        max_bytes: Size limit, enforced while copying
+        allowed_types: Allowed sniffed MIME types
+        storage: Media storage to write to
+
+    Returns:
+        The sniffed content type, stored size, SHA-256 of the content and object URL
+
+    Raises:
+        UploadRejected: The file is too large or not an allowed image
+        UploadStorageError: Writing to storage failed
+    """
+    # Cheap early reject when the multipart parser already knows the size
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejected("File too large")
+    await file.seek(0)
+    return await storage.run(_copy_upload, file.file, max_bytes, set(allowed_types), key, storage)
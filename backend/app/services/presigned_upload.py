@@ -0,0 +1,130 @@
+"""Direct-to-storage uploads with presigned URLs.
+
+The client asks for an upload ticket, PUTs the file straight to storage and then
+calls finalize, which checks the stored object's size and magic bytes and hashes
+it before the MediaAsset row is created, deduplicating it like a regular upload. On S3 the ticket is a presigned PUT URL; with local
+storage an HMAC-signed URL pointing at the API's own upload endpoint stands in
+for it, so the same flow works (and can be tested) offline.
+"""
+import hashlib
+import hmac
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict
+from urllib.parse import urlencode
+
+from app.services.media_upload import SNIFF_BYTES, UploadRejected, sniff_image_type
+from app.services.storage import MediaStorage
+
+logger = logging.getLogger(__name__)
+
+PRESIGNED_UPLOAD_EXPIRES_SECONDS = 900
+MIME_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+
+
+@dataclass
+class UploadTicket:
+    key: str
+    upload_url: str
+    method: str
+    headers: Dict[str, str]
+    expires_at: int
+
+
+@dataclass
+class StoredObject:
+    size_bytes: int
+    head: bytes
+    sha256: str
+
+
+def upload_key(user_id: int, content_type: str) -> str:
+    """Per-user key, so finalize can check the caller owns the object."""
+    return f"media/uploads/{user_id}/{uuid.uuid4()}.{MIME_EXTENSIONS[content_type]}"
+
+
+def key_belongs_to(key: str, user_id: int) -> bool:
+    return key.startswith(f"media/uploads/{user_id}/") and ".." not in key
+
+
+class S3UploadSigner:
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    def presign(self, key: str, content_type: str, size_bytes: int) -> UploadTicket:
+        # Content-Type and Content-Length are signed: S3 rejects a PUT that differs
+        upload_url = self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type, "ContentLength": size_bytes},
+            ExpiresIn=PRESIGNED_UPLOAD_EXPIRES_SECONDS,
+        )
+        return UploadTicket(
+            key=key,
+            upload_url=upload_url,
+            method="PUT",
+            headers={"Content-Type": content_type},
+            expires_at=int(time.time()) + PRESIGNED_UPLOAD_EXPIRES_SECONDS,
+        )
+
+
+class LocalUploadSigner:
+    """Stand-in for S3 presigning with local storage; uploads go to PUT /api/media/direct/{key}."""
+
+    def __init__(self, secret: str, upload_path: str = "/api/media/direct"):
+        self.secret = secret.encode("utf-8")
+        self.upload_path = upload_path
+
+    def _signature(self, key: str, content_type: str, size_bytes: int, expires: int) -> str:
+        message = f"{key}\n{content_type}\n{size_bytes}\n{expires}".encode("utf-8")
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def presign(self, key: str, content_type: str, size_bytes: int) -> UploadTicket:
+        expires = int(time.time()) + PRESIGNED_UPLOAD_EXPIRES_SECONDS
+        query = urlencode({
+            "content_type": content_type,
+            "size": size_bytes,
+            "expires": expires,
+            "signature": self._signature(key, content_type, size_bytes, expires),
+        })
+        return UploadTicket(
+            key=key,
+            upload_url=f"{self.upload_path}/{key}?{query}",
+            method="PUT",
+            headers={"Content-Type": content_type},
+            expires_at=expires,
+        )
+
+    def verify(self, key: str, content_type: str, size_bytes: int, expires: int, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(key, content_type, size_bytes, expires), signature)
+
+
+def verify_stored_upload(storage: MediaStorage, key: str, max_bytes: int, allowed_types) -> StoredObject:
+    """
+    Check an uploaded object before it is registered. Rejected objects are deleted.
+
+    Returns:
+        The stored object
+
+    Raises:
+        UploadRejected: The object is missing, too large or not an allowed image
+    """
+    size_bytes = storage.object_size(key)
+    if size_bytes is None:
+        raise UploadRejected("Upload not found")
+    if size_bytes > max_bytes:
+        storage.delete_object(key)
+        raise UploadRejected("File too large")
+    # Read whole (at most max_bytes) to hash it for deduplication as well as sniff it
+    data = storage.get_object(key)
+    if data is None:
+        raise UploadRejected("Upload not found")
+    head = data[:SNIFF_BYTES]
+    if sniff_image_type(head) not in allowed_types:
+        storage.delete_object(key)
+        raise UploadRejected("Invalid image content")
+    return StoredObject(size_bytes=len(data), head=head, sha256=hashlib.sha256(data).hexdigest())
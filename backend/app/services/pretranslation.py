@@ -0,0 +1,198 @@
+"""Background pre-translation of posts into every supported language.
+
+New and edited posts are queued per target language so the first reader in
+that language gets a cache hit instead of waiting on the LLM. Jobs for
+languages with more readers (users.preferred_lang) run first; a bounded pool
+of worker tasks drains the queue and retries transient failures with
+exponential backoff.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.services.translation_providers.base import PERMANENT_ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+PRETRANSLATION_WORKERS = int(os.getenv("PRETRANSLATION_WORKERS", "2"))
+PRETRANSLATION_QUEUE_SIZE = int(os.getenv("PRETRANSLATION_QUEUE_SIZE", "1000"))
+PRETRANSLATION_MAX_ATTEMPTS = int(os.getenv("PRETRANSLATION_MAX_ATTEMPTS", "4"))
+PRETRANSLATION_BACKOFF_SECONDS = float(os.getenv("PRETRANSLATION_BACKOFF_SECONDS", "5"))
+AUDIENCE_REFRESH_SECONDS = 600
+# Someone is waiting for these: run them before audience-ranked jobs
+VIEWER_REQUEST_PRIORITY = -(10 ** 9)
+
+
+@dataclass(order=True)
+class PreTranslationJob:
+    priority: int
+    seq: int
+    post_id: int = field(compare=False)
+    lang: str = field(compare=False)
+    attempt: int = field(default=1, compare=False)
+
+
+class PreTranslationQueue:
+    """Priority queue of (post, language) jobs drained by a bounded worker pool."""
+
+    def __init__(self, workers: int = PRETRANSLATION_WORKERS, maxsize: int = PRETRANSLATION_QUEUE_SIZE):
+        self.workers = workers
+        self._maxsize = maxsize
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._retry_handles: set = set()
+        self._queued: Set[Tuple[int, str]] = set()
+        self._seq = itertools.count()
+        self._audience: Dict[str, int] = {}
+        self._audience_loaded_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._worker_tasks)
+
+    async def start(self) -> None:
+        """Start the worker pool. Called on app startup."""
+        if self.workers <= 0 or self.running:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self._maxsize)
+        self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Pre-translation started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Stop the worker pool. Queued jobs are dropped. Called on app shutdown."""
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        self._queued.clear()
+
+    def enqueue_post(self, post_id: int, original_lang: Optional[str]) -> int:
+        """
+        Queue translations of a post into every supported language but its own.
+
+        Must be called from the event loop. A no-op when the workers are not
+        running or no real translation provider is configured.
+
+        Returns:
+            Number of jobs queued
+        """
+        from app.services.translation import SUPPORTED_LANGUAGES, get_translation_provider
+        from app.services.translation_providers.dummy_provider import DummyTranslationProvider
+
+        if not self.running:
+            return 0
+        if get_translation_provider().provider_name == DummyTranslationProvider.provider_name:
+            return 0
+
+        audience = self._get_audience()
+        queued = 0
+        for lang in SUPPORTED_LANGUAGES:
+            if lang == original_lang:
+                continue
+            job = PreTranslationJob(priority=-audience.get(lang, 0), seq=next(self._seq), post_id=post_id, lang=lang)
+            if self._put(job):
+                queued += 1
+        return queued
+
+    def enqueue_translation(self, post_id: int, lang: str) -> bool:
+        """
+        Queue one (post, language) translation a reader is waiting for, ahead of
+        audience-ranked jobs. Already queued pairs are not queued twice.
+
+        Returns:
+            Whether a job was queued
+        """
+        from app.services.translation import get_translation_provider
+        from app.services.translation_providers.dummy_provider import DummyTranslationProvider
+
+        if not self.running:
+            return False
+        if get_translation_provider().provider_name == DummyTranslationProvider.provider_name:
+            return False
+        return self._put(PreTranslationJob(priority=VIEWER_REQUEST_PRIORITY, seq=next(self._seq), post_id=post_id, lang=lang))
+
+    def _put(self, job: PreTranslationJob) -> bool:
+        if self._queue is None or (job.post_id, job.lang) in self._queued:
+            return False
+        try:
+            self._queue.put_nowait(job)
+            self._queued.add((job.post_id, job.lang))
+            return True
+        except asyncio.QueueFull:
+            # Readers still get an on-demand translation, just slower
+            logger.warning(f"Pre-translation queue full, dropping post {job.post_id} ({job.lang})")
+            return False
+
+    def _get_audience(self) -> Dict[str, int]:
+        """Number of users per preferred language, refreshed periodically."""
+        now = time.monotonic()
+        if self._audience and now - self._audience_loaded_at < AUDIENCE_REFRESH_SECONDS:
+            return self._audience
+
+        from app.models import User
+
+        db = SessionLocal()
+        try:
+            rows = db.query(User.preferred_lang, func.count(User.id)).group_by(User.preferred_lang).all()
+            self._audience = {lang: count for lang, count in rows if lang}
+        except Exception as e:
+            logger.warning(f"Failed to load language audience, keeping previous priorities: {e}")
+        finally:
+            db.close()
+        self._audience_loaded_at = now
+        return self._audience
+
+    async def _worker(self, index: int) -> None:
+        from app.services.translation import pretranslate_post
+
+        while True:
+            job = await self._queue.get()
+            # Allow re-queueing (e.g. after an edit) as soon as the job starts
+            self._queued.discard((job.post_id, job.lang))
+            try:
+                error_code = await pretranslate_post(job.post_id, job.lang)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error_code = f"exception:{type(e).__name__}"
+                logger.error(f"Pre-translation of post {job.post_id} to {job.lang} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+            if error_code is None:
+                continue
+            if error_code in PERMANENT_ERROR_CODES or job.attempt >= PRETRANSLATION_MAX_ATTEMPTS:
+                logger.warning(
+                    f"Giving up pre-translation of post {job.post_id} to {job.lang} "
+                    f"after {job.attempt} attempts: {error_code}"
+                )
+                continue
+            self._schedule_retry(job)
+
+    def _schedule_retry(self, job: PreTranslationJob) -> None:
+        delay = PRETRANSLATION_BACKOFF_SECONDS * (2 ** (job.attempt - 1))
+        retry = PreTranslationJob(
+            priority=job.priority, seq=next(self._seq), post_id=job.post_id, lang=job.lang, attempt=job.attempt + 1
+        )
+
+        def _requeue():
+            self._retry_handles.discard(handle)
+            self._put(retry)
+
+        handle = asyncio.get_running_loop().call_later(delay, _requeue)
+        self._retry_handles.add(handle)
+        logger.info(f"Retrying pre-translation of post {job.post_id} to {job.lang} in {delay:.0f}s")
+
+
+pretranslation_queue = PreTranslationQueue()
@@ -0,0 +1,208 @@
+"""Realtime fan-out of salon room messages to WebSocket subscribers.
+
+On PostgreSQL every published message goes through pg_notify, so each worker
+process receives it on its own LISTEN connection and forwards it to the
+subscribers connected to that worker. On SQLite (local development) messages
+are dispatched in-process only.
+
+Leaving a room is relayed the same way, but not through the message queue
+(which drops its oldest entry for slow consumers): it sets the ``left`` event of
+that user's subscriptions, so their connections recheck membership at once
+instead of waiting for the next periodic check.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.database import DATABASE_URL, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "salon_messages"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD_BYTES = 7900
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTEN_RETRY_SECONDS = 5
+
+
+class Subscription:
+    """One connection's subscription to a room: its message queue and a leave signal."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the user leaves the room; never evicted like queued messages
+        self.left = asyncio.Event()
+
+
+class SalonBroker:
+    """Keeps per-room subscriber queues and relays published messages to them."""
+
+    def __init__(self, database_url: str):
+        self.use_pg_notify = database_url.startswith("postgres")
+        self._dsn = (
+            make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+            if self.use_pg_notify else None
+        )
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start the LISTEN loop (PostgreSQL only). Called on app startup."""
+        self._loop = asyncio.get_running_loop()
+        if self.use_pg_notify and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stop the LISTEN loop. Called on app shutdown."""
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    def subscribe(self, room_id: int, user_id: int) -> Subscription:
+        """Register a user's subscription to a room. Must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id)
+        self._subscribers[room_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, room_id: int, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(room_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[room_id]
+
+    def publish(self, db: Session, room_id: int, message: dict) -> None:
+        """
+        Publish a rendered message to all subscribers of a room.
+
+        Safe to call from sync request handlers running in the threadpool.
+
+        Args:
+            db: Database session used to issue pg_notify
+            room_id: Salon room id
+            message: Rendered, JSON-encodable message dict
+        """
+        if not self.use_pg_notify:
+            self._dispatch_threadsafe(self._dispatch, room_id, message)
+            return
+
+        payload = json.dumps({"room_id": room_id, "message": message}, ensure_ascii=False)
+        if len(payload.encode("utf-8")) > MAX_NOTIFY_PAYLOAD_BYTES:
+            # Too large for NOTIFY: listeners re-render it from the database
+            payload = json.dumps({"room_id": room_id, "message_id": message["id"]})
+        self._notify(db, payload, f"salon message {message.get('id')}")
+
+    def publish_leave(self, db: Session, room_id: int, user_id: int) -> None:
+        """
+        Signal the subscriptions of a participant who left a room. Call after committing.
+
+        Args:
+            db: Database session used to issue pg_notify
+            room_id: Salon room id
+            user_id: The participant who left
+        """
+        if not self.use_pg_notify:
+            self._dispatch_threadsafe(self._dispatch_leave, room_id, user_id)
+            return
+        payload = json.dumps({"room_id": room_id, "left_user_id": user_id})
+        self._notify(db, payload, f"leave of user {user_id} from salon room {room_id}")
+
+    def _notify(self, db: Session, payload: str, what: str) -> None:
+        try:
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to publish {what}: {e}")
+
+    def _dispatch_threadsafe(self, dispatch: Callable[[int, object], None], room_id: int, item) -> None:
+        if self._loop is None or room_id not in self._subscribers:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            dispatch(room_id, item)
+        else:
+            self._loop.call_soon_threadsafe(dispatch, room_id, item)
+
+    def _dispatch(self, room_id: int, message: dict) -> None:
+        for subscription in list(self._subscribers.get(room_id, ())):
+            queue = subscription.queue
+            if queue.full():
+                # Slow consumer: drop its oldest pending message
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def _dispatch_leave(self, room_id: int, user_id: int) -> None:
+        for subscription in list(self._subscribers.get(room_id, ())):
+            if subscription.user_id == user_id:
+                subscription.left.set()
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self._dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    logger.info(f"Listening for salon messages on '{NOTIFY_CHANNEL}'")
+                    async for notify in conn.notifies():
+                        await self._handle_notify(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Salon LISTEN connection failed, retrying in {LISTEN_RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+
+    async def _handle_notify(self, raw_payload: str) -> None:
+        try:
+            data = json.loads(raw_payload)
+            room_id = int(data["room_id"])
+            left_user_id = int(data["left_user_id"]) if "left_user_id" in data else None
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed salon notification: {raw_payload[:200]}")
+            return
+
+        if room_id not in self._subscribers:
+            return
+
+        if left_user_id is not None:
+            self._dispatch_leave(room_id, left_user_id)
+            return
+
+        message = data.get("message")
+        if message is None:
+            message = await asyncio.to_thread(_load_rendered_message, int(data["message_id"]))
+        if message is not None:
+            self._dispatch(room_id, message)
+
+
+def _load_rendered_message(message_id: int) -> Optional[dict]:
+    from fastapi.encoders import jsonable_encoder
+    from app.routers.salon import render_message_by_id
+
+    db = SessionLocal()
+    try:
+        message = render_message_by_id(db, message_id)
+        return jsonable_encoder(message) if message is not None else None
+    finally:
+        db.close()
+
+
+broker = SalonBroker(DATABASE_URL)
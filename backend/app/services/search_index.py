@@ -0,0 +1,301 @@
+"""Unified search index behind /api/search.
+
+Every searchable row (posts, blog articles, salon rooms, courses, flea market
+items, donation projects) is mirrored into one ``search_documents`` row with a
+title, plain-text body and visibility. Routers call ``sync_search_document``
+after writes and ``delete_search_document`` in the transaction of a delete;
+documents that are no longer visible (drafts, private posts, sold items, closed
+rooms) are removed from the index. ``rebuild_search_index`` (scripts/rebuild_search_index.py)
+recreates it from the source tables.
+
+Full-text matching and ranking over the index reuse app.services.listing_search
+(tsvector + pg_trgm on Postgres, FTS5 trigram on SQLite), so a search is a
+single query over one table.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, and_, cast, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.listing_search import apply_keyword_search, keyword_terms
+
+logger = logging.getLogger(__name__)
+
+DOC_POST = "post"
+DOC_BLOG = "blog"
+DOC_SALON_ROOM = "salon_room"
+DOC_COURSE = "course"
+DOC_FLEA_MARKET_ITEM = "flea_market_item"
+DOC_DONATION_PROJECT = "donation_project"
+
+VISIBILITY_PUBLIC = "public"
+VISIBILITY_MEMBERS = "members"
+
+SNIPPET_CHARS = 120
+MAX_BODY_CHARS = 20000
+REBUILD_BATCH_SIZE = 500
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class IndexedDocument:
+    title: Optional[str]
+    body: str
+    visibility: str = VISIBILITY_PUBLIC
+    slug: Optional[str] = None
+
+
+def plain_text(*parts: Optional[str]) -> str:
+    """Join text fields, dropping HTML tags and collapsing whitespace."""
+    text = " ".join(p for p in parts if p)
+    return _SPACE_RE.sub(" ", _TAG_RE.sub(" ", text)).strip()[:MAX_BODY_CHARS]
+
+
+# ── source row -> document (None = not searchable) ──
+
+def _post_document(post: models.Post) -> Optional[IndexedDocument]:
+    if post.status != "published" or post.visibility not in ("public", "members"):
+        return None
+    return IndexedDocument(
+        title=post.title,
+        body=plain_text(post.body, post.excerpt),
+        visibility=VISIBILITY_PUBLIC if post.visibility == "public" else VISIBILITY_MEMBERS,
+        slug=post.slug,
+    )
+
+
+def _blog_document(blog: models.BlogPost) -> Optional[IndexedDocument]:
+    if blog.status != "published":
+        return None
+    return IndexedDocument(title=blog.title, body=plain_text(blog.excerpt, blog.body), slug=blog.slug)
+
+
+def _salon_room_document(room: models.SalonRoom) -> Optional[IndexedDocument]:
+    if not room.is_active:
+        return None
+    return IndexedDocument(title=room.theme, body=plain_text(room.description))
+
+
+def _course_document(course: models.Course) -> Optional[IndexedDocument]:
+    if not course.published:
+        return None
+    return IndexedDocument(title=course.title, body=plain_text(course.description, course.instructor_profile))
+
+
+def _flea_market_item_document(item: models.FleaMarketItem) -> Optional[IndexedDocument]:
+    if item.status not in ("active", "reserved"):
+        return None
+    return IndexedDocument(title=item.title, body=plain_text(item.description, item.region))
+
+
+def _donation_project_document(project: models.DonationProject) -> Optional[IndexedDocument]:
+    return IndexedDocument(title=project.title, body=plain_text(project.description))
+
+
+# model -> (doc_type, document builder)
+INDEXED_MODELS: Dict[type, Tuple[str, Callable]] = {
+    models.Post: (DOC_POST, _post_document),
+    models.BlogPost: (DOC_BLOG, _blog_document),
+    models.SalonRoom: (DOC_SALON_ROOM, _salon_room_document),
+    models.Course: (DOC_COURSE, _course_document),
+    models.FleaMarketItem: (DOC_FLEA_MARKET_ITEM, _flea_market_item_document),
+    models.DonationProject: (DOC_DONATION_PROJECT, _donation_project_document),
+}
+DOC_TYPES = tuple(doc_type for doc_type, _ in INDEXED_MODELS.values())
+
+
+def _upsert(db: Session, doc_type: str, obj, document: IndexedDocument) -> None:
+    doc_id = str(obj.id)
+    row = (
+        db.query(models.SearchDocument)
+        .filter(models.SearchDocument.doc_type == doc_type, models.SearchDocument.doc_id == doc_id)
+        .first()
+    )
+    if row is None:
+        row = models.SearchDocument(doc_type=doc_type, doc_id=doc_id)
+        db.add(row)
+    row.title = document.title
+    row.body = document.body
+    row.slug = document.slug
+    row.visibility = document.visibility
+    row.created_at = obj.created_at
+
+
+def _remove(db: Session, doc_type: str, doc_id) -> None:
+    db.query(models.SearchDocument).filter(
+        models.SearchDocument.doc_type == doc_type, models.SearchDocument.doc_id == str(doc_id)
+    ).delete(synchronize_session=False)
+
+
+def sync_search_document(db: Session, obj) -> None:
+    """
+    Index (or un-index) a row after it was written, and commit. Failures are
+    logged, not raised: the write itself has already succeeded and a rebuild
+    repairs the index.
+    """
+    doc_type, build = INDEXED_MODELS[type(obj)]
+    try:
+        document = build(obj)
+        if document is None:
+            _remove(db, doc_type, obj.id)
+        else:
+            _upsert(db, doc_type, obj, document)
+        db.commit()
+    except IntegrityError:
+        # Indexed concurrently by another request; its copy is equally fresh
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to index {doc_type} {getattr(obj, 'id', None)}: {e}")
+
+
+def delete_search_document(db: Session, model: type, doc_id) -> None:
+    """Drop a row that is being deleted from the index. The caller commits, with the delete."""
+    doc_type, _ = INDEXED_MODELS[model]
+    _remove(db, doc_type, doc_id)
+
+
+def rebuild_search_index(db: Session, doc_types: Optional[Iterable[str]] = None, batch_size: int = REBUILD_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Recreate the index for the given document types (default: all) from the
+    source tables, in batches.
+
+    Returns:
+        doc_type -> number of documents indexed
+    """
+    wanted = set(doc_types or DOC_TYPES)
+    counts = {}
+    for model, (doc_type, build) in INDEXED_MODELS.items():
+        if doc_type not in wanted:
+            continue
+        # Delete and re-insert in one transaction so searches never see a half-built type
+        db.query(models.SearchDocument).filter(models.SearchDocument.doc_type == doc_type).delete(synchronize_session=False)
+        indexed = 0
+        for obj in db.query(model).yield_per(batch_size):
+            document = build(obj)
+            if document is None:
+                continue
+            db.add(models.SearchDocument(
+                doc_type=doc_type,
+                doc_id=str(obj.id),
+                title=document.title,
+                body=document.body,
+                slug=document.slug,
+                visibility=document.visibility,
+                created_at=obj.created_at,
+            ))
+            indexed += 1
+            if indexed % batch_size == 0:
+                db.flush()
+        db.commit()
+        counts[doc_type] = indexed
+    return counts
+
+
+# ── querying ──
+
+class InvalidSearchCursor(ValueError):
+    """The pagination cursor is malformed."""
+
+
+def make_snippet(body: Optional[str], terms: List[str], length: int = SNIPPET_CHARS) -> str:
+    """A window of the body around the first matching term (the start if none match)."""
+    body = body or ""
+    lowered = body.lower()
+    positions = [p for p in (lowered.find(t.lower()) for t in terms) if p >= 0]
+    start = max(0, min(positions) - length // 3) if positions else 0
+    snippet = body[start:start + length]
+    if start > 0:
+        snippet = "…" + snippet
+    if start + length < len(body):
+        snippet += "…"
+    return snippet
+
+
+def _encode_cursor(score: float, doc_pk: int) -> str:
+    return f"{score!r}:{doc_pk}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, doc_pk = cursor.rsplit(":", 1)
+        return float(score), int(doc_pk)
+    except ValueError:
+        raise InvalidSearchCursor("Invalid cursor")
+
+
+def search_documents(
+    db: Session,
+    q: str,
+    include_members: bool = False,
+    doc_types: Optional[Iterable[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Ranked hits across all content types in one query.
+
+    Args:
+        db: Database session
+        q: Search box value; every term must match
+        include_members: Also return members-only documents (logged-in users)
+        doc_types: Restrict to these document types
+        cursor: next_cursor of the previous page
+        limit: Page size
+
+    Returns:
+        The hits (type, id, title, snippet, slug, score, created_at) and the
+        cursor of the next page (None on the last page)
+
+    Raises:
+        InvalidSearchCursor: The cursor is malformed
+    """
+    SearchDocument = models.SearchDocument
+    query = db.query(SearchDocument)
+    if not include_members:
+        query = query.filter(SearchDocument.visibility == VISIBILITY_PUBLIC)
+    if doc_types:
+        query = query.filter(SearchDocument.doc_type.in_(list(doc_types)))
+    query, rank = apply_keyword_search(db, query, SearchDocument, q)
+    if rank is None:
+        # Only short terms (LIKE fallback): most recently indexed first, keyed on a constant score
+        rank = cast(0, Float)
+    else:
+        rank = cast(rank, Float)
+    if cursor:
+        score, doc_pk = _decode_cursor(cursor)
+        query = query.filter(or_(rank < score, and_(rank == score, SearchDocument.id < doc_pk)))
+
+    rows = (
+        query.add_columns(rank.label("score"))
+        .order_by(rank.desc(), SearchDocument.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_doc, last_score = rows[-1]
+        next_cursor = _encode_cursor(last_score, last_doc.id)
+
+    terms = keyword_terms(q)
+    hits = [
+        {
+            "type": doc.doc_type,
+            "id": doc.doc_id,
+            "title": doc.title,
+            "snippet": make_snippet(doc.body, terms),
+            "slug": doc.slug,
+            "score": score,
+            "created_at": doc.created_at,
+        }
+        for doc, score in rows
+    ]
+    return hits, next_cursor
@@ -0,0 +1,20 @@
+"""Seller name / avatar lookups for marketplace listings."""
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Profile, User
+
+
+def seller_summaries(db: Session, user_ids: Iterable[int]) -> Dict[int, Tuple[Optional[str], Optional[str]]]:
+    """(display_name, avatar_url) per user id, in one query. Unknown ids are absent."""
+    user_ids = {i for i in user_ids if i is not None}
+    if not user_ids:
+        return {}
+    rows = (
+        db.query(User.id, User.display_name, Profile.avatar_url)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .filter(User.id.in_(user_ids))
+        .all()
+    )
+    return {user_id: (display_name, avatar_url) for user_id, display_name, avatar_url in rows}
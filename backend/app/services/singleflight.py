@@ -0,0 +1,27 @@
+"""In-process single-flight: concurrent callers with the same key share one call."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async work by key.
+
+    The first caller for a key starts the work as a task; callers arriving while
+    it is running await the same task. The work is shielded, so a caller being
+    cancelled (e.g. a client disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
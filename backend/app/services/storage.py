@@ -0,0 +1,527 @@
+"""Object storage for uploaded media behind one interface.
+
+Two backends implement the same blocking operations: S3 (a pooled boto3 client)
+and the local filesystem (MEDIA_DIR, served at /media), which also serves as the
+offline stand-in for tests. ``MediaStorage`` wraps the configured backend with
+retries (exponential backoff with full jitter), per-operation latency metrics,
+and async variants that run on a bounded thread pool so request handlers never
+block the event loop on a storage round trip. Object URLs are built and parsed
+here only.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+S3_BUCKET = os.getenv("AWS_S3_BUCKET", "rainbow-community-media-prod")
+S3_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
+USE_S3 = os.getenv("USE_S3", "true").lower() == "true"
+S3_URL_PREFIX = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/"
+
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", "32"))
+STORAGE_IO_THREADS = int(os.getenv("STORAGE_IO_THREADS", "16"))
+STORAGE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STORAGE_CONNECT_TIMEOUT_SECONDS", "5"))
+STORAGE_READ_TIMEOUT_SECONDS = float(os.getenv("STORAGE_READ_TIMEOUT_SECONDS", "30"))
+STORAGE_MAX_ATTEMPTS = int(os.getenv("STORAGE_MAX_ATTEMPTS", "3"))
+STORAGE_BACKOFF_BASE_SECONDS = float(os.getenv("STORAGE_BACKOFF_BASE_SECONDS", "0.2"))
+STORAGE_BACKOFF_MAX_SECONDS = float(os.getenv("STORAGE_BACKOFF_MAX_SECONDS", "2"))
+
+# S3 error codes worth another attempt; everything else (NoSuchKey, AccessDenied, ...) fails fast
+RETRYABLE_S3_ERROR_CODES = {
+    "InternalError", "ServiceUnavailable", "SlowDown", "RequestTimeout", "RequestTimeTooSkewed", "Throttling",
+}
+
+
+def get_media_dir() -> Path:
+    media_base = os.getenv("MEDIA_DIR")
+    if not media_base:
+        media_base = "/data/media" if os.path.exists("/data") else "media"
+    return Path(media_base)
+
+
+def s3_url_for_key(key: str) -> str:
+    return S3_URL_PREFIX + key.lstrip("/")
+
+
+class StorageError(RuntimeError):
+    """A storage operation failed (after retries, for transient failures)."""
+
+
+@dataclass
+class ObjectInfo:
+    key: str
+    size: int
+    last_modified: datetime
+
+
+class StorageBackend(ABC):
+    """Blocking object operations on keys like "media/<name>"."""
+
+    name = "base"
+
+    @abstractmethod
+    def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+        pass
+
+    @abstractmethod
+    def get_object(self, key: str, length: Optional[int] = None) -> Optional[bytes]:
+        """Object bytes (the first `length` bytes if given), or None if missing."""
+        pass
+
+    @abstractmethod
+    def object_size(self, key: str) -> Optional[int]:
+        """Size in bytes, or None if missing."""
+        pass
+
+    @abstractmethod
+    def delete_objects(self, keys: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        """Every object whose key starts with `prefix`, streamed page by page."""
+        pass
+
+    @abstractmethod
+    def open_writer(self, key: str, content_type: str):
+        """A streaming writer with write(chunk) / commit() / abort()."""
+        pass
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        pass
+
+    @abstractmethod
+    def key_for_url(self, url: Optional[str]) -> Optional[str]:
+        """Key of an object URL produced by this backend, or None for foreign URLs."""
+        pass
+
+    def is_retryable(self, error: Exception) -> bool:
+        return False
+
+
+class LocalFileWriter:
+    """Writes to a temporary file renamed into place only once the upload is complete."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp_path = path.with_name(path.name + ".part")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+
+    def commit(self) -> None:
+        self._fh.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._fh.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files under media_dir, served by the app at /media. Also the offline/test stand-in."""
+
+    name = "local"
+
+    def __init__(self, media_dir: Path):
+        self.media_dir = Path(media_dir)
+
+    def path_for(self, key: str) -> Path:
+        relative = key.split("/", 1)[1] if key.startswith("media/") else key
+        path = (self.media_dir / relative).resolve()
+        if not path.is_relative_to(self.media_dir.resolve()):
+            raise ValueError(f"Key escapes the media directory: {key}")
+        return path
+
+    def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+        writer = self.open_writer(key, content_type)
+        try:
+            writer.write(data)
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def get_object(self, key: str, length: Optional[int] = None) -> Optional[bytes]:
+        try:
+            with open(self.path_for(key), "rb") as fh:
+                return fh.read(length) if length is not None else fh.read()
+        except FileNotFoundError:
+            return None
+
+    def object_size(self, key: str) -> Optional[int]:
+        try:
+            return self.path_for(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete_objects(self, keys: List[str]) -> None:
+        for key in keys:
+            self.path_for(key).unlink(missing_ok=True)
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        root = self.media_dir.resolve()
+        if not root.exists():
+            return
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                key = "media/" + path.relative_to(root).as_posix()
+                if not key.startswith(prefix):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                yield ObjectInfo(key, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc))
+
+    def open_writer(self, key: str, content_type: str) -> LocalFileWriter:
+        return LocalFileWriter(self.path_for(key))
+
+    def url_for(self, key: str) -> str:
+        return "/" + key.lstrip("/")
+
+    def key_for_url(self, url: Optional[str]) -> Optional[str]:
+        if url and url.startswith("/media/"):
+            return url[1:]
+        return None
+
+
+class S3MultipartWriter:
+    """
+    Buffers one part at a time. Uploads that fit in a single part go out as one
+    put_object; larger ones use a multipart upload that is aborted on failure.
+    """
+
+    def __init__(self, client, bucket: str, key: str, content_type: str, part_bytes: int):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_bytes = part_bytes
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    def write(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        if len(self._buffer) >= self.part_bytes:
+            self._flush_part()
+
+    def _flush_part(self) -> None:
+        if self._upload_id is None:
+            response = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )
+            self._upload_id = response["UploadId"]
+        part_number = len(self._parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer.clear()
+
+    def commit(self) -> None:
+        if self._upload_id is None:
+            self.client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type
+            )
+            self._buffer.clear()
+            return
+        if self._buffer:
+            self._flush_part()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    def abort(self) -> None:
+        from botocore.exceptions import ClientError
+
+        self._buffer.clear()
+        if self._upload_id is None:
+            return
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        except ClientError as e:
+            logger.warning(f"Failed to abort multipart upload of {self.key}: {e}")
+
+
+class S3StorageBackend(StorageBackend):
+    """S3 through one shared boto3 client with a pooled connection set."""
+
+    name = "s3"
+    # S3 requires every part but the last to be at least 5 MiB
+    multipart_part_bytes = max(int(os.getenv("S3_MULTIPART_PART_MB", "8")), 5) * 1024 * 1024
+
+    def __init__(self, bucket: str = S3_BUCKET, region: str = S3_REGION, client=None):
+        self.bucket = bucket
+        self.region = region
+        self.url_prefix = f"https://{bucket}.s3.{region}.amazonaws.com/"
+        self.client = client or self._build_client()
+
+    def _build_client(self):
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "s3",
+            region_name=self.region,
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            config=Config(
+                max_pool_connections=STORAGE_MAX_CONNECTIONS,
+                connect_timeout=STORAGE_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=STORAGE_READ_TIMEOUT_SECONDS,
+                # Retries (with jitter) are done by MediaStorage so they show up in its metrics
+                retries={"total_max_attempts": 1},
+            ),
+        )
+
+    def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+        extra = {"CacheControl": cache_control} if cache_control else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type, **extra)
+
+    def get_object(self, key: str, length: Optional[int] = None) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+
+        extra = {"Range": f"bytes=0-{length - 1}"} if length else {}
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key, **extra)["Body"].read()
+        except ClientError as e:
+            if _s3_error_code(e) in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def object_size(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if _s3_error_code(e) in ("NoSuchKey", "404", "NotFound"):
+                return None
+            raise
+
+    def delete_objects(self, keys: List[str]) -> None:
+        # delete_objects takes at most 1000 keys per request
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            response = self.client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            )
+            errors = response.get("Errors") or []
+            if errors:
+                raise StorageError(f"Failed to delete {len(errors)} objects, e.g. {errors[0].get('Key')}: {errors[0].get('Code')}")
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents") or []:
+                yield ObjectInfo(item["Key"], item["Size"], item["LastModified"])
+
+    def open_writer(self, key: str, content_type: str) -> S3MultipartWriter:
+        return S3MultipartWriter(self.client, self.bucket, key, content_type, self.multipart_part_bytes)
+
+    def url_for(self, key: str) -> str:
+        return self.url_prefix + key.lstrip("/")
+
+    def key_for_url(self, url: Optional[str]) -> Optional[str]:
+        if url and url.startswith(self.url_prefix):
+            return url[len(self.url_prefix):]
+        return None
+
+    def is_retryable(self, error: Exception) -> bool:
+        from botocore.exceptions import ClientError, ConnectionClosedError, EndpointConnectionError, ReadTimeoutError
+
+        if isinstance(error, (ConnectionClosedError, EndpointConnectionError, ReadTimeoutError)):
+            return True
+        if isinstance(error, ClientError):
+            code = _s3_error_code(error)
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+            return code in RETRYABLE_S3_ERROR_CODES or status >= 500
+        return False
+
+
+def _s3_error_code(error) -> str:
+    return str(error.response.get("Error", {}).get("Code", ""))
+
+
+class _OperationStats:
+    __slots__ = ("calls", "errors", "retries", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class MediaStorage:
+    """The configured backend plus retries, latency metrics and off-loop async variants."""
+
+    def __init__(self, backend: StorageBackend, io_threads: int = STORAGE_IO_THREADS):
+        self.backend = backend
+        self._io_threads = io_threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stats: Dict[str, _OperationStats] = {}
+        self._stats_lock = threading.Lock()
+
+    # ── blocking API (call from threads / sync endpoints) ──
+
+    def _call(self, operation: str, fn: Callable[[], T], retry: bool = True) -> T:
+        attempt = 1
+        started = time.monotonic()
+        while True:
+            try:
+                result = fn()
+                self._record(operation, time.monotonic() - started, attempt, failed=False)
+                return result
+            except Exception as e:
+                if not retry or attempt >= STORAGE_MAX_ATTEMPTS or not self.backend.is_retryable(e):
+                    self._record(operation, time.monotonic() - started, attempt, failed=True)
+                    raise
+                # Full jitter: sleep a random time up to the exponential backoff cap
+                delay = random.uniform(0, min(STORAGE_BACKOFF_MAX_SECONDS, STORAGE_BACKOFF_BASE_SECONDS * (2 ** (attempt - 1))))
+                logger.warning(f"Storage {operation} failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _record(self, operation: str, duration: float, attempts: int, failed: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(operation, _OperationStats())
+            stats.calls += 1
+            stats.errors += 1 if failed else 0
+            stats.retries += attempts - 1
+            stats.total_seconds += duration
+            stats.max_seconds = max(stats.max_seconds, duration)
+
+    def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        """Store bytes under key and return the object's URL."""
+        self._call("put_object", lambda: self.backend.put_object(key, data, content_type, cache_control))
+        return self.url_for(key)
+
+    def get_object(self, key: str, length: Optional[int] = None) -> Optional[bytes]:
+        return self._call("get_object", lambda: self.backend.get_object(key, length))
+
+    def object_size(self, key: str) -> Optional[int]:
+        return self._call("object_size", lambda: self.backend.object_size(key))
+
+    def delete_objects(self, keys: Iterable[str]) -> None:
+        keys = [key for key in keys if key]
+        if keys:
+            self._call("delete_objects", lambda: self.backend.delete_objects(keys))
+
+    def delete_object(self, key: str) -> None:
+        self.delete_objects([key])
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        """Stream object listings. Not retried: a failed listing is restarted by the caller."""
+        return self.backend.list_objects(prefix)
+
+    def write_stream(self, key: str, content_type: str, chunks: Iterable[bytes]) -> None:
+        """
+        Stream chunks to storage. Never retried: the chunks are consumed as
+        they're written and can't be replayed, so a retry would store a
+        truncated object.
+        """
+        def _write():
+            writer = self.backend.open_writer(key, content_type)
+            try:
+                for chunk in chunks:
+                    writer.write(chunk)
+                writer.commit()
+            except BaseException:
+                writer.abort()
+                raise
+
+        self._call("write_stream", _write, retry=False)
+
+    def open_writer(self, key: str, content_type: str):
+        return self.backend.open_writer(key, content_type)
+
+    def url_for(self, key: str) -> str:
+        return self.backend.url_for(key)
+
+    def key_for_url(self, url: Optional[str]) -> Optional[str]:
+        return self.backend.key_for_url(url)
+
+    # ── async API (runs the blocking call on the storage thread pool) ──
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._io_threads, thread_name_prefix="storage")
+            return self._executor
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+
+    async def aput_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        return await self.run(self.put_object, key, data, content_type, cache_control)
+
+    async def aget_object(self, key: str, length: Optional[int] = None) -> Optional[bytes]:
+        return await self.run(self.get_object, key, length)
+
+    async def aobject_size(self, key: str) -> Optional[int]:
+        return await self.run(self.object_size, key)
+
+    async def adelete_objects(self, keys: Iterable[str]) -> None:
+        await self.run(self.delete_objects, list(keys))
+
+    async def adelete_object(self, key: str) -> None:
+        await self.run(self.delete_object, key)
+
+    def close(self) -> None:
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": self.backend.name,
+                "operations": {
+                    name: {
+                        "calls": s.calls,
+                        "errors": s.errors,
+                        "retries": s.retries,
+                        "avg_ms": round(s.total_seconds / s.calls * 1000, 1) if s.calls else 0.0,
+                        "max_ms": round(s.max_seconds * 1000, 1),
+                    }
+                    for name, s in self._stats.items()
+                },
+            }
+
+
+def _build_default_storage() -> MediaStorage:
+    if USE_S3:
+        return MediaStorage(S3StorageBackend())
+    return MediaStorage(LocalStorageBackend(get_media_dir()))
+
+
+media_storage = _build_default_storage()
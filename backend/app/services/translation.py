@@ -1,14 +1,22 @@
 """Translation service for posts, comments, and messages."""
 import os
+import asyncio
 import logging
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from app.models import Post, PostTranslation, Comment, CommentTranslation, Message, MessageTranslation, SalonMessage, SalonMessageTranslation
-from app.services.translation_providers.base import TranslationProvider, TranslationResult
-from app.services.translation_providers.openai_provider import OpenAITranslationProvider
-from app.services.translation_providers.dummy_provider import DummyTranslationProvider
+from app.database import SessionLocal
+from app.models import (
+    Post, PostTranslation, Comment, CommentTranslation, Message, MessageTranslation,
+    SalonMessage, SalonMessageTranslation, TranslationClaim
+)
+from app.services.language_detection import LOCAL_DETECTION_MIN_CONFIDENCE, detect_language
+from app.services.singleflight import SingleFlight
+from app.services.translation_memory import translate_with_memory
+from app.services.translation_providers.base import PERMANENT_ERROR_CODES, TranslationError, TranslationProvider, TranslationResult
+from app.services.translation_providers.registry import provider_registry
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +24,26 @@ logger = logging.getLogger(__name__)
 SUPPORTED_LANGUAGES = ["ja", "en", "ko", "es", "pt", "fr", "it", "de"]
 DEFAULT_LANGUAGE = "ja"
 
+# Fan-out limits for translating a page of posts
+TRANSLATION_FANOUT_CONCURRENCY = int(os.getenv("TRANSLATION_FANOUT_CONCURRENCY", "8"))
+TRANSLATION_PAGE_DEADLINE_SECONDS = float(os.getenv("TRANSLATION_PAGE_DEADLINE_SECONDS", "8"))
+
+# Streaming translation of long posts: paragraph chunk size and parallelism
+TRANSLATION_STREAM_CHUNK_CHARS = int(os.getenv("TRANSLATION_STREAM_CHUNK_CHARS", "1500"))
+TRANSLATION_STREAM_CONCURRENCY = int(os.getenv("TRANSLATION_STREAM_CONCURRENCY", "4"))
+
+# Cross-worker translation claims: how long a claim is honoured and how often
+# a waiting worker checks for the claim holder's result
+TRANSLATION_CLAIM_TTL_SECONDS = float(os.getenv("TRANSLATION_CLAIM_TTL_SECONDS", "90"))
+TRANSLATION_CLAIM_POLL_SECONDS = float(os.getenv("TRANSLATION_CLAIM_POLL_SECONDS", "0.5"))
+
+# In-flight translations keyed by (entity type, id, lang)
+_translation_flights = SingleFlight()
+
 
 def get_translation_provider() -> TranslationProvider:
-    """Get the configured translation provider."""
-    provider_name = os.getenv("TRANSLATION_PROVIDER", "openai").lower()
-    
-    if provider_name == "openai":
-        provider = OpenAITranslationProvider()
-        if provider.is_available():
-            return provider
-        logger.warning("OpenAI provider not available, falling back to dummy")
-    
-    return DummyTranslationProvider()
+    """Get the configured translation provider (shared for the process lifetime)."""
+    return provider_registry.get()
 
 
 async def detect_post_language(text: str, title: Optional[str] = None) -> str:
@@ -41,11 +57,15 @@ async def detect_post_language(text: str, title: Optional[str] = None) -> str:
     Returns:
         Detected language code or 'unknown'
     """
-    provider = get_translation_provider()
-    
     # Combine title and text for better detection
     content = f"{title}\n{text}" if title else text
     
+    # Offline detection first; the LLM is only consulted on low confidence
+    detected, confidence = detect_language(content)
+    if detected in SUPPORTED_LANGUAGES and confidence >= LOCAL_DETECTION_MIN_CONFIDENCE:
+        return detected
+    
+    provider = get_translation_provider()
     try:
         detected = await provider.detect_language(content)
         if detected in SUPPORTED_LANGUAGES:
@@ -56,6 +76,214 @@ async def detect_post_language(text: str, title: Optional[str] = None) -> str:
         return "unknown"
 
 
+def _known_source_lang(entity) -> Optional[str]:
+    """original_lang of an entity if it was detected, else None (provider auto-detects)."""
+    lang = getattr(entity, "original_lang", None)
+    return lang if lang in SUPPORTED_LANGUAGES else None
+
+
+def _release_db_connection(db: Session) -> None:
+    """
+    End the request session's transaction before a provider await.
+    
+    Otherwise the session keeps its pooled connection checked out for the
+    whole provider call. Loaded objects are expired and reload on next access.
+
+    The translation helpers only read through the caller's session, so the
+    transaction is rolled back, never committed: callers must pass a session
+    with no flushed, uncommitted writes. A session with pending (unflushed)
+    changes keeps its connection instead of losing or committing them.
+    """
+    if db.new or db.dirty or db.deleted:
+        logger.warning("Translation called with pending session changes; keeping the DB connection")
+        return
+    db.rollback()
+
+
+def _translation_filter(model, fk_name: str, entity_id: int, target_lang: str):
+    return (getattr(model, fk_name) == entity_id, model.lang == target_lang)
+
+
+def _store_translation(
+    db: Session,
+    model,
+    fk_name: str,
+    entity_id: int,
+    target_lang: str,
+    result: TranslationResult
+):
+    """
+    Persist a provider result as a translation row.
+    
+    Returns the existing row if another request created it first.
+    """
+    fields = {
+        fk_name: entity_id,
+        "lang": target_lang,
+        "translated_text": result.translated_text,
+        "provider": result.provider,
+        "error_code": result.error_code if not result.success else None,
+    }
+    if hasattr(model, "translated_title"):
+        fields["translated_title"] = result.translated_title
+    translation = model(**fields)
+    
+    try:
+        db.add(translation)
+        db.commit()
+        db.refresh(translation)
+        return translation
+    except IntegrityError:
+        # Another request already created this translation (race condition)
+        db.rollback()
+        logger.info(f"Race condition: translation already exists for {fk_name}={entity_id} to {target_lang}")
+        return db.query(model).filter(*_translation_filter(model, fk_name, entity_id, target_lang)).first()
+
+
+def _store_translation_in_new_session(
+    model, fk_name: str, entity_id: int, target_lang: str, result: TranslationResult
+) -> None:
+    db = SessionLocal()
+    try:
+        _store_translation(db, model, fk_name, entity_id, target_lang, result)
+    finally:
+        db.close()
+
+
+def _try_claim_translation(entity_type: str, entity_id: int, target_lang: str) -> bool:
+    """
+    Claim a translation across worker processes.
+    
+    Claims older than TRANSLATION_CLAIM_TTL_SECONDS are treated as abandoned
+    (e.g. the worker holding them crashed) and taken over.
+    """
+    now = datetime.now(timezone.utc)
+    key = (
+        TranslationClaim.entity_type == entity_type,
+        TranslationClaim.entity_id == entity_id,
+        TranslationClaim.lang == target_lang,
+    )
+    db = SessionLocal()
+    try:
+        db.query(TranslationClaim).filter(
+            *key,
+            TranslationClaim.claimed_at < now - timedelta(seconds=TRANSLATION_CLAIM_TTL_SECONDS)
+        ).delete(synchronize_session=False)
+        db.add(TranslationClaim(entity_type=entity_type, entity_id=entity_id, lang=target_lang, claimed_at=now))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+    except Exception as e:
+        # Claims are an optimization; never block translation on them
+        db.rollback()
+        logger.warning(f"Translation claim failed for {entity_type} {entity_id} to {target_lang}: {e}")
+        return True
+    finally:
+        db.close()
+
+
+def _release_translation_claim(entity_type: str, entity_id: int, target_lang: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(TranslationClaim).filter(
+            TranslationClaim.entity_type == entity_type,
+            TranslationClaim.entity_id == entity_id,
+            TranslationClaim.lang == target_lang,
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to release translation claim for {entity_type} {entity_id}: {e}")
+    finally:
+        db.close()
+
+
+def _translation_exists(model, fk_name: str, entity_id: int, target_lang: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(model.id).filter(*_translation_filter(model, fk_name, entity_id, target_lang)).first() is not None
+    finally:
+        db.close()
+
+
+async def _translate_and_store(
+    entity_type: str,
+    entity_id: int,
+    target_lang: str,
+    model,
+    fk_name: str,
+    translate: Callable[[], Awaitable[TranslationResult]]
+) -> None:
+    """
+    Run one provider call and store its result, at most once across workers.
+    
+    If another worker holds the claim, wait for its row to appear instead of
+    paying for a second provider call. No DB session is held while awaiting,
+    and the claim / store queries run in a worker thread.
+    """
+    claimed = await asyncio.to_thread(_try_claim_translation, entity_type, entity_id, target_lang)
+    if not claimed:
+        logger.info(f"Waiting for another worker to translate {entity_type} {entity_id} to {target_lang}")
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + TRANSLATION_CLAIM_TTL_SECONDS
+        while loop.time() < give_up_at:
+            await asyncio.sleep(TRANSLATION_CLAIM_POLL_SECONDS)
+            if await asyncio.to_thread(_translation_exists, model, fk_name, entity_id, target_lang):
+                return
+        # The other worker never finished: translate ourselves
+    
+    try:
+        result = await translate()
+        if not result.success and result.error_code not in PERMANENT_ERROR_CODES:
+            # Transient (timeout, open circuit, API error): don't cache, readers get the original
+            logger.warning(f"Not caching failed translation of {entity_type} {entity_id} to {target_lang}: {result.error_code}")
+            return
+        await asyncio.to_thread(_store_translation_in_new_session, model, fk_name, entity_id, target_lang, result)
+    finally:
+        if claimed:
+            await asyncio.to_thread(_release_translation_claim, entity_type, entity_id, target_lang)
+
+
+async def _get_or_create_entity_translation(
+    db: Session,
+    entity_type: str,
+    entity_id: int,
+    target_lang: str,
+    model,
+    fk_name: str,
+    translate: Callable[[], Awaitable[TranslationResult]]
+):
+    """
+    Shared cache-or-translate path for posts, comments and messages.
+    
+    Concurrent callers in this process for the same (entity type, id, lang)
+    share one provider call; _translate_and_store extends that across workers.
+    """
+    # Check if translation already exists (cache hit)
+    existing = db.query(model).filter(*_translation_filter(model, fk_name, entity_id, target_lang)).first()
+    if existing:
+        logger.info(f"Cache hit: translation for {entity_type} {entity_id} to {target_lang}")
+        return existing
+    
+    # No existing translation, create one
+    logger.info(f"Cache miss: creating translation for {entity_type} {entity_id} to {target_lang}")
+    
+    _release_db_connection(db)
+    try:
+        await _translation_flights.do(
+            (entity_type, entity_id, target_lang),
+            lambda: _translate_and_store(entity_type, entity_id, target_lang, model, fk_name, translate)
+        )
+    except Exception as e:
+        logger.error(f"Translation failed for {entity_type} {entity_id}: {e}")
+        db.rollback()
+        return None
+    
+    return db.query(model).filter(*_translation_filter(model, fk_name, entity_id, target_lang)).first()
+
+
 async def get_or_create_translation(
     db: Session,
     post: Post,
@@ -65,7 +293,8 @@ async def get_or_create_translation(
     Get existing translation or create a new one.
     
     This function handles the on-demand translation with caching.
-    It uses database UNIQUE constraint to prevent duplicate translations.
+    Concurrent requests for the same post and language share one provider
+    call; the UNIQUE constraint remains the final guard against duplicates.
     
     Args:
         db: Database session
@@ -79,19 +308,6 @@ async def get_or_create_translation(
         logger.warning(f"Unsupported target language: {target_lang}")
         return None
     
-    # Check if translation already exists (cache hit)
-    existing = db.query(PostTranslation).filter(
-        PostTranslation.post_id == post.id,
-        PostTranslation.lang == target_lang
-    ).first()
-    
-    if existing:
-        logger.info(f"Cache hit: translation for post {post.id} to {target_lang}")
-        return existing
-    
-    # No existing translation, create one
-    logger.info(f"Cache miss: creating translation for post {post.id} to {target_lang}")
-    
     # Skip translation if source and target are the same
     source_lang = post.original_lang or "unknown"
     if source_lang == target_lang:
@@ -99,43 +315,301 @@ async def get_or_create_translation(
         return None
     
     provider = get_translation_provider()
+    body, title = post.body, post.title
     
-    try:
-        result = await provider.translate(
-            text=post.body,
+    return await _get_or_create_entity_translation(
+        db, "post", post.id, target_lang, PostTranslation, "post_id",
+        lambda: translate_with_memory(
+            provider,
+            text=body,
             target_lang=target_lang,
             source_lang=source_lang if source_lang != "unknown" else None,
-            title=post.title
+            title=title
         )
+    )
+
+
+async def pretranslate_post(post_id: int, target_lang: str) -> Optional[str]:
+    """
+    Translate a post ahead of the first reader (background pipeline).
+    
+    Uses its own short-lived sessions and never holds one across the provider
+    call. A failed result is not left in the cache, so readers can still
+    trigger an on-demand translation later.
+    
+    Args:
+        post_id: The post to translate
+        target_lang: Target language code
         
-        # Create translation record
-        translation = PostTranslation(
-            post_id=post.id,
-            lang=target_lang,
-            translated_title=result.translated_title,
-            translated_text=result.translated_text,
-            provider=result.provider,
-            error_code=result.error_code if not result.success else None
+    Returns:
+        None on success (or nothing to do), otherwise the provider error code
+    """
+    db = SessionLocal()
+    try:
+        post = db.query(Post).filter(Post.id == post_id).first()
+        if post is None:
+            return None
+        source_lang = post.original_lang or "unknown"
+        body, title = post.body, post.title
+        if source_lang == target_lang or db.query(PostTranslation.id).filter(
+            *_translation_filter(PostTranslation, "post_id", post_id, target_lang)
+        ).first() is not None:
+            return None
+    finally:
+        db.close()
+    
+    provider = get_translation_provider()
+    await _translation_flights.do(
+        ("post", post_id, target_lang),
+        lambda: _translate_and_store(
+            "post", post_id, target_lang, PostTranslation, "post_id",
+            lambda: translate_with_memory(
+                provider,
+                text=body,
+                target_lang=target_lang,
+                source_lang=source_lang if source_lang != "unknown" else None,
+                title=title
+            )
         )
-        
-        try:
-            db.add(translation)
+    )
+    
+    db = SessionLocal()
+    try:
+        translation = db.query(PostTranslation).filter(
+            *_translation_filter(PostTranslation, "post_id", post_id, target_lang)
+        ).first()
+        if translation is None:
+            return "not_stored"
+        if translation.error_code:
+            error_code = translation.error_code
+            db.delete(translation)
             db.commit()
-            db.refresh(translation)
-            return translation
-        except IntegrityError:
-            # Another request already created this translation (race condition)
-            db.rollback()
-            logger.info(f"Race condition: translation already exists for post {post.id} to {target_lang}")
-            return db.query(PostTranslation).filter(
-                PostTranslation.post_id == post.id,
-                PostTranslation.lang == target_lang
-            ).first()
-            
-    except Exception as e:
-        logger.error(f"Translation failed for post {post.id}: {e}")
-        db.rollback()
+            return error_code
         return None
+    finally:
+        db.close()
+
+
+def invalidate_post_translations(db: Session, post_id: int) -> int:
+    """
+    Delete cached translations of a post whose content changed.
+    
+    The caller commits. Returns the number of rows deleted.
+    """
+    return db.query(PostTranslation).filter(
+        PostTranslation.post_id == post_id
+    ).delete(synchronize_session=False)
+
+
+def get_cached_post_translations(
+    db: Session,
+    post_ids: List[int],
+    target_lang: str
+) -> Dict[int, PostTranslation]:
+    """Load cached translations for a page of posts in a single query."""
+    if not post_ids:
+        return {}
+    rows = db.query(PostTranslation).filter(
+        PostTranslation.post_id.in_(post_ids),
+        PostTranslation.lang == target_lang
+    ).all()
+    return {row.post_id: row for row in rows}
+
+
+async def translate_posts_concurrently(
+    db: Session,
+    posts: List[Post],
+    target_lang: str,
+    max_concurrency: int = TRANSLATION_FANOUT_CONCURRENCY,
+    deadline_seconds: float = TRANSLATION_PAGE_DEADLINE_SECONDS
+) -> Tuple[Dict[int, PostTranslation], Set[int]]:
+    """
+    Translate cache-missed posts concurrently within a per-request deadline.
+    
+    Provider calls run at most ``max_concurrency`` at a time. Translations
+    still running at the deadline are not cancelled: they finish and are
+    stored in the background, so the next request gets a cache hit.
+    
+    Args:
+        db: Database session
+        posts: Posts without a cached translation for target_lang
+        target_lang: Target language code
+        max_concurrency: Maximum number of concurrent provider calls
+        deadline_seconds: How long the caller waits for translations
+        
+    Returns:
+        (translations by post id, ids of posts still being translated)
+    """
+    if not posts or target_lang not in SUPPORTED_LANGUAGES:
+        return {}, set()
+    
+    provider = get_translation_provider()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    def _translate_later(body: str, title: Optional[str], source_lang: Optional[str]):
+        async def _translate() -> TranslationResult:
+            async with semaphore:
+                return await translate_with_memory(
+                    provider,
+                    text=body,
+                    target_lang=target_lang,
+                    source_lang=source_lang if source_lang not in (None, "unknown") else None,
+                    title=title
+                )
+        return _translate
+    
+    # Snapshot post fields: background work must not touch the request's ORM objects
+    tasks = {}
+    for post in posts:
+        translate = _translate_later(post.body, post.title, post.original_lang)
+        flight = _translation_flights.do(
+            ("post", post.id, target_lang),
+            lambda post_id=post.id, translate=translate: _translate_and_store(
+                "post", post_id, target_lang, PostTranslation, "post_id", translate
+            )
+        )
+        tasks[asyncio.create_task(flight)] = post.id
+    _release_db_connection(db)
+    done, pending = await asyncio.wait(tasks.keys(), timeout=deadline_seconds)
+    
+    for task in done:
+        if task.exception() is not None:
+            logger.error(f"Translation failed for post {tasks[task]}: {task.exception()}")
+    # Only stop waiting; the shielded flights keep running
+    for task in pending:
+        task.cancel()
+    
+    pending_ids = {tasks[task] for task in pending}
+    if pending_ids:
+        logger.info(f"Translation deadline exceeded for {len(pending_ids)} posts to {target_lang}, continuing in background")
+    
+    done_ids = [tasks[task] for task in done]
+    return get_cached_post_translations(db, done_ids, target_lang), pending_ids
+
+
+def split_into_paragraph_chunks(text: str, max_chars: int = TRANSLATION_STREAM_CHUNK_CHARS) -> List[str]:
+    """Group consecutive paragraphs (blank-line separated) into chunks of about max_chars."""
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for paragraph in (p.strip() for p in (text or "").replace("\r\n", "\n").split("\n\n")):
+        if not paragraph:
+            continue
+        if current and size + len(paragraph) > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def stream_post_translation(
+    post_id: int,
+    target_lang: str,
+    max_concurrency: int = TRANSLATION_STREAM_CONCURRENCY
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Translate a post paragraph chunk by paragraph chunk, yielding progress events.
+    
+    The title and the body chunks are translated in parallel and their
+    pieces are yielded as the provider streams them. The assembled
+    translation is stored as the post's PostTranslation at the end.
+    No DB session is held while waiting on the provider.
+    
+    Yields:
+        (event name, data) pairs:
+        - meta: segment count; segment 0 is the title when the post has one
+        - chunk: a translated piece of one segment
+        - segment_error: a segment could not be translated
+        - done: whether the translation is complete and stored
+    """
+    db = SessionLocal()
+    try:
+        post = db.query(Post).filter(Post.id == post_id).first()
+        if post is None:
+            return
+        body, title = post.body or "", post.title
+        source_lang = post.original_lang or "unknown"
+        cached = db.query(PostTranslation).filter(
+            *_translation_filter(PostTranslation, "post_id", post_id, target_lang)
+        ).first()
+        cached = (cached.translated_title, cached.translated_text) if cached and not cached.error_code else None
+    finally:
+        db.close()
+    
+    if cached is not None or source_lang == target_lang:
+        # Nothing to translate: replay the stored (or original) text as one piece per segment
+        translated_title, translated_text = cached or (title, body)
+        segments = ([translated_title or ""] if title else []) + [translated_text]
+        yield "meta", {"post_id": post_id, "target_lang": target_lang, "segments": len(segments), "title_segment": 0 if title else None}
+        for index, text in enumerate(segments):
+            yield "chunk", {"segment": index, "text": text}
+        yield "done", {"is_translated": cached is not None, "from_cache": cached is not None}
+        return
+    
+    provider = get_translation_provider()
+    known_source = source_lang if source_lang != "unknown" else None
+    chunks = split_into_paragraph_chunks(body)
+    segments = ([title] if title else []) + chunks
+    yield "meta", {"post_id": post_id, "target_lang": target_lang, "segments": len(segments), "title_segment": 0 if title else None}
+    
+    parts: List[List[str]] = [[] for _ in segments]
+    events: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def _translate_segment(index: int, text: str) -> None:
+        try:
+            async with semaphore:
+                async for piece in provider.translate_stream(text, target_lang, known_source):
+                    parts[index].append(piece)
+                    events.put_nowait(("chunk", index, piece))
+            events.put_nowait(("segment_done", index, None))
+        except TranslationError as e:
+            events.put_nowait(("segment_error", index, e.error_code))
+        except Exception as e:
+            logger.error(f"Streaming translation of post {post_id} segment {index} failed: {e}")
+            events.put_nowait(("segment_error", index, f"api_error:{type(e).__name__}"))
+    
+    tasks = [asyncio.create_task(_translate_segment(i, text)) for i, text in enumerate(segments)]
+    error_code = None
+    try:
+        remaining = len(tasks)
+        while remaining:
+            kind, index, value = await events.get()
+            if kind == "chunk":
+                yield "chunk", {"segment": index, "text": value}
+                continue
+            remaining -= 1
+            if kind == "segment_error":
+                error_code = error_code or value
+                yield "segment_error", {"segment": index, "error_code": value}
+    finally:
+        # Client disconnected: stop translating the remaining segments
+        for task in tasks:
+            task.cancel()
+    
+    if error_code is not None:
+        yield "done", {"is_translated": False, "from_cache": False, "error_code": error_code}
+        return
+    
+    body_parts = parts[1:] if title else parts
+    result = TranslationResult(
+        translated_text="\n\n".join("".join(p).strip() for p in body_parts),
+        translated_title="".join(parts[0]).strip() if title else None,
+        source_lang=known_source,
+        target_lang=target_lang,
+        provider=provider.provider_name
+    )
+    db = SessionLocal()
+    try:
+        _store_translation(db, PostTranslation, "post_id", post_id, target_lang, result)
+    finally:
+        db.close()
+    # Not put in the translation memory: the paragraph-chunk prompt's output
+    # must not be served for a whole-text translate() of the same content
+    yield "done", {"is_translated": True, "from_cache": False}
 
 
 async def get_or_create_comment_translation(
@@ -158,55 +632,78 @@ async def get_or_create_comment_translation(
         logger.warning(f"Unsupported target language: {target_lang}")
         return None
     
-    # Check if translation already exists (cache hit)
-    existing = db.query(CommentTranslation).filter(
-        CommentTranslation.comment_id == comment.id,
-        CommentTranslation.lang == target_lang
-    ).first()
+    source_lang = _known_source_lang(comment)
+    if source_lang == target_lang:
+        return None
     
-    if existing:
-        logger.info(f"Cache hit: translation for comment {comment.id} to {target_lang}")
-        return existing
+    provider = get_translation_provider()
+    body = comment.body
     
-    # No existing translation, create one
-    logger.info(f"Cache miss: creating translation for comment {comment.id} to {target_lang}")
+    return await _get_or_create_entity_translation(
+        db, "comment", comment.id, target_lang, CommentTranslation, "comment_id",
+        lambda: translate_with_memory(provider, text=body, target_lang=target_lang, source_lang=source_lang, batched=True)
+    )
+
+
+async def translate_comments(
+    db: Session,
+    comments: List[Comment],
+    target_lang: str
+) -> Dict[int, CommentTranslation]:
+    """
+    Translate many comments at once (e.g. a whole thread).
     
-    provider = get_translation_provider()
+    Cached translations are loaded in one query; the misses are translated
+    concurrently, which the batcher coalesces into a few provider requests.
     
-    try:
-        result = await provider.translate(
-            text=comment.body,
-            target_lang=target_lang,
-            source_lang=None
-        )
-        
-        # Create translation record
-        translation = CommentTranslation(
-            comment_id=comment.id,
-            lang=target_lang,
-            translated_text=result.translated_text,
-            provider=result.provider,
-            error_code=result.error_code if not result.success else None
-        )
+    Args:
+        db: Database session
+        comments: Comments to translate
+        target_lang: Target language code
         
-        try:
-            db.add(translation)
-            db.commit()
-            db.refresh(translation)
-            return translation
-        except IntegrityError:
-            # Another request already created this translation (race condition)
-            db.rollback()
-            logger.info(f"Race condition: translation already exists for comment {comment.id} to {target_lang}")
-            return db.query(CommentTranslation).filter(
-                CommentTranslation.comment_id == comment.id,
-                CommentTranslation.lang == target_lang
-            ).first()
-            
-    except Exception as e:
-        logger.error(f"Translation failed for comment {comment.id}: {e}")
-        db.rollback()
-        return None
+    Returns:
+        Translations by comment id (comments in target_lang are omitted)
+    """
+    if not comments or target_lang not in SUPPORTED_LANGUAGES:
+        return {}
+    
+    comment_ids = [comment.id for comment in comments]
+    cached = {
+        row.comment_id: row
+        for row in db.query(CommentTranslation).filter(
+            CommentTranslation.comment_id.in_(comment_ids),
+            CommentTranslation.lang == target_lang
+        ).all()
+    }
+    
+    provider = get_translation_provider()
+    flights = []
+    for comment in comments:
+        source_lang = _known_source_lang(comment)
+        if comment.id in cached or source_lang == target_lang or not comment.body:
+            continue
+        flights.append(_translation_flights.do(
+            ("comment", comment.id, target_lang),
+            lambda comment_id=comment.id, body=comment.body, source_lang=source_lang: _translate_and_store(
+                "comment", comment_id, target_lang, CommentTranslation, "comment_id",
+                lambda: translate_with_memory(provider, text=body, target_lang=target_lang, source_lang=source_lang, batched=True)
+            )
+        ))
+    if not flights:
+        return cached
+    
+    _release_db_connection(db)
+    for result in await asyncio.gather(*flights, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Comment translation to {target_lang} failed: {result}")
+    
+    return {
+        row.comment_id: row
+        for row in db.query(CommentTranslation).filter(
+            CommentTranslation.comment_id.in_(comment_ids),
+            CommentTranslation.lang == target_lang
+        ).all()
+    }
 
 
 async def get_or_create_message_translation(
@@ -232,55 +729,17 @@ async def get_or_create_message_translation(
     if not message.body:
         return None
     
-    # Check if translation already exists (cache hit)
-    existing = db.query(MessageTranslation).filter(
-        MessageTranslation.message_id == message.id,
-        MessageTranslation.lang == target_lang
-    ).first()
-    
-    if existing:
-        logger.info(f"Cache hit: translation for message {message.id} to {target_lang}")
-        return existing
-    
-    # No existing translation, create one
-    logger.info(f"Cache miss: creating translation for message {message.id} to {target_lang}")
+    source_lang = _known_source_lang(message)
+    if source_lang == target_lang:
+        return None
     
     provider = get_translation_provider()
+    body = message.body
     
-    try:
-        result = await provider.translate(
-            text=message.body,
-            target_lang=target_lang,
-            source_lang=None
-        )
-        
-        # Create translation record
-        translation = MessageTranslation(
-            message_id=message.id,
-            lang=target_lang,
-            translated_text=result.translated_text,
-            provider=result.provider,
-            error_code=result.error_code if not result.success else None
-        )
-        
-        try:
-            db.add(translation)
-            db.commit()
-            db.refresh(translation)
-            return translation
-        except IntegrityError:
-            # Another request already created this translation (race condition)
-            db.rollback()
-            logger.info(f"Race condition: translation already exists for message {message.id} to {target_lang}")
-            return db.query(MessageTranslation).filter(
-                MessageTranslation.message_id == message.id,
-                MessageTranslation.lang == target_lang
-            ).first()
-            
-    except Exception as e:
-        logger.error(f"Translation failed for message {message.id}: {e}")
-        db.rollback()
-        return None
+    return await _get_or_create_entity_translation(
+        db, "message", message.id, target_lang, MessageTranslation, "message_id",
+        lambda: translate_with_memory(provider, text=body, target_lang=target_lang, source_lang=source_lang, batched=True)
+    )
 
 
 async def get_or_create_salon_message_translation(
@@ -306,55 +765,17 @@ async def get_or_create_salon_message_translation(
     if not salon_message.body:
         return None
     
-    # Check if translation already exists (cache hit)
-    existing = db.query(SalonMessageTranslation).filter(
-        SalonMessageTranslation.salon_message_id == salon_message.id,
-        SalonMessageTranslation.lang == target_lang
-    ).first()
-    
-    if existing:
-        logger.info(f"Cache hit: translation for salon message {salon_message.id} to {target_lang}")
-        return existing
-    
-    # No existing translation, create one
-    logger.info(f"Cache miss: creating translation for salon message {salon_message.id} to {target_lang}")
+    source_lang = _known_source_lang(salon_message)
+    if source_lang == target_lang:
+        return None
     
     provider = get_translation_provider()
+    body = salon_message.body
     
-    try:
-        result = await provider.translate(
-            text=salon_message.body,
-            target_lang=target_lang,
-            source_lang=None
-        )
-        
-        # Create translation record
-        translation = SalonMessageTranslation(
-            salon_message_id=salon_message.id,
-            lang=target_lang,
-            translated_text=result.translated_text,
-            provider=result.provider,
-            error_code=result.error_code if not result.success else None
-        )
-        
-        try:
-            db.add(translation)
-            db.commit()
-            db.refresh(translation)
-            return translation
-        except IntegrityError:
-            # Another request already created this translation (race condition)
-            db.rollback()
-            logger.info(f"Race condition: translation already exists for salon message {salon_message.id} to {target_lang}")
-            return db.query(SalonMessageTranslation).filter(
-                SalonMessageTranslation.salon_message_id == salon_message.id,
-                SalonMessageTranslation.lang == target_lang
-            ).first()
-            
-    except Exception as e:
-        logger.error(f"Translation failed for salon message {salon_message.id}: {e}")
-        db.rollback()
-        return None
+    return await _get_or_create_entity_translation(
+        db, "salon_message", salon_message.id, target_lang, SalonMessageTranslation, "salon_message_id",
+        lambda: translate_with_memory(provider, text=body, target_lang=target_lang, source_lang=source_lang, batched=True)
+    )
 
 
 async def translate_text_with_openai(text: str, target_lang: str) -> str:
@@ -374,7 +795,8 @@ async def translate_text_with_openai(text: str, target_lang: str) -> str:
     provider = get_translation_provider()
     
     try:
-        result = await provider.translate(
+        result = await translate_with_memory(
+            provider,
             text=text,
             target_lang=target_lang,
             source_lang=None
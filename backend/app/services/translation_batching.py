@@ -0,0 +1,108 @@
+"""Coalesce concurrent short-text translations into provider batch requests.
+
+Callers translating short texts (comments, chat and salon messages) within a
+short window are grouped by (target lang, source lang) and sent to the
+provider's translate_batch as one request.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.services.translation_providers.base import TranslationProvider, TranslationResult
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_BATCH_WINDOW_SECONDS = float(os.getenv("TRANSLATION_BATCH_WINDOW_MS", "25")) / 1000
+TRANSLATION_BATCH_MAX_SIZE = int(os.getenv("TRANSLATION_BATCH_MAX_SIZE", "25"))
+# Keeps a batch's answer well inside the provider's max_tokens
+TRANSLATION_BATCH_MAX_CHARS = int(os.getenv("TRANSLATION_BATCH_MAX_CHARS", "6000"))
+# Longer texts are not worth batching
+SHORT_TEXT_MAX_CHARS = 1000
+
+BatchKey = Tuple[str, Optional[str]]
+
+
+class _PendingBatch:
+    def __init__(self, provider: TranslationProvider):
+        self.provider = provider
+        self.texts: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.chars = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class TranslationBatcher:
+    """Groups concurrent translate() calls into translate_batch() requests."""
+
+    def __init__(
+        self,
+        window_seconds: float = TRANSLATION_BATCH_WINDOW_SECONDS,
+        max_batch_size: int = TRANSLATION_BATCH_MAX_SIZE,
+        max_batch_chars: int = TRANSLATION_BATCH_MAX_CHARS
+    ):
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+        self._pending: Dict[BatchKey, _PendingBatch] = {}
+        self._flushes: set = set()
+
+    async def translate(
+        self,
+        provider: TranslationProvider,
+        text: str,
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> TranslationResult:
+        """Translate one short text as part of the next batch for its language pair."""
+        if len(text) > SHORT_TEXT_MAX_CHARS or self.max_batch_size <= 1:
+            return await provider.translate(text=text, target_lang=target_lang, source_lang=source_lang)
+
+        key = (target_lang, source_lang)
+        batch = self._pending.get(key)
+        if batch is not None and (batch.provider is not provider or batch.chars + len(text) > self.max_batch_chars):
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = _PendingBatch(provider)
+            batch.timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush, key)
+            self._pending[key] = batch
+
+        future = asyncio.get_running_loop().create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        batch.chars += len(text)
+        if len(batch.texts) >= self.max_batch_size:
+            self._flush(key)
+        # A cancelled caller must not fail the rest of the batch
+        return await asyncio.shield(future)
+
+    def _flush(self, key: BatchKey) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._run(batch, *key))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _run(self, batch: _PendingBatch, target_lang: str, source_lang: Optional[str]) -> None:
+        try:
+            results = await batch.provider.translate_batch(batch.texts, target_lang, source_lang)
+            if len(results) != len(batch.texts):
+                raise ValueError(f"translate_batch returned {len(results)} results for {len(batch.texts)} texts")
+        except Exception as e:
+            logger.error(f"Batch translation of {len(batch.texts)} texts to {target_lang} failed: {e}")
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        logger.info(f"Batch translated {len(batch.texts)} texts to {target_lang}")
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+
+translation_batcher = TranslationBatcher()
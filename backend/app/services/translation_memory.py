@@ -0,0 +1,182 @@
+"""Content-addressed translation memory shared by all translated entity types.
+
+Entries are keyed by a SHA-256 of (normalized text, title, source lang, target
+lang, provider/model version), so identical content is translated once no matter
+which post, comment or message it appears in. A bounded in-process LRU sits on
+top of the durable translation_memory table; the async path only touches the
+table from a worker thread, so a lookup never blocks the event loop.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.models import TranslationMemory
+from app.services.translation_batching import translation_batcher
+from app.services.translation_providers.base import TranslationProvider, TranslationResult
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_MEMORY_LRU_SIZE = int(os.getenv("TRANSLATION_MEMORY_LRU_SIZE", "2000"))
+
+_HORIZONTAL_SPACE = re.compile(r"[ \t　]+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """NFKC, unified newlines, collapsed horizontal whitespace, trimmed lines."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = (_HORIZONTAL_SPACE.sub(" ", line).strip() for line in text.split("\n"))
+    return "\n".join(lines).strip()
+
+
+def memory_key(
+    text: str,
+    target_lang: str,
+    source_lang: Optional[str],
+    provider: TranslationProvider,
+    title: Optional[str] = None
+) -> str:
+    payload = json.dumps(
+        [
+            normalize_text(text),
+            normalize_text(title),
+            source_lang or "auto",
+            target_lang,
+            f"{provider.provider_name}:{provider.model_version}",
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, TranslationResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[TranslationResult]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: TranslationResult) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_memory_cache = _LRUCache(TRANSLATION_MEMORY_LRU_SIZE)
+
+
+def lookup(key: str, target_lang: str) -> Optional[TranslationResult]:
+    """Find a remembered translation, in-process first, then in the database. Blocking."""
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        return cached
+
+    db = SessionLocal()
+    try:
+        row = db.query(TranslationMemory).filter(TranslationMemory.content_hash == key).first()
+    except Exception as e:
+        logger.warning(f"Translation memory lookup failed: {e}")
+        return None
+    finally:
+        db.close()
+    if row is None:
+        return None
+
+    result = TranslationResult(
+        translated_text=row.translated_text,
+        translated_title=row.translated_title,
+        target_lang=target_lang,
+        provider=row.provider,
+    )
+    _memory_cache.put(key, result)
+    return result
+
+
+def remember(key: str, target_lang: str, result: TranslationResult) -> None:
+    """Store a successful translation. Failures are never remembered. Blocking."""
+    if not result.success:
+        return
+    _memory_cache.put(key, result)
+
+    db = SessionLocal()
+    try:
+        db.add(TranslationMemory(
+            content_hash=key,
+            target_lang=target_lang,
+            provider=result.provider,
+            translated_title=result.translated_title,
+            translated_text=result.translated_text,
+        ))
+        db.commit()
+    except IntegrityError:
+        # Same content remembered concurrently
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to store translation memory entry: {e}")
+    finally:
+        db.close()
+
+
+async def translate_with_memory(
+    provider: TranslationProvider,
+    text: str,
+    target_lang: str,
+    source_lang: Optional[str] = None,
+    title: Optional[str] = None,
+    batched: bool = False
+) -> TranslationResult:
+    """
+    Translate through the translation memory.
+
+    Args:
+        provider: Provider used on a memory miss
+        text: The text to translate
+        target_lang: Target language code
+        source_lang: Source language code, or None to let the provider detect it
+        title: Optional title translated along with the text
+        batched: Coalesce a miss with concurrent short texts into one provider batch
+
+    Returns:
+        TranslationResult from memory or from the provider
+    """
+    key = memory_key(text, target_lang, source_lang, provider, title)
+    remembered = _memory_cache.get(key)
+    if remembered is None:
+        remembered = await asyncio.to_thread(lookup, key, target_lang)
+    if remembered is not None:
+        logger.info(f"Translation memory hit for {target_lang}")
+        return remembered
+
+    if batched and title is None:
+        result = await translation_batcher.translate(provider, text, target_lang, source_lang)
+    else:
+        result = await provider.translate(text=text, target_lang=target_lang, source_lang=source_lang, title=title)
+    if result.success:
+        await asyncio.to_thread(remember, key, target_lang, result)
+    return result
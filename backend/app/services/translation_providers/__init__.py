@@ -2,5 +2,6 @@
 from .base import TranslationProvider
 from .openai_provider import OpenAITranslationProvider
 from .dummy_provider import DummyTranslationProvider
+from .registry import ProviderRegistry, provider_registry
 
-__all__ = ["TranslationProvider", "OpenAITranslationProvider", "DummyTranslationProvider"]
+__all__ = ["TranslationProvider", "OpenAITranslationProvider", "DummyTranslationProvider", "ProviderRegistry", "provider_registry"]
@@ -1,8 +1,21 @@
 """Base translation provider interface."""
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 from dataclasses import dataclass
 
+# Provider error codes that retrying will not fix; anything else (API errors,
+# timeouts, an open circuit) is transient
+PERMANENT_ERROR_CODES = {"dummy_provider", "api_key_missing", "unsupported_language"}
+
+
+class TranslationError(Exception):
+    """Raised by streaming translation, which has no result object to carry the error."""
+    
+    def __init__(self, error_code: str):
+        super().__init__(error_code)
+        self.error_code = error_code
+
 
 @dataclass
 class TranslationResult:
@@ -20,6 +33,8 @@ class TranslationProvider(ABC):
     """Abstract base class for translation providers."""
     
     provider_name: str = "base"
+    # Bump when the model or prompt changes so translation memory entries are not reused
+    model_version: str = "v1"
     
     @abstractmethod
     async def translate(
@@ -43,6 +58,51 @@ class TranslationProvider(ABC):
         """
         pass
     
+    async def translate_batch(
+        self,
+        texts: List[str],
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> List[TranslationResult]:
+        """
+        Translate several short texts to the same target language.
+        
+        The default translates each text separately; providers that can do
+        several segments in one request override this.
+        
+        Args:
+            texts: The texts to translate
+            target_lang: Target language code
+            source_lang: Source language code (optional, auto-detect if not provided)
+            
+        Returns:
+            One TranslationResult per text, in the same order
+        """
+        return list(await asyncio.gather(*[
+            self.translate(text=text, target_lang=target_lang, source_lang=source_lang)
+            for text in texts
+        ]))
+    
+    async def translate_stream(
+        self,
+        text: str,
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Translate text, yielding the translation in pieces as it is produced.
+        
+        The default yields the whole translation at once; providers with a
+        streaming API override this.
+        
+        Raises:
+            TranslationError: If the translation failed
+        """
+        result = await self.translate(text=text, target_lang=target_lang, source_lang=source_lang)
+        if not result.success:
+            raise TranslationError(result.error_code or "translation_failed")
+        yield result.translated_text
+    
     @abstractmethod
     async def detect_language(self, text: str) -> str:
         """
@@ -59,3 +119,7 @@ class TranslationProvider(ABC):
     def is_available(self) -> bool:
         """Check if the provider is properly configured and available."""
         return True
+    
+    async def aclose(self) -> None:
+        """Release pooled resources (HTTP connections). Called on app shutdown."""
+        return None
@@ -0,0 +1,269 @@
+"""Circuit breaker and latency budget around the translation provider.
+
+When the provider is failing or slow, the breaker opens and calls return the
+original text (marked untranslated) immediately instead of queueing up behind
+the provider timeout. After a cool-down a few probe calls are let through
+(half-open); their outcome closes or re-opens the circuit.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+from .base import TranslationError, TranslationProvider, TranslationResult, PERMANENT_ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_CALL_BUDGET_SECONDS = float(os.getenv("TRANSLATION_CALL_BUDGET_SECONDS", "20"))
+TRANSLATION_DETECT_BUDGET_SECONDS = float(os.getenv("TRANSLATION_DETECT_BUDGET_SECONDS", "5"))
+BREAKER_WINDOW_SIZE = int(os.getenv("TRANSLATION_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("TRANSLATION_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("TRANSLATION_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("TRANSLATION_BREAKER_SLOW_CALL_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("TRANSLATION_BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_OPEN_SECONDS = float(os.getenv("TRANSLATION_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("TRANSLATION_BREAKER_HALF_OPEN_CALLS", "2"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Sliding-window circuit breaker tripping on failure rate or slow-call rate."""
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = BREAKER_WINDOW_SIZE,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        slow_call_rate: float = BREAKER_SLOW_CALL_RATE,
+        slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_calls: int = BREAKER_HALF_OPEN_CALLS
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._window: deque = deque(maxlen=window_size)  # (succeeded, duration)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "trips": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logger.info(f"Circuit '{self.name}' half-open: letting probe calls through")
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now. Every allowed call must be recorded."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_calls:
+                self._probes_in_flight += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record(self, succeeded: bool, duration: float) -> None:
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["failures"] += 0 if succeeded else 1
+            self._counters["slow_calls"] += 1 if slow else 0
+
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not succeeded or slow:
+                    self._trip()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = CLOSED
+                    self._window.clear()
+                    logger.info(f"Circuit '{self.name}' closed")
+                return
+
+            self._window.append((succeeded, duration))
+            if self._state == CLOSED and len(self._window) >= self.min_calls:
+                total = len(self._window)
+                failures = sum(1 for ok, _ in self._window if not ok)
+                slow_calls = sum(1 for _, d in self._window if d >= self.slow_call_seconds)
+                if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+                    self._trip()
+
+    def release(self) -> None:
+        """Give back a half-open probe slot for a call that was cancelled before completing."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        self._counters["trips"] += 1
+        logger.warning(f"Circuit '{self.name}' opened for {self.open_seconds:.0f}s")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            return {"name": self.name, "state": self._state, **self._counters}
+
+
+class CircuitBreakerProvider(TranslationProvider):
+    """Wraps a provider with a circuit breaker and a per-call latency budget."""
+
+    def __init__(self, provider: TranslationProvider, breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.provider_name = provider.provider_name
+        self.model_version = provider.model_version
+        self.breaker = breaker or CircuitBreaker(provider.provider_name)
+
+    def _fallback(self, text: str, target_lang: str, source_lang: Optional[str], error_code: str,
+                  title: Optional[str] = None) -> TranslationResult:
+        return TranslationResult(
+            translated_text=text,
+            translated_title=title,
+            source_lang=source_lang,
+            target_lang=target_lang,
+            provider=self.provider_name,
+            error_code=error_code,
+            success=False
+        )
+
+    async def _guarded(self, call, budget: float):
+        """Run a provider call under the breaker. Returns (result, error_code)."""
+        if not self.breaker.allow():
+            call.close()
+            return None, "circuit_open"
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call, timeout=budget)
+        except asyncio.TimeoutError:
+            self.breaker.record(False, time.monotonic() - started)
+            return None, "timeout"
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            logger.error(f"Translation provider call failed: {e}")
+            self.breaker.record(False, time.monotonic() - started)
+            return None, f"api_error:{type(e).__name__}"
+        self.breaker.record(_healthy(result), time.monotonic() - started)
+        return result, None
+
+    async def translate(
+        self,
+        text: str,
+        target_lang: str,
+        source_lang: Optional[str] = None,
+        title: Optional[str] = None
+    ) -> TranslationResult:
+        result, error_code = await self._guarded(
+            self.provider.translate(text=text, target_lang=target_lang, source_lang=source_lang, title=title),
+            TRANSLATION_CALL_BUDGET_SECONDS
+        )
+        return result if result is not None else self._fallback(text, target_lang, source_lang, error_code, title)
+
+    async def translate_batch(
+        self,
+        texts: List[str],
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> List[TranslationResult]:
+        results, error_code = await self._guarded(
+            self.provider.translate_batch(texts, target_lang, source_lang),
+            TRANSLATION_CALL_BUDGET_SECONDS
+        )
+        if results is not None:
+            return results
+        return [self._fallback(text, target_lang, source_lang, error_code) for text in texts]
+
+    async def translate_stream(
+        self,
+        text: str,
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream under the breaker. The budget applies to the wait for each piece,
+        and only the time to the first piece counts towards slow calls.
+        """
+        if not self.breaker.allow():
+            raise TranslationError("circuit_open")
+        started = time.monotonic()
+        first_piece_after = None
+        recorded = False
+        pieces = self.provider.translate_stream(text, target_lang, source_lang).__aiter__()
+        try:
+            while True:
+                try:
+                    piece = await asyncio.wait_for(pieces.__anext__(), timeout=TRANSLATION_CALL_BUDGET_SECONDS)
+                except StopAsyncIteration:
+                    break
+                if first_piece_after is None:
+                    first_piece_after = time.monotonic() - started
+                yield piece
+        except TranslationError as e:
+            recorded = True
+            self.breaker.record(e.error_code in PERMANENT_ERROR_CODES, time.monotonic() - started)
+            raise
+        except asyncio.TimeoutError:
+            recorded = True
+            self.breaker.record(False, time.monotonic() - started)
+            raise TranslationError("timeout")
+        except Exception as e:
+            logger.error(f"Translation provider stream failed: {e}")
+            recorded = True
+            self.breaker.record(False, time.monotonic() - started)
+            raise TranslationError(f"api_error:{type(e).__name__}")
+        else:
+            recorded = True
+            self.breaker.record(True, first_piece_after if first_piece_after is not None else time.monotonic() - started)
+        finally:
+            if not recorded:
+                # Consumer went away (cancelled / closed) mid-stream
+                self.breaker.release()
+            await pieces.aclose()
+    
+    async def detect_language(self, text: str) -> str:
+        result, _ = await self._guarded(self.provider.detect_language(text), TRANSLATION_DETECT_BUDGET_SECONDS)
+        return result if result is not None else "unknown"
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+
+def _healthy(result) -> bool:
+    """Whether a provider call outcome says the provider itself is healthy."""
+    results = result if isinstance(result, list) else [result]
+    return all(
+        not isinstance(r, TranslationResult) or r.success or r.error_code in PERMANENT_ERROR_CODES
+        for r in results
+    )
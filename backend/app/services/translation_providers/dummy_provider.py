@@ -15,6 +15,9 @@ class DummyTranslationProvider(TranslationProvider):
     
     provider_name = "dummy"
     
+    def __init__(self):
+        self.closed = False
+    
     async def translate(
         self,
         text: str,
@@ -42,3 +45,7 @@ class DummyTranslationProvider(TranslationProvider):
     def is_available(self) -> bool:
         """Dummy provider is always available."""
         return True
+    
+    async def aclose(self) -> None:
+        """Nothing is pooled; only records the shutdown like real providers."""
+        self.closed = True
@@ -1,12 +1,22 @@
 """OpenAI translation provider using GPT models."""
 import os
+import json
+import asyncio
 import logging
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
 from .base import TranslationProvider, TranslationResult
 
 logger = logging.getLogger(__name__)
 
+# Pooled HTTP client settings (one client per process, see registry.py)
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "10"))
+OPENAI_READ_TIMEOUT_SECONDS = float(os.getenv("OPENAI_READ_TIMEOUT_SECONDS", "60"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+# Upper bound on in-flight API calls across all callers in this process
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+
 # Supported languages
 SUPPORTED_LANGUAGES = {
     "ja": "Japanese",
@@ -24,22 +34,33 @@ class OpenAITranslationProvider(TranslationProvider):
     """Translation provider using OpenAI GPT models."""
     
     provider_name = "openai"
+    model = "gpt-4o-mini"
+    model_version = f"{model}/prompt-v1"
     
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self._client = None
+        self._semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
     
     def _get_client(self):
-        """Lazy initialization of OpenAI client."""
+        """Lazy initialization of the pooled OpenAI client (reused for the process lifetime)."""
         if self._client is None:
             try:
                 from openai import AsyncOpenAI
                 import httpx
-                # Set explicit timeout to avoid connection issues
-                timeout = httpx.Timeout(60.0, connect=30.0)
+                timeout = httpx.Timeout(OPENAI_READ_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS)
+                http_client = httpx.AsyncClient(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                        keepalive_expiry=OPENAI_KEEPALIVE_SECONDS
+                    )
+                )
                 self._client = AsyncOpenAI(
                     api_key=self.api_key,
-                    timeout=timeout
+                    timeout=timeout,
+                    http_client=http_client
                 )
                 logger.info(f"OpenAI client initialized with API key: {self.api_key[:10]}..." if self.api_key else "No API key")
             except ImportError:
@@ -47,6 +68,12 @@ class OpenAITranslationProvider(TranslationProvider):
                 raise
         return self._client
     
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.close()
+    
     def is_available(self) -> bool:
         """Check if OpenAI API key is configured."""
         return bool(self.api_key)
@@ -102,15 +129,16 @@ Text:
 
 If there is no title, just provide the translated text directly."""
 
-            response = await client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": content_to_translate}
-                ],
-                temperature=0.3,
-                max_tokens=4000
-            )
+            async with self._semaphore:
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": content_to_translate}
+                    ],
+                    temperature=0.3,
+                    max_tokens=4000
+                )
             
             result_text = response.choices[0].message.content.strip()
             
@@ -151,6 +179,121 @@ If there is no title, just provide the translated text directly."""
                 success=False
             )
     
+    async def translate_batch(
+        self,
+        texts: List[str],
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> List[TranslationResult]:
+        """Translate several short texts in one structured (JSON) request."""
+        if len(texts) <= 1 or not self.is_available() or target_lang not in SUPPORTED_LANGUAGES:
+            return await super().translate_batch(texts, target_lang, source_lang)
+        
+        target_lang_name = SUPPORTED_LANGUAGES[target_lang]
+        source_lang_name = SUPPORTED_LANGUAGES.get(source_lang, "the original language") if source_lang else "auto-detected language"
+        
+        try:
+            client = self._get_client()
+            
+            segments = json.dumps(
+                {"segments": [{"id": i, "text": text} for i, text in enumerate(texts)]},
+                ensure_ascii=False
+            )
+            system_prompt = f"""You are a professional translator. Each segment in the JSON input is an independent short text. Translate every segment's text from {source_lang_name} to {target_lang_name}.
+Keep the original meaning, tone, and style. Do not add explanations or notes.
+Respond with a JSON object of the form {{"translations": [{{"id": <segment id>, "text": "<translated text>"}}]}} containing every segment id exactly once."""
+            
+            async with self._semaphore:
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": segments}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.3,
+                    max_tokens=4000
+                )
+            
+            translated = {}
+            for item in json.loads(response.choices[0].message.content).get("translations", []):
+                if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+                    continue
+                # JSON mode often echoes ids as strings ("0")
+                try:
+                    segment_id = int(item.get("id"))
+                except (TypeError, ValueError):
+                    continue
+                if 0 <= segment_id < len(texts):
+                    translated[segment_id] = item["text"].strip()
+        
+        except Exception as e:
+            logger.error(f"OpenAI batch translation error: {e}")
+            return [
+                TranslationResult(
+                    translated_text=text,
+                    source_lang=source_lang,
+                    target_lang=target_lang,
+                    provider=self.provider_name,
+                    error_code=f"api_error:{type(e).__name__}",
+                    success=False
+                )
+                for text in texts
+            ]
+        
+        results: List[Optional[TranslationResult]] = [
+            TranslationResult(
+                translated_text=translated[i],
+                source_lang=source_lang,
+                target_lang=target_lang,
+                provider=self.provider_name,
+                success=True
+            ) if i in translated else None
+            for i in range(len(texts))
+        ]
+        
+        # Segments the model dropped are translated one by one
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            logger.warning(f"OpenAI batch translation omitted {len(missing)} of {len(texts)} segments")
+            retried = await super().translate_batch([texts[i] for i in missing], target_lang, source_lang)
+            for i, result in zip(missing, retried):
+                results[i] = result
+        return results
+    
+    async def translate_stream(
+        self,
+        text: str,
+        target_lang: str,
+        source_lang: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Translate text, yielding tokens as OpenAI streams them."""
+        if not self.is_available() or target_lang not in SUPPORTED_LANGUAGES:
+            async for chunk in super().translate_stream(text, target_lang, source_lang):
+                yield chunk
+            return
+        
+        target_lang_name = SUPPORTED_LANGUAGES[target_lang]
+        source_lang_name = SUPPORTED_LANGUAGES.get(source_lang, "the original language") if source_lang else "auto-detected language"
+        system_prompt = f"""You are a professional translator. Translate the following text from {source_lang_name} to {target_lang_name}.
+Keep the original meaning, tone, style and paragraph breaks. Respond with the translated text only, without explanations or notes."""
+        
+        client = self._get_client()
+        async with self._semaphore:
+            stream = await client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": text}
+                ],
+                temperature=0.3,
+                max_tokens=4000,
+                stream=True
+            )
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+    
     async def detect_language(self, text: str) -> str:
         """Detect language using OpenAI."""
         if not self.is_available():
@@ -159,18 +302,19 @@ If there is no title, just provide the translated text directly."""
         try:
             client = self._get_client()
             
-            response = await client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"Detect the language of the following text. Respond with only the ISO 639-1 language code (e.g., 'en', 'ja', 'ko', 'es', 'pt', 'fr', 'it', 'de'). If unsure, respond with 'unknown'."
-                    },
-                    {"role": "user", "content": text[:500]}  # Limit text length for detection
-                ],
-                temperature=0,
-                max_tokens=10
-            )
+            async with self._semaphore:
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": f"Detect the language of the following text. Respond with only the ISO 639-1 language code (e.g., 'en', 'ja', 'ko', 'es', 'pt', 'fr', 'it', 'de'). If unsure, respond with 'unknown'."
+                        },
+                        {"role": "user", "content": text[:500]}  # Limit text length for detection
+                    ],
+                    temperature=0,
+                    max_tokens=10
+                )
             
             detected = response.choices[0].message.content.strip().lower()
             
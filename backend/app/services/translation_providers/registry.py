@@ -0,0 +1,60 @@
+"""Process-wide translation provider registry.
+
+The configured provider is built once and shared by every caller, so the
+OpenAI provider's pooled HTTP client (keep-alive connections, timeouts and
+concurrency limit) is reused instead of re-created per translation. It is
+wrapped in a circuit breaker so an unhealthy provider fails fast.
+"""
+import logging
+import os
+import threading
+from typing import Optional
+
+from .base import TranslationProvider
+from .circuit_breaker import CircuitBreakerProvider
+from .dummy_provider import DummyTranslationProvider
+from .openai_provider import OpenAITranslationProvider
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderRegistry:
+    """Holds the shared provider instance from first use until app shutdown."""
+
+    def __init__(self):
+        self._provider: Optional[TranslationProvider] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> TranslationProvider:
+        """Get the configured provider, building it on first use."""
+        if self._provider is None:
+            with self._lock:
+                if self._provider is None:
+                    self._provider = CircuitBreakerProvider(self._build())
+        return self._provider
+
+    def metrics(self) -> Optional[dict]:
+        """Circuit breaker state and counters, or None before first use."""
+        provider = self._provider
+        return provider.breaker.metrics() if isinstance(provider, CircuitBreakerProvider) else None
+
+    def _build(self) -> TranslationProvider:
+        provider_name = os.getenv("TRANSLATION_PROVIDER", "openai").lower()
+
+        if provider_name == "openai":
+            provider = OpenAITranslationProvider()
+            if provider.is_available():
+                return provider
+            logger.warning("OpenAI provider not available, falling back to dummy")
+
+        return DummyTranslationProvider()
+
+    async def aclose(self) -> None:
+        """Close the shared provider. The next get() builds a fresh one."""
+        with self._lock:
+            provider, self._provider = self._provider, None
+        if provider is not None:
+            await provider.aclose()
+
+
+provider_registry = ProviderRegistry()
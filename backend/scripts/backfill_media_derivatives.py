@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Generate thumbnail / WebP derivatives for media assets uploaded before the
+derivative pipeline existed (or whose generation failed).
+
+    python scripts/backfill_media_derivatives.py [--retry-failed] [--limit N] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.models import MediaAsset
+from app.services.media_derivatives import STATUS_FAILED, derivatives_available, generate_derivatives, render_variants
+
+BATCH_SIZE = 100
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--retry-failed", action="store_true", help="also retry assets whose generation failed")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many assets")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="encoder processes")
+    args = parser.parse_args()
+
+    if not derivatives_available():
+        print("Pillow is not installed; nothing to do")
+        return 1
+
+    db = SessionLocal()
+    try:
+        query = db.query(MediaAsset.id).filter(MediaAsset.mime_type.like("image/%"))
+        if args.retry_failed:
+            query = query.filter((MediaAsset.derivatives_status.is_(None)) | (MediaAsset.derivatives_status == STATUS_FAILED))
+        else:
+            query = query.filter(MediaAsset.derivatives_status.is_(None))
+        asset_ids = [asset_id for (asset_id,) in query.order_by(MediaAsset.id).limit(args.limit).all()]
+    finally:
+        db.close()
+
+    print(f"Backfilling derivatives for {len(asset_ids)} assets with {args.workers} workers")
+    counts = {}
+    with ProcessPoolExecutor(args.workers) as processes, ThreadPoolExecutor(args.workers * 2) as threads:
+        def render(data):
+            return processes.submit(render_variants, data).result()
+
+        for start in range(0, len(asset_ids), BATCH_SIZE):
+            batch = asset_ids[start:start + BATCH_SIZE]
+            for status in threads.map(lambda asset_id: generate_derivatives(asset_id, render), batch):
+                counts[status] = counts.get(status, 0) + 1
+            print(f"  {min(start + BATCH_SIZE, len(asset_ids))}/{len(asset_ids)} {counts}")
+
+    print(f"✅ Done: {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
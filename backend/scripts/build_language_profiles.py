@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Build the character trigram profiles used by app/services/language_detection.py.
+
+Japanese and Korean are detected from their scripts, so only the Latin-script
+languages need a statistical profile. Re-run after editing the sample corpus:
+
+    python scripts/build_language_profiles.py
+"""
+
+import json
+import os
+import sys
+from collections import Counter
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.language_detection import PROFILES_PATH, extract_trigrams
+
+PROFILE_SIZE = 400
+
+SAMPLE_CORPUS = {
+    "en": """
+        Thank you so much for sharing your story with the community. I was really happy to read it.
+        We are going to meet at the station this weekend, and everyone is welcome to join us.
+        I think this is one of the best places in the city for a quiet coffee and a good book.
+        What do you think about the new event? Let me know if you have any questions.
+        She has been living here for three years and she would like to find new friends.
+        They said that the weather will be nice tomorrow, so we should go to the park.
+        It was a wonderful night and I hope that we can do it again very soon.
+        Please be kind to each other and respect the people who are sharing their experiences.
+        If you want to know more about the project, you can read the article on our website.
+        My partner and I have been together for five years, and we are getting married next spring.
+        There are many things that I would like to try, but I never have enough time.
+        Where is the best place to buy fresh flowers around here? I need them for a party.
+        Today I learned something new about the history of this neighborhood.
+        This ring was made by hand with a lot of care, and the price includes shipping.
+        """,
+    "es": """
+        Muchas gracias por compartir tu historia con la comunidad. Me hizo muy feliz leerla.
+        Vamos a encontrarnos en la estación este fin de semana y todos son bienvenidos.
+        Creo que este es uno de los mejores lugares de la ciudad para tomar un café tranquilo.
+        ¿Qué piensas del nuevo evento? Avísame si tienes alguna pregunta.
+        Ella vive aquí desde hace tres años y le gustaría encontrar nuevos amigos.
+        Dijeron que mañana hará buen tiempo, así que deberíamos ir al parque.
+        Fue una noche maravillosa y espero que podamos repetirlo muy pronto.
+        Por favor, sean amables los unos con los otros y respeten a las personas que comparten sus experiencias.
+        Si quieres saber más sobre el proyecto, puedes leer el artículo en nuestra página.
+        Mi pareja y yo llevamos cinco años juntos y nos vamos a casar la próxima primavera.
+        Hay muchas cosas que me gustaría probar, pero nunca tengo suficiente tiempo.
+        ¿Dónde está el mejor lugar para comprar flores frescas por aquí? Las necesito para una fiesta.
+        Hoy aprendí algo nuevo sobre la historia de este barrio.
+        Este anillo fue hecho a mano con mucho cuidado y el precio incluye el envío.
+        """,
+    "pt": """
+        Muito obrigado por compartilhar a sua história com a comunidade. Fiquei muito feliz em ler.
+        Vamos nos encontrar na estação neste fim de semana e todos são bem-vindos.
+        Acho que este é um dos melhores lugares da cidade para tomar um café tranquilo.
+        O que você acha do novo evento? Me avise se tiver alguma dúvida.
+        Ela mora aqui há três anos e gostaria de encontrar novos amigos.
+        Disseram que amanhã o tempo vai estar bom, então devemos ir ao parque.
+        Foi uma noite maravilhosa e espero que possamos fazer isso de novo em breve.
+        Por favor, sejam gentis uns com os outros e respeitem as pessoas que compartilham as suas experiências.
+        Se você quiser saber mais sobre o projeto, pode ler o artigo no nosso site.
+        Eu e o meu parceiro estamos juntos há cinco anos e vamos nos casar na próxima primavera.
+        Há muitas coisas que eu gostaria de experimentar, mas nunca tenho tempo suficiente.
+        Onde fica o melhor lugar para comprar flores frescas por aqui? Preciso delas para uma festa.
+        Hoje aprendi uma coisa nova sobre a história deste bairro.
+        Este anel foi feito à mão com muito cuidado e o preço inclui o envio. Não é ótimo?
+        """,
+    "fr": """
+        Merci beaucoup d'avoir partagé ton histoire avec la communauté. J'étais très heureux de la lire.
+        Nous allons nous retrouver à la gare ce week-end et tout le monde est le bienvenu.
+        Je pense que c'est l'un des meilleurs endroits de la ville pour prendre un café tranquille.
+        Qu'est-ce que tu penses du nouvel événement ? Dis-moi si tu as des questions.
+        Elle habite ici depuis trois ans et elle aimerait trouver de nouveaux amis.
+        Ils ont dit qu'il fera beau demain, alors nous devrions aller au parc.
+        C'était une soirée merveilleuse et j'espère que nous pourrons le refaire très bientôt.
+        Soyez gentils les uns avec les autres et respectez les personnes qui partagent leurs expériences.
+        Si vous voulez en savoir plus sur le projet, vous pouvez lire l'article sur notre site.
+        Mon partenaire et moi sommes ensemble depuis cinq ans et nous allons nous marier au printemps prochain.
+        Il y a beaucoup de choses que j'aimerais essayer, mais je n'ai jamais assez de temps.
+        Où est le meilleur endroit pour acheter des fleurs fraîches par ici ? J'en ai besoin pour une fête.
+        Aujourd'hui j'ai appris quelque chose de nouveau sur l'histoire de ce quartier.
+        Cette bague a été faite à la main avec beaucoup de soin et le prix comprend la livraison.
+        """,
+    "it": """
+        Grazie mille per aver condiviso la tua storia con la comunità. Sono stato molto felice di leggerla.
+        Ci incontriamo alla stazione questo fine settimana e tutti sono i benvenuti.
+        Penso che questo sia uno dei posti migliori della città per un caffè tranquillo.
+        Cosa ne pensi del nuovo evento? Fammi sapere se hai delle domande.
+        Lei vive qui da tre anni e vorrebbe trovare nuovi amici.
+        Hanno detto che domani farà bel tempo, quindi dovremmo andare al parco.
+        È stata una serata meravigliosa e spero che potremo rifarlo molto presto.
+        Per favore, siate gentili gli uni con gli altri e rispettate le persone che condividono le loro esperienze.
+        Se vuoi sapere di più sul progetto, puoi leggere l'articolo sul nostro sito.
+        Il mio compagno e io stiamo insieme da cinque anni e ci sposeremo la prossima primavera.
+        Ci sono tante cose che vorrei provare, ma non ho mai abbastanza tempo.
+        Dov'è il posto migliore per comprare fiori freschi qui vicino? Mi servono per una festa.
+        Oggi ho imparato qualcosa di nuovo sulla storia di questo quartiere.
+        Questo anello è stato fatto a mano con molta cura e il prezzo include la spedizione.
+        """,
+    "de": """
+        Vielen Dank, dass du deine Geschichte mit der Community geteilt hast. Ich habe mich sehr gefreut.
+        Wir treffen uns dieses Wochenende am Bahnhof und alle sind herzlich willkommen.
+        Ich glaube, das ist einer der besten Orte in der Stadt für einen ruhigen Kaffee.
+        Was hältst du von der neuen Veranstaltung? Sag mir Bescheid, wenn du Fragen hast.
+        Sie wohnt seit drei Jahren hier und würde gerne neue Freunde finden.
+        Sie haben gesagt, dass das Wetter morgen schön wird, also sollten wir in den Park gehen.
+        Es war ein wunderbarer Abend und ich hoffe, dass wir das bald wiederholen können.
+        Bitte seid freundlich zueinander und respektiert die Menschen, die ihre Erfahrungen teilen.
+        Wenn du mehr über das Projekt wissen möchtest, kannst du den Artikel auf unserer Seite lesen.
+        Mein Partner und ich sind seit fünf Jahren zusammen und wir heiraten im nächsten Frühling.
+        Es gibt viele Dinge, die ich gerne ausprobieren würde, aber ich habe nie genug Zeit.
+        Wo kann man hier am besten frische Blumen kaufen? Ich brauche sie für eine Party.
+        Heute habe ich etwas Neues über die Geschichte dieses Viertels gelernt.
+        Dieser Ring wurde mit viel Sorgfalt von Hand gefertigt und der Preis enthält den Versand.
+        """,
+}
+
+
+def build_profiles():
+    """Return the top trigrams of each language with their relative frequency."""
+    profiles = {}
+    for lang, corpus in SAMPLE_CORPUS.items():
+        counts = Counter(extract_trigrams(corpus))
+        total = sum(counts.values())
+        profiles[lang] = {gram: round(count / total, 6) for gram, count in counts.most_common(PROFILE_SIZE)}
+    return profiles
+
+
+if __name__ == "__main__":
+    with open(PROFILES_PATH, "w", encoding="utf-8") as f:
+        json.dump(build_profiles(), f, ensure_ascii=False, sort_keys=True)
+    print(f"✅ Wrote {PROFILES_PATH}")
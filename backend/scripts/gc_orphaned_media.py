@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Delete media objects and records that nothing references any more.
+
+    python scripts/gc_orphaned_media.py [--dry-run] [--grace-hours H] [--max-deletes N] [--rate N]
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.services.media_gc import GC_BATCH_SIZE, GC_DELETES_PER_SECOND, GC_GRACE_PERIOD, GC_MAX_DELETES, run_media_gc
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_PERIOD.total_seconds() / 3600,
+                        help="keep objects younger than this")
+    parser.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE, help="keys per delete request (max 1000)")
+    parser.add_argument("--max-deletes", type=int, default=GC_MAX_DELETES, help="stop after this many objects")
+    parser.add_argument("--rate", type=float, default=GC_DELETES_PER_SECOND, help="max deletes per second (0 = unlimited)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = run_media_gc(
+            db,
+            dry_run=args.dry_run,
+            grace_period=timedelta(hours=args.grace_hours),
+            batch_size=args.batch_size,
+            max_deletes=args.max_deletes,
+            deletes_per_second=args.rate,
+        )
+    finally:
+        db.close()
+
+    print(json.dumps(report.to_dict(), indent=2, ensure_ascii=False))
+    if report.limit_reached:
+        print(f"⚠️ Stopped at --max-deletes {args.max_deletes}; run again to continue")
+    print(f"✅ {'Dry run' if args.dry_run else 'Done'}: "
+          f"{report.orphaned_objects} orphaned objects ({report.orphaned_bytes} bytes), "
+          f"{report.orphaned_records} orphaned records")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
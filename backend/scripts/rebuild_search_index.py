@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Rebuild the unified search index (search_documents) from the source tables.
+
+    python scripts/rebuild_search_index.py [--type post --type blog ...]
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, engine
+from app.services.listing_search import ensure_listing_search
+from app.services.search_index import DOC_TYPES, rebuild_search_index
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--type", dest="types", action="append", choices=DOC_TYPES,
+                        help="only rebuild this document type (repeatable; default: all)")
+    args = parser.parse_args()
+
+    # Make sure the full-text columns / FTS tables exist before filling the index
+    with engine.begin() as conn:
+        ensure_listing_search(conn)
+
+    db = SessionLocal()
+    try:
+        counts = rebuild_search_index(db, args.types)
+    finally:
+        db.close()
+
+    for doc_type, count in counts.items():
+        print(f"  {doc_type}: {count}")
+    print(f"✅ Indexed {sum(counts.values())} documents")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Stock reservation for jewelry orders: no overselling under concurrent checkouts."""
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import stripe
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.auth import create_access_token
+from app.database import Base, get_db
+from app.main import app
+from app.services.inventory import OutOfStock, release_reservation, reserve_stock
+from app.services.jewelry_catalog import jewelry_catalog
+
+BUYERS = 24
+STOCK = 5
+ORDER_BODY = {"shipping_info": {"recipient_name": "buyer", "address": "Tokyo"}}
+
+
+@pytest.fixture
+def Session(tmp_path):
+    # A file database: each thread gets its own connection, like a real pool
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'jewelry.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    TestingSession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    # Every test database starts at catalog version 0
+    jewelry_catalog.clear()
+    try:
+        yield TestingSession
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        jewelry_catalog.clear()
+        engine.dispose()
+
+
+def _add_product(Session, stock, track_stock=True):
+    db = Session()
+    product = models.JewelryProduct(name="ring", description="d", price=1000, stock=stock, track_stock=track_stock)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+    return product_id
+
+
+def _add_buyers(Session, product_id, count):
+    """Premium users with the product in their cart. Returns their auth headers."""
+    db = Session()
+    headers = []
+    for n in range(count):
+        user = models.User(email=f"buyer{n}@example.com", password_hash="x", display_name=f"buyer{n}", membership_type="premium")
+        db.add(user)
+        db.flush()
+        cart = models.Cart(user_id=user.id)
+        db.add(cart)
+        db.flush()
+        db.add(models.CartItem(cart_id=cart.id, product_id=product_id, quantity=1))
+        headers.append({"Authorization": "Bearer " + create_access_token({"sub": user.email})})
+    db.commit()
+    db.close()
+    return headers
+
+
+def _stock(Session, product_id):
+    db = Session()
+    try:
+        return db.query(models.JewelryProduct.stock).filter(models.JewelryProduct.id == product_id).scalar()
+    finally:
+        db.close()
+
+
+def test_concurrent_checkouts_never_oversell(Session):
+    product_id = _add_product(Session, STOCK)
+    headers = _add_buyers(Session, product_id, BUYERS)
+    client = TestClient(app)
+    start = threading.Barrier(BUYERS)
+
+    def checkout(h):
+        start.wait()
+        return client.post("/jewelry/orders", json=ORDER_BODY, headers=h).status_code
+
+    with ThreadPoolExecutor(max_workers=BUYERS) as pool:
+        codes = list(pool.map(checkout, headers))
+
+    assert codes.count(200) == STOCK
+    assert codes.count(409) == BUYERS - STOCK
+    assert _stock(Session, product_id) == 0
+    db = Session()
+    try:
+        sold = db.query(func.sum(models.OrderItem.quantity)).filter(models.OrderItem.product_id == product_id).scalar()
+        assert sold == STOCK
+        # Losers keep their cart
+        assert db.query(models.CartItem).count() == BUYERS - STOCK
+    finally:
+        db.close()
+
+
+def test_sold_out_tracked_product_is_not_unlimited(Session):
+    product_id = _add_product(Session, 1)
+    first, second = _add_buyers(Session, product_id, 2)
+    client = TestClient(app)
+
+    assert client.post("/jewelry/orders", json=ORDER_BODY, headers=first).status_code == 200
+    response = client.post("/jewelry/orders", json=ORDER_BODY, headers=second)
+    assert response.status_code == 409
+    assert "残り0個" in response.json()["detail"]
+
+
+def test_untracked_stock_is_unlimited(Session):
+    product_id = _add_product(Session, 0, track_stock=False)
+    db = Session()
+    reserve_stock(db, {product_id: 100})
+    db.commit()
+    db.close()
+    assert _stock(Session, product_id) == 0
+
+
+def test_release_puts_stock_back_once(Session):
+    product_id = _add_product(Session, 3)
+    (headers,) = _add_buyers(Session, product_id, 1)
+    client = TestClient(app)
+    order = client.post("/jewelry/orders", json=ORDER_BODY, headers=headers).json()
+    assert order["reserved_until"] is not None
+    assert _stock(Session, product_id) == 2
+
+    db = Session()
+    row = db.get(models.Order, order["id"])
+    row.reserved_until = datetime.now(timezone.utc) - timedelta(minutes=1)
+    db.commit()
+    assert release_reservation(db, row) is True
+    db.commit()
+    assert release_reservation(db, row) is False
+    db.commit()
+    assert db.get(models.Order, order["id"]).status == "cancelled"
+    db.close()
+    assert _stock(Session, product_id) == 3
+
+    with pytest.raises(OutOfStock):
+        db = Session()
+        try:
+            reserve_stock(db, {product_id: 4})
+        finally:
+            db.rollback()
+            db.close()
+
+
+@pytest.fixture
+def late_payment(Session, monkeypatch):
+    """
+    An order whose reservation was released (expired) before its payment
+    succeeded. Returns (client, buyer headers, order id, product id, refunds).
+    """
+    product_id = _add_product(Session, 1)
+    (headers,) = _add_buyers(Session, product_id, 1)
+    client = TestClient(app)
+    order_id = client.post("/jewelry/orders", json=ORDER_BODY, headers=headers).json()["id"]
+
+    db = Session()
+    order = db.get(models.Order, order_id)
+    order.stripe_payment_intent_id = "pi_late"
+    db.commit()
+    assert release_reservation(db, order) is True
+    db.commit()
+    db.close()
+
+    refunds = []
+    monkeypatch.setenv("STRIPE_SECRET_KEY", "sk_test")
+    monkeypatch.setattr(
+        stripe.PaymentIntent, "retrieve",
+        lambda intent_id, **kwargs: types.SimpleNamespace(id=intent_id, status="succeeded", latest_charge="ch_late"),
+    )
+    monkeypatch.setattr(stripe.Refund, "create", lambda **kwargs: refunds.append(kwargs))
+    return client, headers, order_id, product_id, refunds
+
+
+def _confirm(client, headers, order_id):
+    return client.post(
+        "/jewelry/payments/confirm",
+        json={"order_id": order_id, "payment_intent_id": "pi_late"},
+        headers=headers,
+    )
+
+
+def _order_status(Session, order_id):
+    db = Session()
+    try:
+        return db.get(models.Order, order_id).status
+    finally:
+        db.close()
+
+
+def _sell_out(Session, product_id):
+    db = Session()
+    db.get(models.JewelryProduct, product_id).stock = 0
+    db.commit()
+    db.close()
+
+
+def test_late_payment_takes_the_stock_again(Session, late_payment):
+    client, headers, order_id, product_id, refunds = late_payment
+    assert _stock(Session, product_id) == 1
+
+    assert _confirm(client, headers, order_id).status_code == 200
+    assert _order_status(Session, order_id) == "paid"
+    assert _stock(Session, product_id) == 0
+    assert refunds == []
+
+
+def test_late_payment_for_sold_out_stock_is_refunded(Session, late_payment):
+    client, headers, order_id, product_id, refunds = late_payment
+    _sell_out(Session, product_id)  # bought by someone else after the release
+
+    response = _confirm(client, headers, order_id)
+    assert response.status_code == 409
+    assert _order_status(Session, order_id) == "refunded"
+    assert refunds == [{"payment_intent": "pi_late"}]
+    assert _stock(Session, product_id) == 0
+
+    # Confirming again neither refunds twice nor marks it paid
+    assert _confirm(client, headers, order_id).status_code == 409
+    assert len(refunds) == 1
+    assert _order_status(Session, order_id) == "refunded"
+
+
+def test_late_payment_refund_failure_needs_admin_attention(Session, late_payment, monkeypatch):
+    client, headers, order_id, product_id, refunds = late_payment
+    _sell_out(Session, product_id)
+
+    def fail_refund(**kwargs):
+        raise stripe.error.APIConnectionError("down")
+
+    monkeypatch.setattr(stripe.Refund, "create", fail_refund)
+
+    assert _confirm(client, headers, order_id).status_code == 409
+    assert _order_status(Session, order_id) == "needs_attention"
+    assert _stock(Session, product_id) == 0
+
+    db = Session()
+    admin = models.User(email="admin@example.com", password_hash="x", display_name="admin", membership_type="admin")
+    db.add(admin)
+    db.commit()
+    db.close()
+    admin_headers = {"Authorization": "Bearer " + create_access_token({"sub": "admin@example.com"})}
+    flagged = client.get("/jewelry/admin/orders", headers=admin_headers).json()
+    assert [o["id"] for o in flagged] == [order_id]
+    assert client.get("/jewelry/admin/orders", headers=headers).status_code == 403
+
@@ -0,0 +1,123 @@
+"""Keyword search over flea market and art listings on SQLite FTS5 (trigram)."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.database import Base, get_db
+from app.main import app
+from app.services.listing_search import ensure_listing_search, keyword_terms
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_listing_search(conn)
+    TestingSession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db = TestingSession()
+    db.add(models.User(email="seller@example.com", password_hash="x", display_name="seller"))
+    db.commit()
+    db.close()
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield TestingSession
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+def _add_flea(Session, title, description, price=1000):
+    db = Session()
+    item = models.FleaMarketItem(seller_id=1, title=title, description=description, price=price, category="other")
+    db.add(item)
+    db.commit()
+    item_id = item.id
+    db.close()
+    return item_id
+
+
+def _titles(client, path="/api/flea-market/items", **params):
+    response = client.get(path, params=params)
+    assert response.status_code == 200, response.text
+    return [item["title"] for item in response.json()]
+
+
+def test_keyword_terms():
+    assert keyword_terms("  レザー　ジャケット  レザー ") == ["レザー", "ジャケット"]
+    assert keyword_terms(None) == []
+
+
+def test_title_matches_rank_above_description_matches(Session):
+    _add_flea(Session, "古着まとめ売り", "ヴィンテージのレザージャケットも入っています")
+    _add_flea(Session, "レザージャケット ヴィンテージ", "状態良好です")
+    _add_flea(Session, "キャンプ用品", "テントとランタン")
+    client = TestClient(app)
+
+    assert _titles(client, keyword="レザージャケット") == ["レザージャケット ヴィンテージ", "古着まとめ売り"]
+    # Every term has to match
+    assert _titles(client, keyword="レザー 良好") == ["レザージャケット ヴィンテージ"]
+    assert _titles(client, keyword="ダウンジャケット") == []
+
+
+def test_other_sorts_keep_the_keyword_filter(Session):
+    _add_flea(Session, "レザー財布", "本革", price=5000)
+    _add_flea(Session, "レザーベルト", "本革", price=2000)
+    _add_flea(Session, "木製の椅子", "北欧風", price=1000)
+    client = TestClient(app)
+
+    assert _titles(client, keyword="レザー", sort="price_asc") == ["レザーベルト", "レザー財布"]
+
+
+def test_short_terms_fall_back_to_like(Session):
+    _add_flea(Session, "革靴", "26cm")
+    _add_flea(Session, "スニーカー", "27cm")
+    client = TestClient(app)
+
+    # Two characters: shorter than a trigram
+    assert _titles(client, keyword="革靴") == ["革靴"]
+    assert sorted(_titles(client, keyword="cm")) == sorted(["スニーカー", "革靴"])
+    # LIKE wildcards in the keyword are literal
+    assert _titles(client, keyword="%") == []
+
+
+def test_index_follows_updates_and_deletes(Session):
+    item_id = _add_flea(Session, "マウンテンバイク", "通勤に")
+    client = TestClient(app)
+    assert _titles(client, keyword="マウンテン") == ["マウンテンバイク"]
+
+    db = Session()
+    db.get(models.FleaMarketItem, item_id).title = "ロードバイク"
+    db.commit()
+    assert _titles(client, keyword="マウンテン") == []
+    assert _titles(client, keyword="ロードバイク") == ["ロードバイク"]
+
+    db.delete(db.get(models.FleaMarketItem, item_id))
+    db.commit()
+    db.close()
+    assert _titles(client, keyword="ロードバイク") == []
+
+
+def test_art_listings_are_searchable(Session):
+    db = Session()
+    db.add_all([
+        models.ArtSaleItem(seller_id=1, title="夜明けの海", description="油彩 F10", price=50000, category="painting"),
+        models.ArtSaleItem(seller_id=1, title="森の小道", description="水彩で描いた海辺の朝", price=20000, category="painting"),
+    ])
+    db.commit()
+    db.close()
+    client = TestClient(app)
+
+    assert _titles(client, "/api/art-sales/items", keyword="夜明けの海") == ["夜明けの海"]
+    assert _titles(client, "/api/art-sales/items", keyword="油彩") == ["夜明けの海"]
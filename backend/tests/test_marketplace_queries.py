@@ -0,0 +1,113 @@
+"""Query-count regression tests for the marketplace listing endpoints.
+
+Each listing must cost a constant number of queries however many items the
+page holds (images via selectinload, sellers in one batched lookup).
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.auth import create_access_token
+from app.database import Base, get_db
+from app.main import app
+
+
+@pytest.fixture
+def db_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    TestingSession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield engine, TestingSession
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+def _seed_sellers(Session):
+    """Three sellers with profiles. Returns their ids and a token for the first one."""
+    db = Session()
+    seller_ids = []
+    for n in range(3):
+        user = models.User(email=f"seller{n}@example.com", password_hash="x", display_name=f"seller{n}", membership_type="premium")
+        db.add(user)
+        db.flush()
+        db.add(models.Profile(user_id=user.id, handle=f"seller{n}", avatar_url=f"/media/avatar{n}.jpg"))
+        seller_ids.append(user.id)
+    db.commit()
+    db.close()
+    return seller_ids, {"Authorization": "Bearer " + create_access_token({"sub": "seller0@example.com"})}
+
+
+def _add_items(Session, seller_ids, count):
+    """Flea market and art items spread over the sellers, each with two images."""
+    db = Session()
+    for i in range(count):
+        seller_id = seller_ids[i % len(seller_ids)]
+        flea = models.FleaMarketItem(seller_id=seller_id, title=f"item {i}", description="d", price=100, category="other")
+        art = models.ArtSaleItem(seller_id=seller_id, title=f"art {i}", description="d", price=100, category="painting")
+        db.add_all([flea, art])
+        db.flush()
+        for order in range(2):
+            db.add(models.FleaMarketItemImage(item_id=flea.id, image_url=f"/media/f{flea.id}_{order}.jpg", display_order=order))
+            db.add(models.ArtSaleItemImage(item_id=art.id, image_url=f"/media/a{art.id}_{order}.jpg", display_order=order))
+    db.commit()
+    db.close()
+
+
+def _count_queries(engine, request):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = request()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()
+
+
+@pytest.mark.parametrize(
+    "path, needs_auth, max_queries",
+    [
+        # items, images, media assets (thumbnails), sellers
+        ("/api/flea-market/items?limit=100", False, 4),
+        # + current user, own profile
+        ("/api/flea-market/my-items", True, 5),
+        # items, images, sellers
+        ("/api/art-sales/items?limit=100", False, 3),
+        # current user, items, images, own profile
+        ("/api/art-sales/my-items", True, 4),
+    ],
+)
+def test_listing_query_count_is_constant(db_engine, path, needs_auth, max_queries):
+    engine, Session = db_engine
+    client = TestClient(app)
+
+    seller_ids, token = _seed_sellers(Session)
+    headers = token if needs_auth else {}
+    _add_items(Session, seller_ids, 3)
+    small_count, small = _count_queries(engine, lambda: client.get(path, headers=headers))
+    _add_items(Session, seller_ids, 60)
+    large_count, large = _count_queries(engine, lambda: client.get(path, headers=headers))
+
+    assert len(large) > len(small)
+    assert all(len(item["images"]) == 2 for item in large)
+    assert all(item["user_display_name"] and item["user_avatar_url"] for item in large)
+    assert large_count == small_count
+    assert large_count <= max_queries
@@ -0,0 +1,173 @@
+"""Content-hash deduplication and reference counting of uploaded media."""
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.auth import create_access_token
+from app.database import Base, get_db
+from app.main import app
+from app.services import media_assets
+from app.services.storage import LocalStorageBackend, media_storage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+OTHER_PNG = b"\x89PNG\r\n\x1a\n" + b"\x01" * 64
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    """In-memory database and local storage under tmp_path. Returns (client, headers, Session, media_dir)."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    media_dir = tmp_path / "media"
+    monkeypatch.setattr(media_storage, "backend", LocalStorageBackend(media_dir))
+    app.dependency_overrides[get_db] = override_get_db
+
+    db = Session()
+    db.add(models.User(email="owner@example.com", password_hash="x", display_name="owner"))
+    db.commit()
+    db.close()
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "owner@example.com"})}
+    try:
+        yield TestClient(app), headers, Session, media_dir
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+def _upload(client, headers, content=PNG):
+    response = client.post("/api/media/upload", files={"file": ("a.png", content, "image/png")}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _stored_files(media_dir):
+    return sorted(p.name for p in media_dir.rglob("*") if p.is_file())
+
+
+def _asset(Session, asset_id):
+    db = Session()
+    try:
+        return db.get(models.MediaAsset, asset_id)
+    finally:
+        db.close()
+
+
+def _add_post(Session, media_id):
+    db = Session()
+    post = models.Post(user_id=1, body="with image", media_id=media_id)
+    db.add(post)
+    db.commit()
+    post_id = post.id
+    db.close()
+    return post_id
+
+
+def test_identical_uploads_share_one_asset(media):
+    client, headers, Session, media_dir = media
+    first = _upload(client, headers)
+    second = _upload(client, headers)
+    other = _upload(client, headers, OTHER_PNG)
+
+    assert second == first
+    assert other["id"] != first["id"]
+    assert _asset(Session, first["id"]).ref_count == 2
+    # The duplicate's object was dropped
+    assert len(_stored_files(media_dir)) == 2
+
+
+def test_post_delete_releases_one_reference(media):
+    client, headers, Session, media_dir = media
+    uploaded = _upload(client, headers)
+    asset_id = uploaded["id"]
+    _upload(client, headers)
+    first_post, second_post = _add_post(Session, asset_id), _add_post(Session, asset_id)
+
+    assert client.delete(f"/api/posts/{first_post}", headers=headers).status_code == 200
+    assert _asset(Session, asset_id).ref_count == 1
+    assert len(_stored_files(media_dir)) == 1
+
+    assert client.delete(f"/api/posts/{second_post}", headers=headers).status_code == 200
+    assert _asset(Session, asset_id) is None
+    assert _stored_files(media_dir) == []
+
+    # Uploading the content again starts a new asset (SQLite may reuse the id)
+    again = _upload(client, headers)
+    assert again["url"] != uploaded["url"]
+    assert _asset(Session, again["id"]).ref_count == 1
+
+
+def test_media_delete_keeps_the_object_until_the_last_reference(media):
+    client, headers, Session, media_dir = media
+    asset_id = _upload(client, headers)["id"]
+    _upload(client, headers)
+
+    assert client.delete(f"/api/media/{asset_id}", headers=headers).json() == {"status": "released", "ref_count": 1}
+    assert len(_stored_files(media_dir)) == 1
+    assert client.delete(f"/api/media/{asset_id}", headers=headers).json() == {"status": "deleted"}
+    assert _stored_files(media_dir) == []
+
+
+def test_reupload_repairs_a_missing_asset(media):
+    client, headers, Session, media_dir = media
+    original = _upload(client, headers)
+    for path in media_dir.rglob("*.png"):
+        path.unlink()
+    db = Session()
+    db.get(models.MediaAsset, original["id"]).missing_at = datetime.now(timezone.utc)
+    db.commit()
+    db.close()
+
+    repaired = _upload(client, headers)
+    assert repaired["id"] == original["id"]
+    assert repaired["url"] != original["url"]
+    # The new upload is kept and is now the asset's object
+    assert len(_stored_files(media_dir)) == 1
+    asset = _asset(Session, original["id"])
+    assert asset.missing_at is None
+    assert asset.url == repaired["url"]
+    assert asset.ref_count == 2
+
+    listed = client.get("/api/media/user/images", headers=headers).json()["items"]
+    assert [item["id"] for item in listed] == [original["id"]]
+
+
+def test_duplicate_released_during_registration_gets_a_new_asset(media, monkeypatch):
+    client, headers, Session, media_dir = media
+    uploaded = _upload(client, headers)
+    asset_id = uploaded["id"]
+    find_duplicate = media_assets.find_duplicate
+    released = []
+
+    def find_then_release(db, user_id, content_hash):
+        duplicate = find_duplicate(db, user_id, content_hash)
+        if duplicate is not None and not released:
+            # The last reference goes away between the lookup and add_reference
+            other = Session()
+            media_assets.release_media(other, other.get(models.MediaAsset, duplicate.id))
+            other.close()
+            released.append(duplicate.id)
+        return duplicate
+
+    monkeypatch.setattr(media_assets, "find_duplicate", find_then_release)
+
+    again = _upload(client, headers)
+    assert released == [asset_id]
+    # A new asset holding the new upload, not a reference to the deleted one
+    assert again["url"] != uploaded["url"]
+    assert _asset(Session, again["id"]).url == again["url"]
+    assert _asset(Session, again["id"]).ref_count == 1
+    assert len(_stored_files(media_dir)) == 1
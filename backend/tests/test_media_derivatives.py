@@ -0,0 +1,116 @@
+"""Thumbnail and WebP derivatives of uploaded images."""
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import database, models
+from app.database import Base
+from app.services.media_assets import release_media
+from app.services.media_derivatives import (
+    DERIVATIVE_WIDTHS, STATUS_FAILED, STATUS_READY, STATUS_UNSUPPORTED, generate_derivatives, thumb_url_for
+)
+from app.services.storage import LocalStorageBackend, media_storage
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    TestingSession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    # generate_derivatives opens its own session
+    monkeypatch.setattr(database, "SessionLocal", TestingSession)
+    monkeypatch.setattr(media_storage, "backend", LocalStorageBackend(tmp_path / "media"))
+
+    db = TestingSession()
+    db.add(models.User(email="owner@example.com", password_hash="x", display_name="owner"))
+    db.commit()
+    db.close()
+    try:
+        yield TestingSession
+    finally:
+        engine.dispose()
+
+
+def _jpeg_with_exif(width, height):
+    image = Image.new("RGB", (width, height), (200, 40, 90))
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCamera"  # Make
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+def _add_asset(Session, key, data, mime_type="image/jpeg"):
+    url = media_storage.put_object(key, data, mime_type)
+    db = Session()
+    asset = models.MediaAsset(user_id=1, url=url, mime_type=mime_type, size_bytes=len(data))
+    db.add(asset)
+    db.commit()
+    asset_id = asset.id
+    db.close()
+    return asset_id
+
+
+def _get(Session, asset_id):
+    db = Session()
+    try:
+        return db.get(models.MediaAsset, asset_id)
+    finally:
+        db.close()
+
+
+def test_derivatives_are_resized_and_stripped(Session):
+    asset_id = _add_asset(Session, "media/photo.jpg", _jpeg_with_exif(2000, 1000))
+
+    assert generate_derivatives(asset_id) == STATUS_READY
+    asset = _get(Session, asset_id)
+    assert asset.derivatives_status == STATUS_READY
+    assert set(asset.variants) == set(DERIVATIVE_WIDTHS)
+    assert thumb_url_for(asset) == asset.variants["thumb"]["webp"]
+
+    for name, width in DERIVATIVE_WIDTHS.items():
+        variant = asset.variants[name]
+        assert variant["width"] == width
+        with Image.open(io.BytesIO(media_storage.get_object(media_storage.key_for_url(variant["webp"])))) as webp:
+            assert webp.format == "WEBP"
+            assert webp.size == (width, width // 2)
+        with Image.open(io.BytesIO(media_storage.get_object(media_storage.key_for_url(variant["jpeg"])))) as jpeg:
+            assert jpeg.format == "JPEG"
+            assert not jpeg.getexif()
+
+
+def test_small_images_are_not_upscaled(Session):
+    asset_id = _add_asset(Session, "media/small.jpg", _jpeg_with_exif(200, 100))
+
+    assert generate_derivatives(asset_id) == STATUS_READY
+    assert {v["width"] for v in _get(Session, asset_id).variants.values()} == {200}
+
+
+def test_unreadable_and_non_image_assets(Session):
+    broken = _add_asset(Session, "media/broken.jpg", b"\xff\xd8\xff not really a jpeg")
+    pdf = _add_asset(Session, "media/guide.pdf", b"%PDF-1.4", mime_type="application/pdf")
+
+    assert generate_derivatives(broken) == STATUS_FAILED
+    assert generate_derivatives(pdf) == STATUS_UNSUPPORTED
+    assert _get(Session, broken).variants is None
+    # Without derivatives the original is the thumbnail
+    assert thumb_url_for(_get(Session, broken)) == _get(Session, broken).url
+    assert generate_derivatives(12345) is None
+
+
+def test_releasing_the_asset_deletes_its_derivatives(Session):
+    asset_id = _add_asset(Session, "media/photo.jpg", _jpeg_with_exif(800, 600))
+    generate_derivatives(asset_id)
+    keys = [media_storage.key_for_url(v[fmt]) for v in _get(Session, asset_id).variants.values() for fmt in ("webp", "jpeg")]
+    assert all(media_storage.object_size(key) for key in keys)
+
+    db = Session()
+    assert release_media(db, db.get(models.MediaAsset, asset_id)) is True
+    db.close()
+    assert media_storage.object_size("media/photo.jpg") is None
+    assert all(media_storage.object_size(key) is None for key in keys)
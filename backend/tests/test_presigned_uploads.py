@@ -0,0 +1,126 @@
+"""Direct uploads: ticket, signed PUT (the local stand-in for S3) and finalize."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.auth import SECRET_KEY, create_access_token
+from app.database import Base, get_db
+from app.main import app
+from app.routers import media as media_router
+from app.services.presigned_upload import LocalUploadSigner
+from app.services.storage import LocalStorageBackend, media_storage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def direct(tmp_path, monkeypatch):
+    """In-memory database, local storage and the local signer. Returns (client, headers, Session, media_dir)."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    media_dir = tmp_path / "media"
+    monkeypatch.setattr(media_storage, "backend", LocalStorageBackend(media_dir))
+    monkeypatch.setattr(media_router, "upload_signer", LocalUploadSigner(SECRET_KEY))
+    app.dependency_overrides[get_db] = override_get_db
+
+    db = Session()
+    db.add_all([
+        models.User(email="owner@example.com", password_hash="x", display_name="owner"),
+        models.User(email="other@example.com", password_hash="x", display_name="other"),
+    ])
+    db.commit()
+    db.close()
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "owner@example.com"})}
+    try:
+        yield TestClient(app), headers, Session, media_dir
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+def _ticket(client, headers, content=PNG, content_type="image/png"):
+    response = client.post("/api/media/uploads", json={"content_type": content_type, "size_bytes": len(content)}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _put(client, ticket, content=PNG):
+    return client.put(ticket["upload_url"], content=content, headers=ticket["headers"])
+
+
+def _finalize(client, headers, key):
+    return client.post("/api/media/uploads/finalize", json={"key": key}, headers=headers)
+
+
+def test_direct_upload_roundtrip(direct):
+    client, headers, Session, media_dir = direct
+    ticket = _ticket(client, headers)
+    assert ticket["key"].startswith("media/uploads/1/")
+    assert _put(client, ticket).status_code == 200
+
+    asset = _finalize(client, headers, ticket["key"]).json()
+    assert asset["url"] == "/" + ticket["key"]
+    assert (media_dir / ticket["key"].split("/", 1)[1]).read_bytes() == PNG
+
+    # A retried finalize returns the same asset
+    assert _finalize(client, headers, ticket["key"]).json() == asset
+    db = Session()
+    row = db.get(models.MediaAsset, asset["id"])
+    assert (row.mime_type, row.size_bytes, row.ref_count) == ("image/png", len(PNG), 1)
+    assert row.content_hash is not None
+    db.close()
+
+
+def test_direct_reupload_reuses_the_asset(direct):
+    client, headers, Session, media_dir = direct
+    first_ticket, second_ticket = _ticket(client, headers), _ticket(client, headers)
+    _put(client, first_ticket)
+    _put(client, second_ticket)
+
+    first = _finalize(client, headers, first_ticket["key"]).json()
+    second = _finalize(client, headers, second_ticket["key"]).json()
+    assert second == first
+    db = Session()
+    assert db.query(models.MediaAsset).count() == 1
+    assert db.get(models.MediaAsset, first["id"]).ref_count == 2
+    db.close()
+    # Only the first object is kept
+    assert [p.name for p in media_dir.rglob("*") if p.is_file()] == [first["url"].rsplit("/", 1)[1]]
+
+
+def test_signed_put_rejects_a_different_body(direct):
+    client, headers, Session, media_dir = direct
+    ticket = _ticket(client, headers)
+    assert _put(client, ticket, PNG + b"extra").status_code == 400
+    assert client.put(ticket["upload_url"] + "0", content=PNG, headers=ticket["headers"]).status_code == 403
+    assert not list(media_dir.rglob("*.png"))
+
+
+def test_finalize_checks_owner_and_content(direct):
+    client, headers, Session, media_dir = direct
+    other = {"Authorization": "Bearer " + create_access_token({"sub": "other@example.com"})}
+    ticket = _ticket(client, headers)
+    _put(client, ticket)
+    assert _finalize(client, other, ticket["key"]).status_code == 403
+
+    fake = b"GIF89a" + b"\x00" * 64
+    bad_ticket = _ticket(client, headers, fake, "image/png")
+    assert _put(client, bad_ticket, fake).status_code == 200
+    response = _finalize(client, headers, bad_ticket["key"])
+    assert response.status_code == 400
+    # Rejected objects are deleted
+    assert not (media_dir / bad_ticket["key"].split("/", 1)[1]).exists()
+
+    assert _finalize(client, headers, "media/uploads/1/never-uploaded.png").status_code == 400
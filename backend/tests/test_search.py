@@ -0,0 +1,151 @@
+"""/api/search over the unified search index on SQLite."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.auth import create_access_token
+from app.database import Base, get_db
+from app.main import app
+from app.services.listing_search import ensure_listing_search
+from app.services.search_index import rebuild_search_index, sync_search_document
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_listing_search(conn)
+    TestingSession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db = TestingSession()
+    db.add(models.User(email="member@example.com", password_hash="x", display_name="member"))
+    db.commit()
+    db.close()
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield TestingSession
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+MEMBER = {"Authorization": "Bearer " + create_access_token({"sub": "member@example.com"})}
+
+
+def _seed(Session, *rows):
+    db = Session()
+    db.add_all(rows)
+    db.commit()
+    rebuild_search_index(db)
+    db.close()
+
+
+def _post(title, body, **kwargs):
+    return models.Post(user_id=1, title=title, body=body, **kwargs)
+
+
+def _search(client, headers=None, **params):
+    response = client.get("/api/search", params=params, headers=headers or {})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _titles(client, headers=None, **params):
+    return sorted(hit["title"] for hit in _search(client, headers, **params)["items"])
+
+
+def test_visibility(Session):
+    _seed(
+        Session,
+        _post("公開の山歩き", "週末のハイキング"),
+        _post("会員の山歩き", "会員向けのハイキング記録", visibility="members"),
+        _post("非公開の山歩き", "自分用のハイキングメモ", visibility="private"),
+        _post("下書きの山歩き", "書きかけのハイキング", status="draft"),
+    )
+    client = TestClient(app)
+
+    assert _titles(client, q="ハイキング") == ["公開の山歩き"]
+    assert _titles(client, MEMBER, q="ハイキング") == ["会員の山歩き", "公開の山歩き"]
+
+
+def test_unpublishing_removes_the_document(Session):
+    _seed(Session, _post("公開の山歩き", "週末のハイキング"))
+    client = TestClient(app)
+    assert _titles(client, q="ハイキング") == ["公開の山歩き"]
+
+    db = Session()
+    post = db.query(models.Post).one()
+    post.visibility = "private"
+    db.commit()
+    sync_search_document(db, post)
+    db.close()
+    assert _titles(client, q="ハイキング") == []
+
+
+def test_type_filter(Session):
+    _seed(
+        Session,
+        _post("キャンプの記録", "湖畔でキャンプをしました"),
+        models.FleaMarketItem(seller_id=1, title="キャンプ用テント", description="2人用", price=8000, category="other"),
+        models.FleaMarketItem(seller_id=1, title="キャンプ用チェア", description="売約済み", price=3000, category="other", status="sold"),
+    )
+    client = TestClient(app)
+
+    hits = _search(client, q="キャンプ")["items"]
+    assert sorted(hit["type"] for hit in hits) == ["flea_market_item", "post"]
+    assert _titles(client, q="キャンプ", types="flea_market_item") == ["キャンプ用テント"]
+    assert _titles(client, q="キャンプ", types="post, blog") == ["キャンプの記録"]
+
+    response = client.get("/api/search", params={"q": "キャンプ", "types": "post,recipe"})
+    assert response.status_code == 400
+    assert "recipe" in response.json()["detail"]
+
+
+def test_title_matches_rank_first(Session):
+    _seed(
+        Session,
+        _post("旅の雑記", "途中で温泉旅館に泊まりました"),
+        _post("温泉旅館めぐり", "箱根と草津"),
+    )
+    hits = _search(TestClient(app), q="温泉旅館")["items"]
+    assert [hit["title"] for hit in hits] == ["温泉旅館めぐり", "旅の雑記"]
+    assert hits[0]["score"] >= hits[1]["score"]
+    assert "温泉旅館" in hits[1]["snippet"]
+
+
+@pytest.mark.parametrize("q", ["ハイキング", "山"])
+def test_cursor_paging_visits_every_hit_once(Session, q):
+    # "山" is shorter than a trigram: LIKE fallback with a constant score
+    _seed(Session, *[_post(f"山のハイキング {i}", "ハイキング" * (i + 1)) for i in range(7)])
+    client = TestClient(app)
+
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"q": q, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = _search(client, **params)
+        assert len(page["items"]) <= 3
+        seen.extend(hit["id"] for hit in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == 7
+    assert seen == [hit["id"] for hit in _search(client, q=q, limit=50)["items"]]
+
+
+def test_invalid_cursor(Session):
+    response = TestClient(app).get("/api/search", params={"q": "ハイキング", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
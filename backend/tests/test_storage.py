@@ -0,0 +1,127 @@
+"""MediaStorage retries and metrics over the local backend."""
+import asyncio
+
+import pytest
+
+from app.services import storage
+from app.services.storage import LocalStorageBackend, MediaStorage, StorageBackend
+
+
+class TransientError(Exception):
+    pass
+
+
+class FlakyBackend(LocalStorageBackend):
+    """Local storage whose next `failures` calls raise a retryable error."""
+
+    def __init__(self, media_dir, failures=0, error=TransientError):
+        super().__init__(media_dir)
+        self.failures = failures
+        self.error = error
+        self.writers_opened = 0
+
+    def _maybe_fail(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise self.error("flaky")
+
+    def put_object(self, key, data, content_type, cache_control=None):
+        self._maybe_fail()
+        super().put_object(key, data, content_type, cache_control)
+
+    def get_object(self, key, length=None):
+        self._maybe_fail()
+        return super().get_object(key, length)
+
+    def open_writer(self, key, content_type):
+        self.writers_opened += 1
+        self._maybe_fail()
+        return super().open_writer(key, content_type)
+
+    def is_retryable(self, error):
+        return isinstance(error, TransientError)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays, recorded instead of slept."""
+    delays = []
+    monkeypatch.setattr(storage.time, "sleep", delays.append)
+    monkeypatch.setattr(storage, "STORAGE_MAX_ATTEMPTS", 3)
+    return delays
+
+
+def test_transient_failures_are_retried_with_backoff(tmp_path, sleeps):
+    backend = FlakyBackend(tmp_path, failures=2)
+    media = MediaStorage(backend)
+
+    assert media.put_object("media/a.png", b"data", "image/png") == "/media/a.png"
+    assert (tmp_path / "a.png").read_bytes() == b"data"
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= storage.STORAGE_BACKOFF_MAX_SECONDS for delay in sleeps)
+
+    put = media.metrics()["operations"]["put_object"]
+    assert (put["calls"], put["errors"], put["retries"]) == (1, 0, 2)
+    assert media.metrics()["backend"] == "local"
+
+
+def test_retries_give_up_after_max_attempts(tmp_path, sleeps):
+    media = MediaStorage(FlakyBackend(tmp_path, failures=5))
+
+    with pytest.raises(TransientError):
+        media.get_object("media/a.png")
+    assert len(sleeps) == 2
+    get = media.metrics()["operations"]["get_object"]
+    assert (get["calls"], get["errors"], get["retries"]) == (1, 1, 2)
+
+
+def test_permanent_failures_are_not_retried(tmp_path, sleeps):
+    media = MediaStorage(FlakyBackend(tmp_path, failures=1, error=PermissionError))
+
+    with pytest.raises(PermissionError):
+        media.put_object("media/a.png", b"data", "image/png")
+    assert sleeps == []
+
+
+def test_write_stream_is_never_retried(tmp_path, sleeps):
+    backend = FlakyBackend(tmp_path, failures=1)
+    media = MediaStorage(backend)
+
+    with pytest.raises(TransientError):
+        media.write_stream("media/a.png", "image/png", iter([b"one", b"two"]))
+    assert backend.writers_opened == 1
+    assert sleeps == []
+    assert not (tmp_path / "a.png").exists()
+
+
+def test_async_variants_run_off_the_loop(tmp_path):
+    media = MediaStorage(LocalStorageBackend(tmp_path), io_threads=2)
+
+    async def roundtrip():
+        await media.aput_object("media/a.png", b"data", "image/png")
+        data = await media.aget_object("media/a.png")
+        size = await media.aobject_size("media/a.png")
+        await media.adelete_object("media/a.png")
+        return data, size, await media.aobject_size("media/a.png")
+
+    try:
+        assert asyncio.run(roundtrip()) == (b"data", 4, None)
+    finally:
+        media.close()
+
+
+def test_local_keys_cannot_escape_the_media_dir(tmp_path):
+    backend = LocalStorageBackend(tmp_path / "media")
+    with pytest.raises(ValueError):
+        backend.path_for("media/../secret.txt")
+    assert backend.key_for_url("https://example.com/media/a.png") is None
+    assert backend.key_for_url(backend.url_for("media/a.png")) == "media/a.png"
+
+
+def test_incomplete_backends_fail_on_construction():
+    class PartialBackend(StorageBackend):
+        def put_object(self, key, data, content_type, cache_control=None):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialBackend()
@@ -0,0 +1,89 @@
+"""The shared translation provider: built once per process, closed on shutdown,
+and falling back to the dummy provider when OpenAI isn't configured."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.database import Base
+from app.services import translation, translation_memory
+from app.services.translation_providers.circuit_breaker import CLOSED, CircuitBreakerProvider
+from app.services.translation_providers.dummy_provider import DummyTranslationProvider
+from app.services.translation_providers.registry import ProviderRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setenv("TRANSLATION_PROVIDER", "openai")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    return ProviderRegistry()
+
+
+def test_registry_falls_back_to_dummy_without_api_key(registry):
+    assert registry.metrics() is None
+
+    provider = registry.get()
+    assert isinstance(provider, CircuitBreakerProvider)
+    assert isinstance(provider.provider, DummyTranslationProvider)
+    assert registry.metrics()["state"] == CLOSED
+
+
+def test_registry_shares_one_provider(registry):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        providers = list(pool.map(lambda _: registry.get(), range(32)))
+    assert all(p is providers[0] for p in providers)
+
+
+def test_registry_close_and_rebuild(registry):
+    first = registry.get()
+    asyncio.run(registry.aclose())
+    assert first.provider.closed
+    assert registry.metrics() is None
+
+    second = registry.get()
+    assert second is not first
+    assert not second.provider.closed
+
+
+def test_dummy_results_do_not_trip_the_breaker(registry):
+    provider = registry.get()
+
+    async def translate_many():
+        return [await provider.translate("こんにちは", "en", "ja") for _ in range(20)]
+
+    results = asyncio.run(translate_many())
+    assert all(r.translated_text == "こんにちは" and not r.success for r in results)
+    assert {r.error_code for r in results} == {"dummy_provider"}
+    # Not a provider outage: the circuit stays closed
+    assert provider.breaker.state == CLOSED
+
+
+def test_post_translation_falls_back_to_the_original(registry, monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    monkeypatch.setattr(translation, "SessionLocal", Session)
+    monkeypatch.setattr(translation_memory, "SessionLocal", Session)
+    monkeypatch.setattr(translation, "provider_registry", registry)
+    translation_memory._memory_cache.clear()
+
+    db = Session()
+    user = models.User(email="author@example.com", password_hash="x", display_name="author")
+    db.add(user)
+    db.flush()
+    post = models.Post(user_id=user.id, title="タイトル", body="本文です", original_lang="ja")
+    db.add(post)
+    db.commit()
+    try:
+        row = asyncio.run(translation.get_or_create_translation(db, post, "en"))
+        assert row.translated_text == "本文です"
+        assert row.error_code == "dummy_provider"
+        # The dummy's output is not a translation worth sharing
+        assert db.query(models.TranslationMemory).count() == 0
+    finally:
+        db.close()
+        engine.dispose()